@@ -14,7 +14,9 @@ from internal.extension.database_extension import db
 from internal.extension.login_extension import login_manager
 from internal.extension.migrate_extension import migrate
 from internal.extension.redis_extension import redis_client
+from internal.extension.weaviate_extension import weaviate
 from pkg.sqlalchemy import SQLAlchemy
+from pkg.weaviate import FlaskWeaviate
 
 
 class ExtensionModule(Module):
@@ -25,6 +27,7 @@ class ExtensionModule(Module):
         binder.bind(Migrate, to=migrate)
         binder.bind(Redis, to=redis_client)
         binder.bind(LoginManager, to=login_manager)
+        binder.bind(FlaskWeaviate, to=weaviate)
 
 
 injector = Injector([ExtensionModule])
@@ -43,6 +43,16 @@ class Config:
         self.REDIS_DB = _get_env("REDIS_DB")
         self.REDIS_USE_SSL = _get_bool_env("REDIS_USE_SSL")
 
+        # Weaviate 配置
+        self.WEAVIATE_HOST = _get_env("WEAVIATE_HOST")
+        self.WEAVIATE_PORT = _get_env("WEAVIATE_PORT")
+        self.WEAVIATE_GRPC_PORT = _get_env("WEAVIATE_GRPC_PORT")
+        self.WEAVIATE_POOL_CONNECTIONS = _get_env("WEAVIATE_POOL_CONNECTIONS")
+        self.WEAVIATE_POOL_MAXSIZE = _get_env("WEAVIATE_POOL_MAXSIZE")
+        self.WEAVIATE_HEALTH_CHECK_INTERVAL = _get_env("WEAVIATE_HEALTH_CHECK_INTERVAL")
+        self.WEAVIATE_CONNECT_MAX_RETRIES = _get_env("WEAVIATE_CONNECT_MAX_RETRIES")
+        self.WEAVIATE_MULTI_TENANCY = _get_bool_env("WEAVIATE_MULTI_TENANCY")
+
         # celery 配置
         self.CELERY = {
             "broker_url": f"redis://{self.REDIS_USERNAME}:{self.REDIS_PASSWORD}@{self.REDIS_HOST}:{self.REDIS_PORT}/{int(_get_env('CELERY_BROKER_DB'))}",
@@ -50,4 +60,20 @@ class Config:
             "task_ignore_result": _get_bool_env("CELERY_TASK_IGNORE_RESULT"),
             "result_expires": int(_get_env("CELERY_RESULT_EXPIRES")),
             "broker_connection_retry_on_startup": _get_bool_env("CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP"),
+            # 未被任何服務導入的任務模組需要由worker主動導入才能註冊
+            "imports": ["internal.task.embeddings_task"],
+            "beat_schedule": {
+                "resume-stuck-documents": {
+                    "task": "internal.task.document_task.resume_stuck_documents",
+                    "schedule": int(_get_env("CELERY_RESUME_STUCK_DOCUMENTS_INTERVAL")),
+                },
+                "flush-retrieval-records": {
+                    "task": "internal.task.dataset_task.flush_retrieval_records",
+                    "schedule": int(_get_env("CELERY_FLUSH_RETRIEVAL_RECORDS_INTERVAL")),
+                },
+                "migrate-vector-collection": {
+                    "task": "internal.task.embeddings_task.migrate_vector_collection",
+                    "schedule": int(_get_env("CELERY_MIGRATE_VECTOR_COLLECTION_INTERVAL")),
+                },
+            },
         }
@@ -21,10 +21,23 @@ DEFAULT_CONFIG = {
     "REDIS_DB": "0",
     "REDIS_USE_SSL": "False",
 
+    # Weaviate
+    "WEAVIATE_HOST": "localhost",
+    "WEAVIATE_PORT": "8080",
+    "WEAVIATE_GRPC_PORT": "50051",
+    "WEAVIATE_POOL_CONNECTIONS": 10,
+    "WEAVIATE_POOL_MAXSIZE": 50,
+    "WEAVIATE_HEALTH_CHECK_INTERVAL": 30,
+    "WEAVIATE_CONNECT_MAX_RETRIES": 5,
+    "WEAVIATE_MULTI_TENANCY": "False",
+
     # Celery 配置
     "CELERY_BROKER_DB": 1,
     "CELERY_RESULT_BACKEND_DB": 1,
     "CELERY_TASK_IGNORE_RESULT": "False",
     "CELERY_RESULT_EXPIRES": 3600,
     "CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP": "True",
+    "CELERY_RESUME_STUCK_DOCUMENTS_INTERVAL": 300,
+    "CELERY_MIGRATE_VECTOR_COLLECTION_INTERVAL": 300,
+    "CELERY_FLUSH_RETRIEVAL_RECORDS_INTERVAL": 10,
 }
@@ -294,29 +294,38 @@ class FunctionCallAgent(BaseAgent):
         # 2.提取消息中的工具調用參數
         tool_calls = state["messages"][-1].tool_calls
 
-        # 3.循環執行工具組裝工具消息
+        # 3.同一輪的多次知識庫檢索調用合併成一次批次檢索(共用嵌入請求、並行向量檢索與一次全文檢索)
+        batch_results, batch_latency = self._batch_dataset_retrieval(tools_by_name, tool_calls)
+
+        # 4.循環執行工具組裝工具消息
         messages = []
         for tool_call in tool_calls:
-            # 4.創建智慧體動作事件id並記錄開始時間
+            # 5.創建智慧體動作事件id並記錄開始時間
             id = uuid.uuid4()
             start_at = time.perf_counter()
 
             try:
-                # 5.獲取工具並調用工具
-                tool = tools_by_name[tool_call["name"]]
-                tool_result = tool.invoke(tool_call["args"])
+                # 6.已經批次執行的調用直接使用批次結果，否則獲取工具並調用工具
+                if tool_call["id"] in batch_results:
+                    start_at -= batch_latency
+                    tool_result = batch_results[tool_call["id"]]
+                    if isinstance(tool_result, Exception):
+                        raise tool_result
+                else:
+                    tool = tools_by_name[tool_call["name"]]
+                    tool_result = tool.invoke(tool_call["args"])
             except Exception as e:
-                # 6.添加錯誤工具資訊
+                # 7.添加錯誤工具資訊
                 tool_result = f"工具执行出错: {str(e)}"
 
-            # 7.將工具消息添加到消息列表中
+            # 8.將工具消息添加到消息列表中
             messages.append(ToolMessage(
                 tool_call_id=tool_call["id"],
                 content=json.dumps(tool_result),
                 name=tool_call["name"],
             ))
 
-            # 7.判斷執行工具的名字，提交不同事件，涵蓋智慧體動作以及知識庫檢索
+            # 9.判斷執行工具的名字，提交不同事件，涵蓋智慧體動作以及知識庫檢索
             event = (
                 QueueEvent.AGENT_ACTION
                 if tool_call["name"] != DATASET_RETRIEVAL_TOOL_NAME
@@ -334,6 +343,24 @@ class FunctionCallAgent(BaseAgent):
 
         return {"messages": messages}
 
+    @classmethod
+    def _batch_dataset_retrieval(cls, tools_by_name: dict, tool_calls: list[dict]) -> tuple[dict, float]:
+        """批次執行同一輪的多次知識庫檢索調用，返回工具調用id->結果(出錯時為異常)以及批次執行耗時，少於兩次調用時不處理"""
+        # 1.篩選知識庫檢索工具的調用
+        retrieval_tool = tools_by_name.get(DATASET_RETRIEVAL_TOOL_NAME)
+        retrieval_calls = [tool_call for tool_call in tool_calls if tool_call["name"] == DATASET_RETRIEVAL_TOOL_NAME]
+        if retrieval_tool is None or len(retrieval_calls) < 2:
+            return {}, 0
+
+        # 2.一次性批次調用，出錯的調用以異常返回
+        start_at = time.perf_counter()
+        results = retrieval_tool.batch([tool_call["args"] for tool_call in retrieval_calls], return_exceptions=True)
+
+        return (
+            {tool_call["id"]: result for tool_call, result in zip(retrieval_calls, results)},
+            time.perf_counter() - start_at,
+        )
+
     @classmethod
     def _tools_condition(cls, state: AgentState) -> Literal["tools", "__end__"]:
         """檢測下一個節點是執行tools節點，還是直接結束"""
@@ -0,0 +1,12 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午7:05
+@Author : zsting29@gmail.com
+@File   : __init__.py.py
+"""
+from .micro_batch_embeddings import MicroBatchEmbeddings
+from .packed_embedding_store import PackedEmbeddingStore
+from .query_cache_embeddings import QueryCacheEmbeddings
+
+__all__ = ["MicroBatchEmbeddings", "PackedEmbeddingStore", "QueryCacheEmbeddings"]
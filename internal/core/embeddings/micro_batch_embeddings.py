@@ -0,0 +1,129 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午7:05
+@Author : zsting29@gmail.com
+@File   : micro_batch_embeddings.py
+"""
+import logging
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from queue import Empty, Queue
+from threading import Lock, Thread
+from typing import Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+class MicroBatchEmbeddings(Embeddings):
+    """
+    跨請求的文本嵌入微批次處理器，收集並發調用方的文本，在等待數毫秒或達到批次上限後合併成一次嵌入請求，
+    相同文本在請求完成前只會被嵌入一次(singleflight)，適用於查詢與文件使用相同編碼方式的模型(如OpenAI)
+    """
+    embeddings: Embeddings
+    max_batch_size: int
+    max_wait_time: float
+    max_concurrency: int
+    timeout: float
+
+    def __init__(
+            self,
+            embeddings: Embeddings,
+            max_batch_size: int = 256,
+            max_wait_time: float = 0.01,
+            max_concurrency: int = 4,
+            timeout: float = 120,
+    ):
+        """
+        構造函數，傳遞底層的文本嵌入模型、單批最大文本數、最長等待時間(秒)、同時進行的嵌入請求數，
+        以及調用方等待嵌入結果的超時時間(秒)
+        """
+        self.embeddings = embeddings
+        self.max_batch_size = max_batch_size
+        self.max_wait_time = max_wait_time
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._lock = Lock()
+        self._queue: Queue[str] = Queue()
+        self._inflight: dict[str, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._dispatcher_pid: Optional[int] = None
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """將文本列表加入微批次佇列，並等待所有文本的嵌入結果，所有文本共用同一個超時時間"""
+        futures = [self._submit(text) for text in texts]
+        deadline = time.monotonic() + self.timeout
+        return [future.result(timeout=max(0.0, deadline - time.monotonic())) for future in futures]
+
+    def embed_query(self, text: str) -> list[float]:
+        """將查詢文本加入微批次佇列，與其他調用方的文本合併嵌入"""
+        return self._submit(text).result(timeout=self.timeout)
+
+    def _submit(self, text: str) -> Future:
+        """獲取文本對應的嵌入結果Future，文本已經在佇列或請求中時直接複用，否則加入佇列"""
+        self._ensure_dispatcher()
+        with self._lock:
+            future = self._inflight.get(text)
+            if future is None:
+                future = Future()
+                self._inflight[text] = future
+                self._queue.put(text)
+        return future
+
+    def _ensure_dispatcher(self) -> None:
+        """確保當前行程已經啟動分發執行緒，Celery prefork子行程需要重置狀態並重新啟動"""
+        pid = os.getpid()
+        if self._dispatcher_pid == pid:
+            return
+        with self._lock:
+            if self._dispatcher_pid == pid:
+                return
+            self._queue = Queue()
+            self._inflight = {}
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+            self._dispatcher_pid = pid
+            Thread(target=self._dispatch, args=(self._queue, self._executor), daemon=True).start()
+
+    def _dispatch(self, queue: Queue, executor: ThreadPoolExecutor) -> None:
+        """從佇列中收集文本，等待到最長等待時間或達到批次上限後投遞到執行緒池執行嵌入"""
+        while True:
+            # 1.阻塞等待第一條文本，並以其到達時間作為本批次的截止時間起點
+            texts = [queue.get()]
+            deadline = time.monotonic() + self.max_wait_time
+
+            # 2.在截止時間前繼續收集文本，直到達到批次上限
+            while len(texts) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    texts.append(queue.get(timeout=timeout))
+                except Empty:
+                    break
+
+            # 3.投遞到執行緒池，多個批次可以同時請求
+            executor.submit(self._embed_batch, texts)
+
+    def _embed_batch(self, texts: list[str]) -> None:
+        """調用底層模型批次嵌入文本，並將結果或錯誤回傳給所有等待的調用方，任何情況下都會結束所有Future"""
+        vectors, error = None, None
+        try:
+            # 1.調用底層模型，返回的向量數與文本數不一致時視為失敗
+            vectors = self.embeddings.embed_documents(texts)
+            if len(vectors) != len(texts):
+                raise ValueError(f"嵌入結果數量與文本數量不一致, 文本數: {len(texts)}, 向量數: {len(vectors)}")
+        except Exception as e:
+            logging.exception("批次嵌入文本失敗, 錯誤資訊: %(error)s", {"error": e})
+            error = e
+        finally:
+            # 2.移除請求中的記錄並回傳結果，未能正常取得結果時回傳錯誤
+            with self._lock:
+                futures = [self._inflight.pop(text, None) for text in texts]
+            for idx, future in enumerate(futures):
+                if future is None or future.done():
+                    continue
+                if error is None and vectors is not None:
+                    future.set_result(vectors[idx])
+                else:
+                    future.set_exception(error or RuntimeError("批次嵌入文本失敗"))
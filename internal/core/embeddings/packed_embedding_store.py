@@ -0,0 +1,181 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午8:15
+@Author : zsting29@gmail.com
+@File   : packed_embedding_store.py
+"""
+import hashlib
+import json
+import logging
+import uuid
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+from langchain_core.stores import BaseStore
+from redis import Redis
+
+from internal.entity.cache_entity import EMBEDDING_CACHE, LEGACY_EMBEDDING_CACHE
+from internal.entity.embeddings_entity import EMBEDDING_CACHE_DTYPE, EMBEDDING_CACHE_TTL
+
+# 與LangChain CacheBackedEmbeddings預設的sha1鍵編碼保持一致，舊快取鍵可以直接換算成新快取鍵
+NAMESPACE_UUID = uuid.UUID(int=1985)
+
+
+class PackedEmbeddingStore(BaseStore[str, list[float]]):
+    """
+    以緊湊二進位格式在Redis中儲存文本嵌入的快取，向量按float32(可選float16)打包，
+    快取鍵包含命名空間、模型名字、維度與數據類型，並支持設置過期時間與遷移舊版JSON格式的快取
+    """
+    redis_client: Redis
+    namespace: str
+    model: str
+    dimension: int
+    dtype: np.dtype
+    ttl: Optional[int]
+    legacy_namespace: Optional[str]
+
+    def __init__(
+            self,
+            redis_client: Redis,
+            namespace: str,
+            model: str,
+            dimension: int,
+            dtype: str = EMBEDDING_CACHE_DTYPE,
+            ttl: Optional[int] = EMBEDDING_CACHE_TTL,
+            legacy_namespace: Optional[str] = None,
+    ):
+        """
+        構造函數，legacy_namespace為舊版RedisStore快取使用的命名空間，
+        只有舊快取與當前模型一致時才需要傳遞，讀取未命中時會嘗試從舊快取遷移
+        """
+        if dtype not in ("float32", "float16"):
+            raise ValueError(f"不支持的嵌入快取數據類型: {dtype}")
+        self.redis_client = redis_client
+        self.namespace = namespace
+        self.model = model
+        self.dimension = dimension
+        self.dtype = np.dtype(dtype).newbyteorder("<")
+        self.ttl = ttl
+        self.legacy_namespace = legacy_namespace
+
+    def mget(self, keys: Sequence[str]) -> list[Optional[list[float]]]:
+        """根據傳遞的文本列表批次獲取嵌入向量，未命中的文本返回None"""
+        return [array.tolist() if array is not None else None for array in self.mget_arrays(keys)]
+
+    def mget_arrays(self, keys: Sequence[str]) -> list[Optional[np.ndarray]]:
+        """根據傳遞的文本列表批次獲取嵌入向量，float32格式會直接以零複製的方式映射成唯讀NumPy陣列"""
+        if len(keys) == 0:
+            return []
+
+        # 1.計算文本雜湊並批次讀取新格式的快取
+        text_hashes = [self._hash_text(key) for key in keys]
+        values = self.redis_client.mget([self._build_key(text_hash) for text_hash in text_hashes])
+
+        # 2.新格式未命中且配置了舊命名空間時，嘗試讀取舊格式快取並遷移
+        if self.legacy_namespace is not None:
+            missing_indexes = [idx for idx, value in enumerate(values) if value is None]
+            if len(missing_indexes) > 0:
+                migrated_values = self._migrate_legacy([text_hashes[idx] for idx in missing_indexes])
+                for idx, value in zip(missing_indexes, migrated_values):
+                    values[idx] = value
+
+        return [self.decode(value) if value is not None else None for value in values]
+
+    def mset(self, key_value_pairs: Sequence[tuple[str, list[float]]]) -> None:
+        """批次寫入文本與嵌入向量，維度與配置不一致的向量不會被快取"""
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for key, vector in key_value_pairs:
+            if len(vector) != self.dimension:
+                logging.warning(
+                    "嵌入向量維度與快取配置不一致, 跳過快取, 期望維度: %(dimension)s, 實際維度: %(actual)s",
+                    {"dimension": self.dimension, "actual": len(vector)},
+                )
+                continue
+            pipeline.set(self._build_key(self._hash_text(key)), self.encode(vector), ex=self.ttl)
+        pipeline.execute()
+
+    def mdelete(self, keys: Sequence[str]) -> None:
+        """批次刪除文本對應的嵌入快取"""
+        if len(keys) > 0:
+            self.redis_client.delete(*[self._build_key(self._hash_text(key)) for key in keys])
+
+    def yield_keys(self, *, prefix: Optional[str] = None) -> Iterator[str]:
+        """遍歷當前命名空間+模型+維度下的所有快取鍵(快取鍵只保存文本雜湊，無法還原文本)"""
+        pattern = self._build_key(f"{prefix or ''}*")
+        for key in self.redis_client.scan_iter(match=pattern):
+            yield key.decode() if isinstance(key, bytes) else key
+
+    def encode(self, vector: list[float]) -> bytes:
+        """將嵌入向量打包成小端序的float32/float16位元組"""
+        return np.asarray(vector, dtype=self.dtype).tobytes()
+
+    def decode(self, value: bytes) -> np.ndarray:
+        """將位元組解碼成float32 NumPy陣列，float32格式不複製數據，float16格式會轉換成float32"""
+        array = np.frombuffer(value, dtype=self.dtype)
+        return array if self.dtype == np.float32 else array.astype(np.float32)
+
+    def migrate_legacy_keys(self, batch_size: int = 1000) -> int:
+        """將舊版RedisStore中的所有JSON格式嵌入快取批次遷移成新格式，返回遷移的數量"""
+        if self.legacy_namespace is None:
+            return 0
+
+        # 1.掃描舊版命名空間下的快取鍵(命名空間+36位uuid)，按批次遷移
+        migrated_count = 0
+        text_hashes = []
+        prefix_length = len(self.legacy_namespace)
+        for key in self.redis_client.scan_iter(match=f"{self.legacy_namespace}*", count=batch_size):
+            key = key.decode() if isinstance(key, bytes) else key
+            text_hash = key[prefix_length:]
+            if len(text_hash) != 36 or ":" in text_hash:
+                continue
+            text_hashes.append(text_hash)
+            if len(text_hashes) >= batch_size:
+                migrated_count += sum(value is not None for value in self._migrate_legacy(text_hashes))
+                text_hashes = []
+
+        # 2.遷移最後不足一個批次的快取鍵
+        if len(text_hashes) > 0:
+            migrated_count += sum(value is not None for value in self._migrate_legacy(text_hashes))
+
+        return migrated_count
+
+    def _migrate_legacy(self, text_hashes: list[str]) -> list[Optional[bytes]]:
+        """讀取文本雜湊對應的舊版JSON快取，轉換並寫入新格式後刪除舊快取，返回新格式的位元組值"""
+        legacy_keys = [LEGACY_EMBEDDING_CACHE.format(namespace=self.legacy_namespace, text_hash=text_hash)
+                       for text_hash in text_hashes]
+        legacy_values = self.redis_client.mget(legacy_keys)
+
+        values = []
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for text_hash, legacy_key, legacy_value in zip(text_hashes, legacy_keys, legacy_values):
+            # 1.舊快取不存在或維度不一致時跳過
+            vector = json.loads(legacy_value) if legacy_value is not None else None
+            if vector is None or len(vector) != self.dimension:
+                values.append(None)
+                continue
+
+            # 2.寫入新格式並刪除舊快取
+            value = self.encode(vector)
+            pipeline.set(self._build_key(text_hash), value, ex=self.ttl)
+            pipeline.delete(legacy_key)
+            values.append(value)
+        pipeline.execute()
+
+        return values
+
+    def _build_key(self, text_hash: str) -> str:
+        """根據文本雜湊構建新格式的快取鍵"""
+        return EMBEDDING_CACHE.format(
+            namespace=self.namespace,
+            model=self.model,
+            dimension=self.dimension,
+            dtype=self.dtype.name,
+            text_hash=text_hash,
+        )
+
+    @classmethod
+    def _hash_text(cls, text: str) -> str:
+        """計算文本雜湊，演算法與LangChain CacheBackedEmbeddings的sha1鍵編碼一致"""
+        sha1_hex = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        return str(uuid.uuid5(NAMESPACE_UUID, sha1_hex))
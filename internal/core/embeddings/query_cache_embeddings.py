@@ -0,0 +1,117 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午7:40
+@Author : zsting29@gmail.com
+@File   : query_cache_embeddings.py
+"""
+import logging
+import re
+import unicodedata
+from typing import Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.stores import BaseStore
+
+from internal.entity.embeddings_entity import QUERY_EMBEDDING_LOCAL_CACHE_SIZE, QUERY_EMBEDDING_LOCAL_CACHE_TTL
+from pkg.cache import LRUCache
+
+
+class QueryCacheEmbeddings(Embeddings):
+    """
+    查詢嵌入快取，以正規化後的查詢文本為鍵，行程內LRU快取在前、共享儲存(Redis)在後，
+    模型名字由共享儲存的快取鍵區分，文件嵌入直接透傳給底層模型
+    """
+    embeddings: Embeddings
+    store: BaseStore[str, list[float]]
+
+    def __init__(
+            self,
+            embeddings: Embeddings,
+            store: BaseStore[str, list[float]],
+            local_cache_size: int = QUERY_EMBEDDING_LOCAL_CACHE_SIZE,
+            local_cache_ttl: float = QUERY_EMBEDDING_LOCAL_CACHE_TTL,
+    ):
+        """構造函數，傳遞底層文本嵌入模型、共享儲存以及行程內快取的容量與過期時間"""
+        self.embeddings = embeddings
+        self.store = store
+        self._cache = LRUCache(maxsize=local_cache_size, ttl=local_cache_ttl)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """文件嵌入不經過查詢快取，直接調用底層模型"""
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        """依序從行程內快取、共享儲存中獲取查詢嵌入，都未命中時調用底層模型並回填兩級快取"""
+        # 1.正規化查詢文本並優先從行程內快取中獲取
+        query = self.normalize_query(text)
+        vector = self._cache.get(query)
+        if vector is not None:
+            return vector
+
+        # 2.行程內未命中則查詢共享儲存，仍未命中則調用模型並寫入共享儲存
+        vector = self._get_from_store(query)
+        if vector is None:
+            vector = self.embeddings.embed_query(query)
+            self._set_to_store(query, vector)
+
+        # 3.回填行程內快取
+        self._cache.set(query, vector)
+        return vector
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        """批次嵌入多個查詢，各級快取均未命中的查詢合併成一次模型請求，返回順序與傳遞的查詢一致"""
+        # 1.正規化查詢文本並從行程內快取中獲取
+        queries = [self.normalize_query(text) for text in texts]
+        vectors: dict[str, list[float]] = {}
+        for query in queries:
+            vector = self._cache.get(query)
+            if vector is not None:
+                vectors[query] = vector
+
+        # 2.行程內未命中的查詢一次性從共享儲存中讀取
+        missing_queries = list(dict.fromkeys(query for query in queries if query not in vectors))
+        if len(missing_queries) > 0:
+            try:
+                stored_vectors = self.store.mget(missing_queries)
+            except Exception as e:
+                logging.warning("讀取查詢嵌入快取失敗, 錯誤資訊: %(error)s", {"error": e})
+                stored_vectors = [None] * len(missing_queries)
+            for query, vector in zip(missing_queries, stored_vectors):
+                if vector is not None:
+                    vectors[query] = vector
+                    self._cache.set(query, vector)
+
+        # 3.仍未命中的查詢合併成一次模型請求，並回填兩級快取
+        missing_queries = [query for query in missing_queries if query not in vectors]
+        if len(missing_queries) > 0:
+            embedded_vectors = self.embeddings.embed_documents(missing_queries)
+            try:
+                self.store.mset(list(zip(missing_queries, embedded_vectors)))
+            except Exception as e:
+                logging.warning("寫入查詢嵌入快取失敗, 錯誤資訊: %(error)s", {"error": e})
+            for query, vector in zip(missing_queries, embedded_vectors):
+                vectors[query] = vector
+                self._cache.set(query, vector)
+
+        return [vectors[query] for query in queries]
+
+    @classmethod
+    def normalize_query(cls, text: str) -> str:
+        """正規化查詢文本：統一全形/半形字元，並去除首尾以及重複的空白字元"""
+        return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text)).strip()
+
+    def _get_from_store(self, query: str) -> Optional[list[float]]:
+        """從共享儲存中讀取查詢嵌入，儲存不可用時視為未命中"""
+        try:
+            return self.store.mget([query])[0]
+        except Exception as e:
+            logging.warning("讀取查詢嵌入快取失敗, 錯誤資訊: %(error)s", {"error": e})
+            return None
+
+    def _set_to_store(self, query: str, vector: list[float]) -> None:
+        """將查詢嵌入寫入共享儲存，寫入失敗只記錄日誌"""
+        try:
+            self.store.mset([(query, vector)])
+        except Exception as e:
+            logging.warning("寫入查詢嵌入快取失敗, 錯誤資訊: %(error)s", {"error": e})
@@ -0,0 +1,10 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午3:32
+@Author : zsting29@gmail.com
+@File   : __init__.py.py
+"""
+from .keyword_index_cache import KeywordIndex, KeywordIndexCache
+
+__all__ = ["KeywordIndex", "KeywordIndexCache"]
@@ -0,0 +1,134 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午3:32
+@Author : zsting29@gmail.com
+@File   : keyword_index_cache.py
+"""
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from threading import Lock, Thread
+from typing import Optional
+from uuid import UUID
+
+from injector import inject, singleton
+from redis import Redis
+
+from internal.entity.cache_entity import (
+    KEYWORD_TABLE_VERSION,
+    KEYWORD_TABLE_INVALIDATE_CHANNEL,
+    KEYWORD_INDEX_CACHE_MAX_DATASETS,
+)
+from pkg.cache import LRUCache
+
+
+@dataclass
+class KeywordIndex:
+    """單個知識庫的關鍵字倒排索引快照"""
+    version: int = 0  # 載入時知識庫關鍵字表的版本號
+    segment_count: int = 0  # 已索引片段數
+    total_segment_length: int = 0  # 已索引片段總長度
+    postings: dict[str, list[tuple[str, int, int]]] = field(default_factory=dict)  # 關鍵字->[(片段id, 詞頻, 片段長度)]
+
+    def get_postings(self, keywords: list[str]) -> list[tuple[str, str, int, int]]:
+        """根據傳遞的關鍵字列表提取倒排記錄，格式為[(片段id, 關鍵字, 詞頻, 片段長度), ...]"""
+        return [
+            (segment_id, keyword, term_frequency, segment_length)
+            for keyword in keywords
+            for segment_id, term_frequency, segment_length in self.postings.get(keyword, [])
+        ]
+
+
+@inject
+@singleton
+class KeywordIndexCache:
+    """
+    行程內的關鍵字倒排索引快取，以知識庫id為鍵並按LRU淘汰，
+    寫入時透過Redis版本號+發布/訂閱通知所有API與Celery行程失效對應的知識庫
+    """
+    redis_client: Redis
+
+    def __init__(self, redis_client: Redis):
+        self.redis_client = redis_client
+        self._cache = LRUCache(maxsize=KEYWORD_INDEX_CACHE_MAX_DATASETS)
+        self._latest_versions: dict[str, int] = {}
+        self._lock = Lock()
+        self._listener_pid: Optional[int] = None
+        self._listening = False
+
+    def is_available(self) -> bool:
+        """判斷當前行程的快取是否可用，只有失效訂閱就緒時才能使用快取，避免讀到已失效的數據"""
+        self._ensure_listener()
+        return self._listening
+
+    def get(self, dataset_id: UUID) -> Optional[KeywordIndex]:
+        """獲取知識庫的倒排索引快照，訂閱未就緒時不使用快取"""
+        if not self.is_available():
+            return None
+        return self._cache.get(str(dataset_id))
+
+    def get_version(self, dataset_id: UUID) -> int:
+        """從Redis中獲取知識庫關鍵字表的當前版本號，需要在從資料庫載入數據之前調用"""
+        version = self.redis_client.get(KEYWORD_TABLE_VERSION.format(dataset_id=dataset_id))
+        return int(version) if version is not None else 0
+
+    def put(self, dataset_id: UUID, keyword_index: KeywordIndex) -> None:
+        """快取知識庫的倒排索引快照，如果在載入期間已經收到更新的版本號則直接丟棄"""
+        key = str(dataset_id)
+        with self._lock:
+            if not self._listening or keyword_index.version < self._latest_versions.get(key, 0):
+                return
+            self._cache.set(key, keyword_index)
+
+    def invalidate(self, dataset_id: UUID) -> None:
+        """知識庫關鍵字表發生寫入後調用，遞增版本號並廣播給所有行程"""
+        version = self.redis_client.incr(KEYWORD_TABLE_VERSION.format(dataset_id=dataset_id))
+        self._evict(str(dataset_id), version)
+        self.redis_client.publish(KEYWORD_TABLE_INVALIDATE_CHANNEL, f"{dataset_id}:{version}")
+
+    def _evict(self, key: str, version: int) -> None:
+        """記錄最新版本號，並淘汰版本號落後的快取"""
+        with self._lock:
+            self._latest_versions[key] = max(version, self._latest_versions.get(key, 0))
+            keyword_index = self._cache.get(key)
+            if keyword_index is not None and keyword_index.version < version:
+                self._cache.delete(key)
+
+    def _ensure_listener(self) -> None:
+        """確保當前行程已經啟動失效訂閱執行緒，Celery prefork子行程需要重新啟動"""
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._lock:
+            if self._listener_pid == pid:
+                return
+            self._listener_pid = pid
+            self._listening = False
+            self._cache.clear()
+            Thread(target=self._listen, daemon=True).start()
+
+    def _listen(self) -> None:
+        """訂閱失效頻道，連接斷開時清空快取並按指數退避重連"""
+        backoff = 1
+        while True:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(KEYWORD_TABLE_INVALIDATE_CHANNEL)
+                self._cache.clear()
+                self._listening = True
+                backoff = 1
+                for message in pubsub.listen():
+                    data = message["data"]
+                    data = data.decode() if isinstance(data, bytes) else str(data)
+                    dataset_id, _, version = data.rpartition(":")
+                    self._evict(dataset_id, int(version))
+            except Exception as e:
+                logging.warning("關鍵字倒排索引失效訂閱中斷, 錯誤資訊: %(error)s", {"error": e})
+            finally:
+                self._listening = False
+                self._cache.clear()
+                pubsub.close()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
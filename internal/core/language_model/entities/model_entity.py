@@ -80,6 +80,7 @@ class ModelEntity(BaseModel):
 class BaseLanguageModel(LCBaseLanguageModel, ABC):
     """基礎語言模型"""
     features: list[ModelFeature] = Field(default_factory=list)  # 模型特性
+    context_window: int = 0  # 上下文窗口長度，0表示未知
     metadata: dict[str, Any] = Field(default_factory=dict)  # 模型元數據資訊
 
     def get_pricing(self) -> tuple[float, float, float]:
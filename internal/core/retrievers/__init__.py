@@ -5,7 +5,9 @@
 @Author : zsting29@gmail.com
 @File   : __init__.py.py
 """
+from .bm25_scorer import BM25Scorer
 from .full_text_retriever import FullTextRetriever
+from .parallel_hybrid_retriever import ParallelHybridRetriever, reciprocal_rank_fusion
 from .semantic_retriever import SemanticRetriever
 
-__all__ = ["SemanticRetriever", "FullTextRetriever"]
+__all__ = ["SemanticRetriever", "FullTextRetriever", "ParallelHybridRetriever", "reciprocal_rank_fusion", "BM25Scorer"]
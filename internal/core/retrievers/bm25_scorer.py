@@ -0,0 +1,76 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午2:48
+@Author : zsting29@gmail.com
+@File   : bm25_scorer.py
+"""
+from typing import Any, Sequence
+
+import numpy as np
+
+
+class BM25Scorer:
+    """BM25打分器，使用倒排記錄+知識庫統計資訊，透過向量化運算計算片段得分"""
+    k1: float
+    b: float
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """構造函數，k1控制詞頻飽和速度，b控制片段長度歸一化的強度"""
+        self.k1 = k1
+        self.b = b
+
+    def top_k(
+            self,
+            postings: Sequence[Any],
+            keywords: list[str],
+            segment_count: int,
+            total_segment_length: int,
+            k: int = 4,
+    ) -> list[tuple[str, float]]:
+        """
+        根據傳遞的倒排記錄計算得分最高的k個片段
+        :param postings: 倒排記錄列表，格式為[(segment_id, keyword, term_frequency, segment_length), ...]
+        :param keywords: 查詢關鍵字列表
+        :param segment_count: 參與檢索的知識庫已索引片段總數
+        :param total_segment_length: 參與檢索的知識庫已索引片段總長度
+        :param k: 返回的片段數
+        :return: 按得分降序的[(segment_id, score), ...]，score歸一化到[0, 1)
+        """
+        if len(postings) == 0 or len(keywords) == 0 or k <= 0:
+            return []
+
+        # 1.只保留命中查詢關鍵字的倒排記錄，並將片段id與關鍵字映射成矩陣下標
+        keyword_position = {keyword: idx for idx, keyword in enumerate(keywords)}
+        postings = [posting for posting in postings if posting[1] in keyword_position]
+        if len(postings) == 0:
+            return []
+        segment_ids, posting_keywords, term_frequencies, segment_lengths = zip(*postings)
+        unique_segment_ids, segment_index = np.unique(np.array([str(id) for id in segment_ids]), return_inverse=True)
+        keyword_index = np.array([keyword_position[keyword] for keyword in posting_keywords])
+        term_frequencies = np.asarray(term_frequencies, dtype=np.float32)
+
+        # 2.構建(片段數 × 關鍵字數)的詞頻矩陣以及片段長度向量
+        tf = np.zeros((len(unique_segment_ids), len(keywords)), dtype=np.float32)
+        np.add.at(tf, (segment_index, keyword_index), term_frequencies)
+        dl = np.zeros(len(unique_segment_ids), dtype=np.float32)
+        dl[segment_index] = np.asarray(segment_lengths, dtype=np.float32)
+
+        # 3.計算文件頻率與逆文件頻率，統計資訊有延遲時以倒排記錄數兜底，保證idf為正
+        df = np.count_nonzero(tf, axis=0).astype(np.float32)
+        n = max(float(segment_count), float(df.max()))
+        avgdl = max(total_segment_length / segment_count, 1.0) if segment_count > 0 else max(float(dl.mean()), 1.0)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+
+        # 4.向量化計算BM25得分，並使用理論上限歸一化，便於和相似性得分融合
+        norm = self.k1 * (1 - self.b + self.b * dl / avgdl)
+        scores = ((tf * (self.k1 + 1)) / (tf + norm[:, None])) @ idf
+        max_score = float(idf[df > 0].sum() * (self.k1 + 1)) or 1.0
+        scores = scores / max_score
+
+        # 5.使用argpartition獲取前k個片段後再排序
+        k = min(k, len(scores))
+        top_indexes = np.argpartition(-scores, k - 1)[:k]
+        top_indexes = top_indexes[np.argsort(-scores[top_indexes])]
+
+        return [(str(unique_segment_ids[idx]), float(scores[idx])) for idx in top_indexes]
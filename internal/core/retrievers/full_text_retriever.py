@@ -5,7 +5,6 @@
 @Author : zsting29@gmail.com
 @File   : full_text_retriever.py
 """
-from collections import Counter
 from typing import List
 from uuid import UUID
 
@@ -14,9 +13,10 @@ from langchain_core.documents import Document as LCDocument
 from langchain_core.pydantic_v1 import Field
 from langchain_core.retrievers import BaseRetriever
 
-from internal.model import KeywordTable, Segment
-from internal.service import JiebaService
+from internal.model import Segment
+from internal.service import JiebaService, KeywordTableService
 from pkg.sqlalchemy import SQLAlchemy
+from .bm25_scorer import BM25Scorer
 
 
 class FullTextRetriever(BaseRetriever):
@@ -24,6 +24,7 @@ class FullTextRetriever(BaseRetriever):
     db: SQLAlchemy
     dataset_ids: list[UUID]
     jieba_service: JiebaService
+    keyword_table_service: KeywordTableService
     search_kwargs: dict = Field(default_factory=dict)
 
     def _get_relevant_documents(
@@ -33,46 +34,57 @@ class FullTextRetriever(BaseRetriever):
             run_manager: CallbackManagerForRetrieverRun,
     ) -> List[LCDocument]:
         """根據傳遞的query執行關鍵字檢索獲取LangChain文件列表"""
-        # 1.將查詢query轉換成關鍵字列表
-        keywords = self.jieba_service.extract_keywords(query, 10)
+        return self.batch_get_relevant_documents([query])[0]
 
-        # 2.尋找指定知識庫的關鍵字表
-        keyword_tables = [
-            keyword_table for keyword_table, in
-            self.db.session.query(KeywordTable).with_entities(KeywordTable.keyword_table).filter(
-                KeywordTable.dataset_id.in_(self.dataset_ids)
-            ).all()
-        ]
+    def batch_get_relevant_documents(self, queries: list[str]) -> list[list[LCDocument]]:
+        """批次執行關鍵字檢索，所有查詢關鍵字的倒排記錄只提取一次，命中的片段只查詢一次資料庫，返回順序與傳遞的查詢一致"""
+        # 1.將所有查詢query轉換成關鍵字列表，並合併成關鍵字聯集
+        keywords_list = [self.jieba_service.extract_keywords(query, 10) for query in queries]
+        all_keywords = list(dict.fromkeys(keyword for keywords in keywords_list for keyword in keywords))
+        if len(all_keywords) == 0:
+            return [[] for _ in queries]
 
-        # 3.遍歷所有的知識庫關鍵字表，找到匹配query關鍵字的id列表
-        all_ids = []
-        for keyword_table in keyword_tables:
-            # 4.遍歷每一個關鍵字表的每一項
-            for keyword, segment_ids in keyword_table.items():
-                # 5.如果數據存在則提取關鍵字對應的片段id列表
-                if keyword in keywords:
-                    all_ids.extend(segment_ids)
+        # 2.從各知識庫的關鍵字倒排索引(行程內快取，快取不可用時只查詢這些關鍵字)中一次性提取關鍵字聯集對應的倒排記錄以及BM25統計資訊
+        postings = []
+        segment_count, total_segment_length = 0, 0
+        for dataset_id in self.dataset_ids:
+            keyword_index = self.keyword_table_service.get_keyword_index(dataset_id, all_keywords)
+            postings.extend(keyword_index.get_postings(all_keywords))
+            segment_count += keyword_index.segment_count
+            total_segment_length += keyword_index.total_segment_length
 
-        # 6.統計segment_id出現的頻率，這裡可以使用Counter進行快速統計
-        id_counter = Counter(all_ids)
+        # 3.沒有任何倒排記錄命中時直接返回
+        if len(postings) == 0:
+            return [[] for _ in queries]
 
-        # 7.獲取頻率最高的前k條數據，格式為[(segment_id, freq), (segment_id, freq), ...]
+        # 4.逐個查詢使用BM25計算得分最高的前k條數據(只計算命中該查詢關鍵字的倒排記錄)，格式為[(segment_id, score), ...]
         k = self.search_kwargs.get("k", 4)
-        top_k_ids = id_counter.most_common(k)
+        scorer = BM25Scorer()
+        top_k_ids_list = [
+            scorer.top_k(postings, keywords, segment_count, total_segment_length, k) for keywords in keywords_list
+        ]
 
-        # 8.根據得到的id列表檢索資料庫得到片段列表資訊
+        # 5.根據所有查詢得到的id聯集一次性檢索資料庫得到片段列表資訊
+        segment_ids = list({id for top_k_ids in top_k_ids_list for id, _ in top_k_ids})
         segments = self.db.session.query(Segment).filter(
-            Segment.id.in_([id for id, _ in top_k_ids])
-        ).all()
+            Segment.id.in_(segment_ids)
+        ).all() if len(segment_ids) > 0 else []
         segment_dict = {
             str(segment.id): segment for segment in segments
         }
 
-        # 9.根據頻率進行排序
-        sorted_segments = [segment_dict[str(id)] for id, freq in top_k_ids if id in segment_dict]
+        # 6.根據得分進行排序並構建LangChain文件列表
+        return [
+            [
+                self._build_document(segment_dict[id], score)
+                for id, score in top_k_ids if id in segment_dict
+            ] for top_k_ids in top_k_ids_list
+        ]
 
-        # 10.構建LangChain文件列表
-        lc_documents = [LCDocument(
+    @classmethod
+    def _build_document(cls, segment: Segment, score: float) -> LCDocument:
+        """根據片段記錄與得分構建LangChain文件"""
+        return LCDocument(
             page_content=segment.content,
             metadata={
                 "account_id": str(segment.account_id),
@@ -82,8 +94,6 @@ class FullTextRetriever(BaseRetriever):
                 "node_id": str(segment.node_id),
                 "document_enabled": True,
                 "segment_enabled": True,
-                "score": 0,
+                "score": score,
             }
-        ) for segment in sorted_segments]
-
-        return lc_documents
+        )
@@ -0,0 +1,86 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 上午12:05
+@Author : zsting29@gmail.com
+@File   : parallel_hybrid_retriever.py
+"""
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List
+
+from flask import Flask
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document as LCDocument
+from langchain_core.retrievers import BaseRetriever
+
+
+def reciprocal_rank_fusion(
+        results: list[list[LCDocument]],
+        weights: list[float],
+        c: int = 60,
+        id_key: str = "segment_id",
+) -> list[LCDocument]:
+    """倒數排名融合(RRF)，每條記錄的得分為各結果列表中 權重/(排名+c) 之和，同一片段只保留一份"""
+    scores = defaultdict(float)
+    lc_documents = {}
+    for weight, documents in zip(weights, results):
+        for rank, lc_document in enumerate(documents, start=1):
+            key = lc_document.metadata.get(id_key) or lc_document.page_content
+            scores[key] += weight / (rank + c)
+            lc_documents.setdefault(key, lc_document)
+
+    return [lc_documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class ParallelHybridRetriever(BaseRetriever):
+    """
+    並行混合檢索器，多個檢索器在背景執行緒中同時執行(各自擁有超時時間)，並以倒數排名融合(RRF)合併結果，
+    某一側超時或出錯時只使用其他檢索器的結果，整體延遲約等於最慢一側的延遲而非總和
+    """
+    flask_app: Flask
+    retrievers: list[BaseRetriever]
+    weights: list[float]
+    timeouts: list[float]
+    c: int = 60
+    id_key: str = "segment_id"
+
+    def _get_relevant_documents(
+            self,
+            query: str,
+            *,
+            run_manager: CallbackManagerForRetrieverRun,
+    ) -> List[LCDocument]:
+        """並行執行所有檢索器並融合結果"""
+        # 1.在背景執行緒中同時執行所有檢索器，執行緒池不等待超時的任務，避免阻塞請求
+        executor = ThreadPoolExecutor(max_workers=len(self.retrievers))
+        try:
+            started_at = time.monotonic()
+            futures = [executor.submit(self._invoke, retriever, query) for retriever in self.retrievers]
+
+            # 2.按各自的超時時間(從同一時間點起算)收集結果，超時或出錯的一側視為沒有結果
+            results = []
+            for retriever, future, timeout in zip(self.retrievers, futures, self.timeouts):
+                try:
+                    results.append(future.result(timeout=max(0.0, timeout - (time.monotonic() - started_at))))
+                except FutureTimeoutError:
+                    logging.warning("檢索器執行超時, 檢索器: %(retriever)s", {"retriever": type(retriever).__name__})
+                    results.append([])
+                except Exception as e:
+                    logging.warning(
+                        "檢索器執行失敗, 檢索器: %(retriever)s, 錯誤資訊: %(error)s",
+                        {"retriever": type(retriever).__name__, "error": e},
+                    )
+                    results.append([])
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        # 3.使用倒數排名融合合併結果
+        return reciprocal_rank_fusion(results, self.weights, self.c, self.id_key)
+
+    def _invoke(self, retriever: BaseRetriever, query: str) -> list[LCDocument]:
+        """在Flask應用上下文中執行檢索器，確保可以訪問資料庫會話"""
+        with self.flask_app.app_context():
+            return retriever.invoke(query)
@@ -12,14 +12,16 @@ from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document as LCDocument
 from langchain_core.pydantic_v1 import Field
 from langchain_core.retrievers import BaseRetriever
-from langchain_weaviate import WeaviateVectorStore
+from langchain_core.vectorstores import VectorStore
 from weaviate.classes.query import Filter
 
+from internal.core.vector_store import LocalVectorStore
+
 
 class SemanticRetriever(BaseRetriever):
     """相似性檢索器/向量檢索器"""
     dataset_ids: list[UUID]
-    vector_store: WeaviateVectorStore
+    vector_store: VectorStore
     search_kwargs: dict = Field(default_factory=dict)
 
     def _get_relevant_documents(
@@ -32,17 +34,24 @@ class SemanticRetriever(BaseRetriever):
         # 1.提取最大搜索條件k，預設值為4
         k = self.search_kwargs.pop("k", 4)
 
-        # 2.執行相似性檢索並獲取得分資訊
-        search_result = self.vector_store.similarity_search_with_relevance_scores(
-            query=query,
-            k=k,
-            **{
-                # 所有條件均需要滿足
+        # 2.構建過濾條件，本地向量索引按知識庫檢索並自動排除未啟用的文件與片段，Weaviate則需要所有條件均滿足
+        if isinstance(self.vector_store, LocalVectorStore):
+            filter_kwargs = {"dataset_ids": self.dataset_ids}
+        else:
+            filter_kwargs = {
                 "filters": Filter.all_of([
                     Filter.by_property("dataset_id").contains_any([str(dataset_id) for dataset_id in self.dataset_ids]),
                     Filter.by_property("document_enabled").equal(True),
                     Filter.by_property("segment_enabled").equal(True),
                 ]),
+            }
+
+        # 3.執行相似性檢索並獲取得分資訊
+        search_result = self.vector_store.similarity_search_with_relevance_scores(
+            query=query,
+            k=k,
+            **{
+                **filter_kwargs,
                 **self.search_kwargs,
             }
         )
@@ -50,7 +59,7 @@ class SemanticRetriever(BaseRetriever):
             return []
         lc_documents, scores = zip(*search_result)
 
-        # 3.執行循環將得分添加到文件元數據中
+        # 4.執行循環將得分添加到文件元數據中
         for lc_document, score in zip(lc_documents, scores):
             lc_document.metadata["score"] = score
 
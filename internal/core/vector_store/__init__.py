@@ -5,3 +5,7 @@
 @Author : zsting29@gmail.com
 @File   : __init__.py.py
 """
+from .adaptive_batch_writer import AdaptiveBatchWriter
+from .local_vector_store import LocalVectorStore
+
+__all__ = ["AdaptiveBatchWriter", "LocalVectorStore"]
@@ -0,0 +1,149 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午6:20
+@Author : zsting29@gmail.com
+@File   : adaptive_batch_writer.py
+"""
+import logging
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from langchain_core.documents import Document as LCDocument
+from langchain_core.embeddings import Embeddings
+from weaviate.classes.data import DataObject
+from weaviate.collections import Collection
+
+# 每批寫入完成後的回調函數，參數為(寫入成功的物件id列表, 寫入失敗的物件id->錯誤資訊)
+BatchCallback = Callable[[list[str], dict[str, str]], None]
+
+
+class AdaptiveBatchWriter:
+    """
+    自適應向量資料庫批次寫入器，向量化請求在背景執行緒池中提前並發執行，與寫入操作重疊，
+    寫入批次大小依據觀察到的延遲與錯誤動態調整(加法增大、乘法減小)，並逐個物件回報寫入結果
+    """
+    collection: Collection
+    embeddings: Embeddings
+    text_key: str
+    batch_size: int
+    min_batch_size: int
+    max_batch_size: int
+    target_latency: float
+    embedding_batch_size: int
+    embedding_concurrency: int
+
+    def __init__(
+            self,
+            collection: Collection,
+            embeddings: Embeddings,
+            text_key: str = "text",
+            batch_size: int = 50,
+            min_batch_size: int = 10,
+            max_batch_size: int = 500,
+            target_latency: float = 2.0,
+            embedding_batch_size: int = 100,
+            embedding_concurrency: int = 2,
+    ):
+        """構造函數，傳遞向量資料庫集合、文本嵌入模型以及批次大小的調整範圍"""
+        self.collection = collection
+        self.embeddings = embeddings
+        self.text_key = text_key
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_latency = target_latency
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_concurrency = embedding_concurrency
+
+    def write(self, lc_documents: list[LCDocument], ids: list[str], on_batch: BatchCallback) -> None:
+        """
+        將LangChain文件列表向量化並寫入向量資料庫，每寫入一批就調用一次on_batch回報結果，
+        on_batch在調用方執行緒中執行，因此可以直接使用調用方的資料庫會話
+        """
+        if len(lc_documents) == 0:
+            return
+
+        # 1.按向量化批次大小切分文件，背景執行緒池最多提前向量化並發數兩倍的批次，避免佔用過多記憶體
+        chunks = [
+            (lc_documents[i:i + self.embedding_batch_size], ids[i:i + self.embedding_batch_size])
+            for i in range(0, len(lc_documents), self.embedding_batch_size)
+        ]
+        max_pending = self.embedding_concurrency * 2
+        buffer: list[tuple[str, DataObject]] = []
+
+        with ThreadPoolExecutor(max_workers=self.embedding_concurrency) as executor:
+            pending: deque[tuple[list[LCDocument], list[str], Future]] = deque()
+            next_chunk = 0
+            while next_chunk < len(chunks) or len(pending) > 0:
+                # 2.持續投遞向量化任務，保持背景執行緒池處於忙碌狀態
+                while next_chunk < len(chunks) and len(pending) < max_pending:
+                    chunk_documents, chunk_ids = chunks[next_chunk]
+                    pending.append((chunk_documents, chunk_ids, executor.submit(
+                        self.embeddings.embed_documents,
+                        [lc_document.page_content for lc_document in chunk_documents],
+                    )))
+                    next_chunk += 1
+
+                # 3.按順序獲取向量化結果，向量化失敗時整個批次的物件都回報為失敗
+                chunk_documents, chunk_ids, future = pending.popleft()
+                try:
+                    vectors = future.result()
+                except Exception as e:
+                    logging.exception("向量化文件片段失敗, 錯誤資訊: %(error)s", {"error": e})
+                    on_batch([], {id: str(e) for id in chunk_ids})
+                    continue
+                buffer.extend(
+                    (id, self._build_object(id, lc_document, vector))
+                    for id, lc_document, vector in zip(chunk_ids, chunk_documents, vectors)
+                )
+
+                # 4.緩衝區達到當前批次大小時寫入向量資料庫，此時背景仍在向量化後續批次
+                while len(buffer) >= self.batch_size:
+                    batch, buffer = buffer[:self.batch_size], buffer[self.batch_size:]
+                    self._insert(batch, on_batch)
+
+        # 5.寫入剩餘不足一個批次的物件
+        while len(buffer) > 0:
+            batch, buffer = buffer[:self.batch_size], buffer[self.batch_size:]
+            self._insert(batch, on_batch)
+
+    def _insert(self, batch: list[tuple[str, DataObject]], on_batch: BatchCallback) -> None:
+        """寫入一個批次的物件並調整批次大小，請求級別的錯誤會拆分批次重試，直到達到最小批次大小"""
+        # 1.調用向量資料庫批次寫入介面並記錄延遲
+        start_at = time.monotonic()
+        try:
+            result = self.collection.data.insert_many([data_object for _, data_object in batch])
+        except Exception as e:
+            # 2.請求整體失敗時縮小批次大小，並將當前批次拆分成兩半重試
+            self._adjust(failed=True)
+            if len(batch) > self.min_batch_size:
+                middle = len(batch) // 2
+                self._insert(batch[:middle], on_batch)
+                self._insert(batch[middle:], on_batch)
+            else:
+                logging.exception("批次寫入向量資料庫失敗, 錯誤資訊: %(error)s", {"error": e})
+                on_batch([], {id: str(e) for id, _ in batch})
+            return
+
+        # 3.根據延遲與物件級別的錯誤調整批次大小，並回報每個物件的寫入結果
+        self._adjust(failed=len(result.errors) > 0, latency=time.monotonic() - start_at)
+        failed = {batch[index][0]: error.message for index, error in result.errors.items()}
+        on_batch([id for id, _ in batch if id not in failed], failed)
+
+    def _adjust(self, failed: bool, latency: float = 0) -> None:
+        """依據本次寫入的延遲與錯誤調整批次大小，出錯或超過目標延遲時減半，否則按最小批次大小遞增"""
+        if failed or latency > self.target_latency:
+            self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+        else:
+            self.batch_size = min(self.max_batch_size, self.batch_size + self.min_batch_size)
+
+    def _build_object(self, id: str, lc_document: LCDocument, vector: list[float]) -> DataObject:
+        """將LangChain文件及其向量轉換成向量資料庫物件，屬性結構與WeaviateVectorStore保持一致"""
+        return DataObject(
+            uuid=id,
+            properties={self.text_key: lc_document.page_content, **lc_document.metadata},
+            vector=vector,
+        )
@@ -0,0 +1,438 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午11:10
+@Author : zsting29@gmail.com
+@File   : local_vector_store.py
+"""
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Iterable, Iterator, Optional
+from uuid import UUID
+
+import numpy as np
+from langchain_core.documents import Document as LCDocument
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+# 每個知識庫目錄下的向量矩陣、旁車索引快照、旁車索引操作日誌與檔案鎖的檔名
+VECTORS_FILENAME = "vectors.f32"
+INDEX_FILENAME = "index.json"
+LOG_FILENAME = "index.log"
+LOCK_FILENAME = ".lock"
+
+# 操作日誌超過快照大小(且不小於該值，單位為位元組)時壓縮成新的快照，使寫入的總位元組數與記錄數保持線性
+MIN_LOG_COMPACT_SIZE = 1024 * 1024
+
+# 向量矩陣的最小容量(行數)，容量不足時按兩倍擴容
+MIN_CAPACITY = 1024
+
+
+@dataclass
+class _DatasetIndex:
+    """
+    單個知識庫的本地索引，向量矩陣以記憶體映射方式開啟，旁車索引記錄每一行的id、文本與元數據，
+    旁車索引由快照與追加寫入的操作日誌組成，新增、更新文本與更新元數據只追加日誌，刪除與擴容時才重寫快照
+    """
+    path: str
+    dimension: int = 0
+    capacity: int = 0
+    ids: list[str] = field(default_factory=list)
+    texts: list[str] = field(default_factory=list)
+    metadatas: list[dict[str, Any]] = field(default_factory=list)
+    vectors: Optional[np.memmap] = None
+    enabled: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+    rows: dict[str, int] = field(default_factory=dict)
+    version: Optional[tuple[int, int]] = None
+    log_offset: int = 0
+    pending: list[dict[str, Any]] = field(default_factory=list)
+    compact: bool = False
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    本地向量索引，每個知識庫的向量以歸一化後的float32矩陣儲存在記憶體映射檔案中，id/文本/元數據儲存在旁車JSON快照與操作日誌中，
+    檢索時以矩陣乘法暴力計算餘弦相似度、argpartition取top-k，並以布林遮罩套用文件與片段的啟用過濾，
+    多行程之間以檔案鎖保護讀寫，適合中小規模知識庫以及不依賴外部向量資料庫的單機部署
+    """
+    root_path: str
+    text_key: str
+
+    def __init__(self, root_path: str, embedding: Embeddings, text_key: str = "text"):
+        """構造函數，傳遞索引根目錄以及生成查詢向量的文本嵌入模型"""
+        self.root_path = root_path
+        self.text_key = text_key
+        self._embedding = embedding
+        self._indexes: dict[str, _DatasetIndex] = {}
+        self._lock = Lock()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def add_texts(
+            self,
+            texts: Iterable[str],
+            metadatas: Optional[list[dict]] = None,
+            ids: Optional[list[str]] = None,
+            **kwargs: Any,
+    ) -> list[str]:
+        """向量化文本並寫入元數據dataset_id對應的知識庫索引，已存在的id會被覆蓋"""
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(metadata["node_id"]) for metadata in metadatas]
+        self.add_embeddings(ids, self._embedding.embed_documents(texts), texts, metadatas)
+        return ids
+
+    def add_embeddings(
+            self,
+            ids: list[str],
+            vectors: list[list[float]],
+            texts: list[str],
+            metadatas: list[dict[str, Any]],
+    ) -> None:
+        """將已經向量化的記錄按元數據dataset_id分組寫入對應的知識庫索引，已存在的id會被覆蓋"""
+        # 1.按知識庫分組
+        groups: dict[str, list[int]] = {}
+        for idx, metadata in enumerate(metadatas):
+            groups.setdefault(str(metadata["dataset_id"]), []).append(idx)
+
+        # 2.逐個知識庫寫入，已存在的記錄原地覆蓋，新記錄追加到矩陣末尾
+        for dataset_id, indexes in groups.items():
+            matrix = self._normalize(np.asarray([vectors[idx] for idx in indexes], dtype=np.float32))
+            with self._open(dataset_id, exclusive=True) as index:
+                if index.count > 0 and index.dimension != matrix.shape[1]:
+                    raise ValueError(f"向量維度與知識庫索引不一致, 期望維度: {index.dimension}, 實際維度: {matrix.shape[1]}")
+                if index.dimension != matrix.shape[1]:
+                    index.dimension = matrix.shape[1]
+                    index.compact = True
+                new_count = index.count + len({ids[idx] for idx in indexes if ids[idx] not in index.rows})
+                self._ensure_capacity(index, new_count)
+                for vector, idx in zip(matrix, indexes):
+                    self._apply(index, {
+                        "op": "upsert",
+                        "id": ids[idx],
+                        "text": texts[idx],
+                        "metadata": dict(metadatas[idx]),
+                    })
+                    index.vectors[index.rows[ids[idx]]] = vector
+
+    def update_metadata(self, dataset_id: UUID | str, ids: list[str], properties: dict[str, Any]) -> None:
+        """批次更新知識庫索引中指定記錄的元數據，只追加一條操作日誌，不存在的記錄會被忽略"""
+        with self._open(dataset_id, exclusive=True) as index:
+            self._apply(index, {
+                "op": "update_metadata",
+                "ids": [id for id in ids if id in index.rows],
+                "properties": properties,
+            })
+
+    def update_text(self, dataset_id: UUID | str, id: str, text: str, vector: list[float]) -> None:
+        """更新知識庫索引中指定記錄的文本與向量，不存在的記錄會被忽略"""
+        with self._open(dataset_id, exclusive=True) as index:
+            row = index.rows.get(id)
+            if row is not None:
+                index.vectors[row] = self._normalize(np.asarray([vector], dtype=np.float32))[0]
+                self._apply(index, {"op": "update_text", "id": id, "text": text})
+
+    def delete(self, ids: Optional[list[str]] = None, dataset_id: UUID | str = None, **kwargs: Any) -> Optional[bool]:
+        """刪除知識庫索引中的指定記錄"""
+        if dataset_id is None:
+            raise ValueError("刪除本地向量索引記錄時必須傳遞知識庫id")
+        with self._open(dataset_id, exclusive=True) as index:
+            self._delete_rows(index, [index.rows[id] for id in ids or [] if id in index.rows])
+        return True
+
+    def delete_by_document_id(self, dataset_id: UUID | str, document_id: UUID | str) -> None:
+        """刪除知識庫索引中歸屬於指定文件的所有記錄"""
+        with self._open(dataset_id, exclusive=True) as index:
+            self._delete_rows(index, [
+                row for row, metadata in enumerate(index.metadatas)
+                if metadata.get("document_id") == str(document_id)
+            ])
+
+    def delete_dataset(self, dataset_id: UUID | str) -> None:
+        """刪除整個知識庫的本地索引"""
+        path = os.path.join(self.root_path, str(dataset_id))
+        if not os.path.isdir(path):
+            return
+        with self._open(dataset_id, exclusive=True):
+            shutil.rmtree(path, ignore_errors=True)
+        with self._lock:
+            self._indexes.pop(str(dataset_id), None)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list[LCDocument]:
+        return [lc_document for lc_document, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def similarity_search_with_score(
+            self,
+            query: str,
+            k: int = 4,
+            dataset_ids: Optional[list[UUID | str]] = None,
+            vector: Optional[list[float]] = None,
+            **kwargs: Any,
+    ) -> list[tuple[LCDocument, float]]:
+        """在指定的知識庫中檢索與query最相似的k條記錄(文件與片段均啟用)，得分為餘弦相似度，傳遞vector時不再嵌入query"""
+        # 1.生成歸一化後的查詢向量
+        if vector is None:
+            vector = self._embedding.embed_query(query)
+        vector = self._normalize(np.asarray([vector], dtype=np.float32))[0]
+
+        # 2.逐個知識庫計算相似度，未啟用的記錄以遮罩排除，並以argpartition取出各知識庫的top-k
+        candidates: list[tuple[float, LCDocument]] = []
+        for dataset_id in dataset_ids or []:
+            with self._open(dataset_id, exclusive=False) as index:
+                if index is None or index.count == 0 or index.dimension != vector.shape[0]:
+                    continue
+                scores = np.where(index.enabled, index.vectors[:index.count] @ vector, -np.inf)
+                top_k = min(k, index.count)
+                for row in np.argpartition(-scores, top_k - 1)[:top_k]:
+                    if np.isfinite(scores[row]):
+                        candidates.append((float(scores[row]), LCDocument(
+                            page_content=index.texts[row],
+                            metadata=dict(index.metadatas[row]),
+                        )))
+
+        # 3.合併所有知識庫的候選結果並取出整體top-k
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return [(lc_document, score) for score, lc_document in candidates[:k]]
+
+    def _select_relevance_score_fn(self):
+        """向量已經歸一化，檢索得分即為餘弦相似度，截斷到[0, 1]後直接作為相關性得分"""
+        return lambda score: min(max(score, 0.0), 1.0)
+
+    @classmethod
+    def from_texts(
+            cls,
+            texts: list[str],
+            embedding: Embeddings,
+            metadatas: Optional[list[dict]] = None,
+            **kwargs: Any,
+    ) -> "LocalVectorStore":
+        vector_store = cls(root_path=kwargs.pop("root_path"), embedding=embedding)
+        vector_store.add_texts(texts, metadatas, **kwargs)
+        return vector_store
+
+    @contextmanager
+    def _open(self, dataset_id: UUID | str, exclusive: bool) -> Iterator[Optional[_DatasetIndex]]:
+        """
+        以檔案鎖開啟知識庫索引，寫入使用排他鎖、讀取使用共享鎖，旁車索引變化(其他行程寫入)時增量或完整重新載入，
+        排他模式下離開上下文時將矩陣刷新到磁碟並提交本次的操作(追加日誌或重寫快照)，讀取不存在的知識庫時返回None
+        """
+        path = os.path.join(self.root_path, str(dataset_id))
+        if not exclusive and not os.path.isdir(path):
+            yield None
+            return
+        os.makedirs(path, exist_ok=True)
+
+        with open(os.path.join(path, LOCK_FILENAME), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                index = self._load(str(dataset_id), path)
+                try:
+                    yield index
+                    if exclusive and os.path.isdir(path):
+                        self._commit(index)
+                except Exception:
+                    # 寫入失敗時行程內快取可能已被部分修改，丟棄快取以便下次從磁碟重新載入
+                    with self._lock:
+                        self._indexes.pop(str(dataset_id), None)
+                    raise
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self, dataset_id: str, path: str) -> _DatasetIndex:
+        """載入知識庫索引，快照未變化時複用行程內快取並只重放新增的操作日誌，否則完整載入快照與日誌"""
+        # 1.以快照的修改時間與大小作為版本，版本未變化時複用快取並重放其他行程追加的日誌
+        index_path = os.path.join(path, INDEX_FILENAME)
+        version = self._get_version(index_path)
+        with self._lock:
+            index = self._indexes.get(dataset_id)
+        if index is not None and index.version == version:
+            self._replay(index)
+            return index
+
+        # 2.讀取快照並以記憶體映射方式開啟向量矩陣
+        index = _DatasetIndex(path=path, version=version)
+        if version is not None:
+            with open(index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            index.dimension = data["dimension"]
+            index.capacity = data["capacity"]
+            index.ids = data["ids"]
+            index.texts = data["texts"]
+            index.metadatas = data["metadatas"]
+            index.rows = {id: row for row, id in enumerate(index.ids)}
+            if index.capacity > 0:
+                index.vectors = np.memmap(
+                    os.path.join(path, VECTORS_FILENAME),
+                    dtype=np.float32,
+                    mode="r+",
+                    shape=(index.capacity, index.dimension),
+                )
+
+        # 3.根據元數據構建啟用遮罩，重放快照之後的操作日誌並寫入行程內快取
+        self._refresh_enabled(index)
+        self._replay(index)
+        with self._lock:
+            self._indexes[dataset_id] = index
+        return index
+
+    def _replay(self, index: _DatasetIndex) -> None:
+        """從上次讀取的位置開始重放操作日誌，未寫完整的最後一行(寫入中斷)會被忽略，同一行程內的多個讀取者依序重放"""
+        log_path = os.path.join(index.path, LOG_FILENAME)
+        with self._lock:
+            try:
+                with open(log_path, "rb") as f:
+                    f.seek(index.log_offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                if line:
+                    self._apply(index, json.loads(line), pending=False)
+            index.log_offset += end
+
+    def _apply(self, index: _DatasetIndex, operation: dict[str, Any], pending: bool = True) -> None:
+        """將一條操作套用到行程內索引並更新受影響行的啟用遮罩，pending為True時記錄到待提交的操作中"""
+        if operation["op"] == "upsert":
+            row = index.rows.get(operation["id"])
+            if row is None:
+                row = index.count
+                index.rows[operation["id"]] = row
+                index.ids.append(operation["id"])
+                index.texts.append(operation["text"])
+                index.metadatas.append(operation["metadata"])
+            else:
+                index.texts[row] = operation["text"]
+                index.metadatas[row] = operation["metadata"]
+            rows = [row]
+        elif operation["op"] == "update_text":
+            rows = [index.rows[operation["id"]]] if operation["id"] in index.rows else []
+            for row in rows:
+                index.texts[row] = operation["text"]
+        else:
+            rows = [index.rows[id] for id in operation["ids"] if id in index.rows]
+            for row in rows:
+                index.metadatas[row].update(operation["properties"])
+
+        # 更新受影響行的啟用遮罩，新增的行需要擴展遮罩長度
+        if len(index.enabled) < index.count:
+            index.enabled = np.concatenate([index.enabled, np.zeros(index.count - len(index.enabled), dtype=bool)])
+        for row in rows:
+            index.enabled[row] = self._is_enabled(index.metadatas[row])
+        if pending:
+            index.pending.append(operation)
+
+    def _commit(self, index: _DatasetIndex) -> None:
+        """
+        提交本次開啟期間的修改：先將矩陣刷新到磁碟，再追加操作日誌，刪除、擴容或日誌過大時改為重寫快照，
+        日誌只記錄已經落盤的向量對應的操作，寫入中斷時不會引用未寫入的向量
+        """
+        if index.vectors is not None:
+            index.vectors.flush()
+        log_path = os.path.join(index.path, LOG_FILENAME)
+        snapshot_size = index.version[1] if index.version is not None else 0
+        if index.compact or index.version is None or index.log_offset > max(snapshot_size, MIN_LOG_COMPACT_SIZE):
+            self._save(index)
+        elif len(index.pending) > 0:
+            with open(log_path, "ab") as f:
+                # 截掉寫入中斷時遺留的不完整行，避免與新的操作拼接成無法解析的一行
+                f.truncate(index.log_offset)
+                f.write(b"".join(
+                    json.dumps(operation, ensure_ascii=False).encode("utf-8") + b"\n" for operation in index.pending
+                ))
+                f.flush()
+                os.fsync(f.fileno())
+                index.log_offset = f.tell()
+        index.pending = []
+
+    def _save(self, index: _DatasetIndex) -> None:
+        """以臨時檔案+原子替換的方式寫入完整快照，並清空已經併入快照的操作日誌"""
+        index_path = os.path.join(index.path, INDEX_FILENAME)
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "dimension": index.dimension,
+                "capacity": index.capacity,
+                "ids": index.ids,
+                "texts": index.texts,
+                "metadatas": index.metadatas,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, index_path)
+        open(os.path.join(index.path, LOG_FILENAME), "wb").close()
+        index.version = self._get_version(index_path)
+        index.log_offset = 0
+        index.compact = False
+
+    @classmethod
+    def _ensure_capacity(cls, index: _DatasetIndex, count: int) -> None:
+        """矩陣容量不足時按兩倍擴容並重新映射"""
+        if count <= index.capacity:
+            return
+        capacity = max(MIN_CAPACITY, index.capacity * 2)
+        while capacity < count:
+            capacity *= 2
+
+        vectors_path = os.path.join(index.path, VECTORS_FILENAME)
+        if index.vectors is not None:
+            index.vectors.flush()
+            index.vectors = None
+        with open(vectors_path, "ab") as f:
+            f.truncate(capacity * index.dimension * np.dtype(np.float32).itemsize)
+        index.vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(capacity, index.dimension))
+        index.capacity = capacity
+        index.compact = True
+
+    @classmethod
+    def _delete_rows(cls, index: _DatasetIndex, rows: list[int]) -> None:
+        """刪除指定行並將保留的行緊湊地移動到矩陣前部"""
+        if len(rows) == 0:
+            return
+        removed = set(rows)
+        keep = [row for row in range(index.count) if row not in removed]
+        index.vectors[:len(keep)] = index.vectors[keep]
+        index.ids = [index.ids[row] for row in keep]
+        index.texts = [index.texts[row] for row in keep]
+        index.metadatas = [index.metadatas[row] for row in keep]
+        index.rows = {id: row for row, id in enumerate(index.ids)}
+        index.enabled = index.enabled[keep]
+        index.compact = True
+
+    @classmethod
+    def _refresh_enabled(cls, index: _DatasetIndex) -> None:
+        """根據元數據重建文件與片段均啟用的布林遮罩"""
+        index.enabled = np.fromiter(
+            (cls._is_enabled(metadata) for metadata in index.metadatas),
+            dtype=bool,
+            count=index.count,
+        )
+
+    @classmethod
+    def _is_enabled(cls, metadata: dict[str, Any]) -> bool:
+        """文件與片段均啟用時記錄才可被檢索"""
+        return metadata.get("document_enabled", True) is True and metadata.get("segment_enabled", True) is True
+
+    @classmethod
+    def _get_version(cls, index_path: str) -> Optional[tuple[int, int]]:
+        """以旁車索引的修改時間與大小作為版本，檔案不存在時返回None"""
+        try:
+            stat = os.stat(index_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @classmethod
+    def _normalize(cls, matrix: np.ndarray) -> np.ndarray:
+        """將向量按行做L2歸一化，內積即為餘弦相似度"""
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
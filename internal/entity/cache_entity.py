@@ -14,5 +14,55 @@ LOCK_DOCUMENT_UPDATE_ENABLED = "lock:document:update:enabled_{document_id}"
 # 更新關鍵字表快取鎖
 LOCK_KEYWORD_TABLE_UPDATE_KEYWORD_TABLE = "lock:keyword_table:update:keyword_table_{dataset_id}"
 
+# 文件構建心跳快取鍵，同時作為構建權的認領標記，工作行程退出後隨過期時間自動釋放
+DOCUMENT_BUILD_HEARTBEAT = "document:build:heartbeat_{document_id}"
+
+# 文件構建心跳的過期時間與續期間隔，單位為秒
+DOCUMENT_BUILD_HEARTBEAT_EXPIRE_TIME = 60
+DOCUMENT_BUILD_HEARTBEAT_INTERVAL = 20
+
+# 向量資料庫啟用中/遷移中的集合配置快取鍵，切換集合時在同一個事務內更新
+VECTOR_DATABASE_ACTIVE_COLLECTION = "vector_database:active_collection"
+VECTOR_DATABASE_MIGRATING_COLLECTION = "vector_database:migrating_collection"
+
+# 向量資料庫遷移期間的刪除記錄快取鍵，遷移任務切換集合前在目標集合重放，切換或重新開始遷移時清除
+VECTOR_DATABASE_MIGRATING_DELETIONS = "vector_database:migrating_deletions"
+
+# 向量資料庫遷移快取鎖，同一時間只允許一個遷移任務執行
+LOCK_VECTOR_DATABASE_MIGRATE = "lock:vector_database:migrate"
+
+# 知識庫查詢記錄與片段命中次數的寫後緩衝區快取鍵，刷新時先原子改名為待刷新鍵，刷新成功後再刪除
+DATASET_QUERY_BUFFER = "dataset_query:buffer"
+DATASET_QUERY_BUFFER_FLUSHING = "dataset_query:buffer:flushing"
+SEGMENT_HIT_COUNT_BUFFER = "segment:hit_count:buffer"
+SEGMENT_HIT_COUNT_BUFFER_FLUSHING = "segment:hit_count:buffer:flushing"
+
+# 刷新檢索記錄緩衝區快取鎖，同一時間只允許一個刷新任務執行
+LOCK_RETRIEVAL_RECORD_FLUSH = "lock:retrieval_record:flush"
+
+# 知識庫擁有者快取鍵，用於檢索時的權限校驗，刪除知識庫時清除
+DATASET_OWNER = "dataset:owner_{dataset_id}"
+
+# 知識庫內容版本號快取鍵，知識庫的向量或關鍵字數據發生變化時遞增，使包含該知識庫的檢索結果快取失效
+DATASET_CONTENT_VERSION = "dataset:content_version_{dataset_id}"
+
+# 檢索結果快取鍵，以(帳號、排序後的知識庫id列表、正規化的查詢、檢索策略、k、得分閾值)的雜湊區分
+RETRIEVAL_RESULT_CACHE = "retrieval:result:{key_hash}"
+
 # 更新片段啟用狀態快取鎖
 LOCK_SEGMENT_UPDATE_ENABLED = "lock:segment:update:enabled_{segment_id}"
+
+# 知識庫關鍵字倒排索引版本號快取鍵
+KEYWORD_TABLE_VERSION = "keyword_table:version_{dataset_id}"
+
+# 知識庫關鍵字倒排索引失效廣播頻道
+KEYWORD_TABLE_INVALIDATE_CHANNEL = "keyword_table:invalidate"
+
+# 文本嵌入快取鍵，以命名空間(document/query)、模型名字、維度、數據類型以及文本雜湊區分
+EMBEDDING_CACHE = "embeddings:{namespace}:{model}:{dimension}:{dtype}:{text_hash}"
+
+# 舊版RedisStore文本嵌入快取鍵(JSON格式、無過期時間)，僅用於遷移
+LEGACY_EMBEDDING_CACHE = "{namespace}{text_hash}"
+
+# 行程內最多快取的知識庫關鍵字倒排索引數
+KEYWORD_INDEX_CACHE_MAX_DATASETS = 64
@@ -62,6 +62,74 @@ class SegmentStatus(str, Enum):
     ERROR = "error"
 
 
+# 文件構建流水線各階段的並發數：解析(下載+載入)、分割+關鍵字索引、向量化+儲存
+DOCUMENT_PARSING_CONCURRENCY = 2
+DOCUMENT_SPLITTING_CONCURRENCY = 2
+DOCUMENT_EMBEDDING_CONCURRENCY = 4
+
+# 文件構建流水線階段之間的佇列長度，上游過快時會阻塞等待下游消費，避免佔用過多記憶體
+DOCUMENT_PIPELINE_QUEUE_SIZE = 4
+
+# 文件處於構建中狀態且超過該時間(秒)未更新、也沒有構建心跳時，視為構建中斷並重新投遞
+DOCUMENT_BUILD_STALE_TIME = 600
+
+# 重新索引文件時，每次從向量資料庫中批次刪除的片段數
+SEGMENT_DELETE_BATCH_SIZE = 1000
+
+# 向量資料庫自適應批次寫入的初始/最小/最大批次大小，以及單批寫入的目標延遲(秒)
+VECTOR_BATCH_SIZE = 50
+VECTOR_BATCH_MIN_SIZE = 10
+VECTOR_BATCH_MAX_SIZE = 500
+VECTOR_BATCH_TARGET_LATENCY = 2.0
+
+# 文件片段向量化時每次請求的文本數，以及單個文件同時進行的向量化請求數
+EMBEDDING_BATCH_SIZE = 100
+EMBEDDING_BATCH_CONCURRENCY = 2
+
+
+class VectorStoreType(str, Enum):
+    """向量資料庫後端類型，部署時透過VECTOR_STORE_TYPE環境變數選擇"""
+    WEAVIATE = "weaviate"  # Weaviate向量資料庫
+    LOCAL = "local"  # 本地記憶體映射向量索引，無需外部服務
+
+
+# 本地向量索引的預設儲存目錄，可以透過LOCAL_VECTOR_STORE_PATH環境變數覆蓋
+DEFAULT_LOCAL_VECTOR_STORE_PATH = "storage/vector_store"
+
+
+# 原生混合檢索中向量檢索的權重(0為純關鍵字BM25檢索，1為純向量檢索)，可以透過HYBRID_SEARCH_ALPHA環境變數覆蓋
+DEFAULT_HYBRID_SEARCH_ALPHA = 0.5
+
+
+# 融合混合檢索中向量檢索與全文檢索各自的超時時間(秒)，以及倒數排名融合的平滑常數
+SEMANTIC_RETRIEVAL_TIMEOUT = 5.0
+FULL_TEXT_RETRIEVAL_TIMEOUT = 3.0
+RECIPROCAL_RANK_FUSION_K = 60
+
+
+# 批次檢索時同時執行的向量檢索數
+BATCH_RETRIEVAL_CONCURRENCY = 8
+
+
+# 知識庫檢索結果可佔用模型上下文窗口的比例與上限(token)，模型上下文窗口未知時使用預設預算
+RETRIEVAL_CONTEXT_WINDOW_RATIO = 0.25
+RETRIEVAL_CONTEXT_MAX_TOKENS = 8000
+RETRIEVAL_CONTEXT_DEFAULT_TOKENS = 4000
+
+
+# 合併相鄰片段時識別分割重疊文本的最短/最長字元數
+RETRIEVAL_CONTEXT_MIN_OVERLAP = 10
+RETRIEVAL_CONTEXT_MAX_OVERLAP = 2000
+
+
+# 知識庫擁有者快取的過期時間(秒)，刪除知識庫時會主動清除，過期時間只用於兜底
+DATASET_OWNER_CACHE_TTL = 60
+
+
+# 檢索結果快取的過期時間(秒)，知識庫內容變化時透過版本號立即失效，過期時間只用於回收不再被查詢的結果
+RETRIEVAL_RESULT_CACHE_TTL = 600
+
+
 class RetrievalStrategy(str, Enum):
     """檢索策略類型枚舉"""
     FULL_TEXT = "full_text"  # 全文檢索
@@ -0,0 +1,29 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午7:40
+@Author : zsting29@gmail.com
+@File   : embeddings_entity.py
+"""
+# 預設使用的文本嵌入模型與維度，部署時可以透過EMBEDDING_MODEL與EMBEDDING_DIMENSIONS環境變數覆蓋，
+# 自訂維度僅text-embedding-3系列模型支持
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+DEFAULT_EMBEDDING_DIMENSION = 1536
+
+# 文本嵌入快取的數據類型(float32/float16)與過期時間(秒)
+EMBEDDING_CACHE_DTYPE = "float32"
+EMBEDDING_CACHE_TTL = 30 * 86400
+
+# 舊版RedisStore文本嵌入快取使用的命名空間
+LEGACY_EMBEDDING_CACHE_NAMESPACE = "embeddings"
+
+# 查詢嵌入行程內快取的最大條數與過期時間(秒)
+QUERY_EMBEDDING_LOCAL_CACHE_SIZE = 10000
+QUERY_EMBEDDING_LOCAL_CACHE_TTL = 600
+
+# 查詢嵌入Redis快取的過期時間(秒)
+QUERY_EMBEDDING_REDIS_CACHE_TTL = 86400
+
+# 向量資料庫遷移時每批重新向量化的片段數，以及批次之間的間隔時間(秒)，用於限制遷移對線上服務的影響
+VECTOR_MIGRATION_BATCH_SIZE = 200
+VECTOR_MIGRATION_BATCH_INTERVAL = 1.0
@@ -0,0 +1,22 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午10:20
+@Author : zsting29@gmail.com
+@File   : weaviate_extension.py
+"""
+import atexit
+
+from celery.signals import worker_process_shutdown
+from flask import Flask
+
+from pkg.weaviate import FlaskWeaviate
+
+weaviate = FlaskWeaviate()
+
+
+def init_app(app: Flask):
+    """初始化weaviate擴展，並在行程退出(Flask)與worker子行程關閉(Celery)時釋放連接"""
+    weaviate.init_app(app)
+    atexit.register(weaviate.close)
+    worker_process_shutdown.connect(lambda **kwargs: weaviate.close(), weak=False)
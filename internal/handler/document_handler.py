@@ -17,7 +17,8 @@ from internal.schema.document_schema import (
     CreateDocumentsResp,
     GetDocumentResp,
     UpdateDocumentNameReq,
-    GetDocumentsWithPageReq, GetDocumentsWithPageResp, UpdateDocumentEnabledReq
+    GetDocumentsWithPageReq, GetDocumentsWithPageResp, UpdateDocumentEnabledReq,
+    ReindexDocumentReq,
 )
 from internal.service import DocumentService
 from pkg.paginator import PageModel
@@ -105,6 +106,19 @@ class DocumentHandler:
 
         return success_message("更改文件啟用狀態成功")
 
+    @login_required
+    def reindex_document(self, dataset_id: UUID, document_id: UUID):
+        """根據傳遞的知識庫id+文件id，使用新的上傳文件增量重建文件索引"""
+        # 1.提取請求並校驗
+        req = ReindexDocumentReq()
+        if not req.validate():
+            return validate_error_json(req.errors)
+
+        # 2.調用服務重新索引文件
+        self.document_service.reindex_document(dataset_id, document_id, UUID(req.upload_file_id.data), current_user)
+
+        return success_message("文件已開始重新索引")
+
     @login_required
     def delete_document(self, dataset_id: UUID, document_id: UUID):
         """根據傳遞的知識庫id+文件id刪除指定的文件資訊"""
@@ -0,0 +1,72 @@
+"""keyword posting table
+
+Revision ID: 3b1f6c2d9a7e
+Revises: ea6919890260
+Create Date: 2026-10-18 10:12:41.205318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '3b1f6c2d9a7e'
+down_revision = 'ea6919890260'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 1.創建關鍵詞倒排表
+    op.create_table('keyword_posting',
+    sa.Column('dataset_id', sa.UUID(), nullable=False),
+    sa.Column('keyword', sa.String(length=255), nullable=False),
+    sa.Column('segment_id', sa.UUID(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP(0)'), nullable=False),
+    sa.PrimaryKeyConstraint('dataset_id', 'keyword', 'segment_id', name='pk_keyword_posting_id')
+    )
+    with op.batch_alter_table('keyword_posting', schema=None) as batch_op:
+        batch_op.create_index('keyword_posting_dataset_id_segment_id_idx', ['dataset_id', 'segment_id'], unique=False)
+
+    # 2.將原有keyword_table中的JSONB關鍵字表展開並回填到倒排表，同時剔除已經不存在的片段
+    op.execute("""
+        INSERT INTO keyword_posting (dataset_id, keyword, segment_id)
+        SELECT kt.dataset_id, kw.key, s.id
+        FROM keyword_table kt
+        CROSS JOIN LATERAL jsonb_each(kt.keyword_table) AS kw(key, value)
+        CROSS JOIN LATERAL jsonb_array_elements_text(kw.value) AS sid(value)
+        JOIN segment s ON s.id::text = sid.value AND s.dataset_id = kt.dataset_id
+        WHERE length(kw.key) <= 255
+        ON CONFLICT DO NOTHING
+    """)
+
+    # 3.刪除舊的JSONB關鍵字表欄位
+    with op.batch_alter_table('keyword_table', schema=None) as batch_op:
+        batch_op.drop_column('keyword_table')
+
+
+def downgrade():
+    # 1.恢復JSONB關鍵字表欄位，並從倒排表聚合回寫
+    with op.batch_alter_table('keyword_table', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('keyword_table', postgresql.JSONB(astext_type=sa.Text()), server_default=sa.text("'{}'::jsonb"), nullable=False))
+
+    op.execute("""
+        UPDATE keyword_table kt
+        SET keyword_table = agg.keyword_table
+        FROM (
+            SELECT dataset_id, jsonb_object_agg(keyword, segment_ids) AS keyword_table
+            FROM (
+                SELECT dataset_id, keyword, jsonb_agg(segment_id::text) AS segment_ids
+                FROM keyword_posting
+                GROUP BY dataset_id, keyword
+            ) grouped
+            GROUP BY dataset_id
+        ) agg
+        WHERE kt.dataset_id = agg.dataset_id
+    """)
+
+    # 2.刪除關鍵詞倒排表
+    with op.batch_alter_table('keyword_posting', schema=None) as batch_op:
+        batch_op.drop_index('keyword_posting_dataset_id_segment_id_idx')
+
+    op.drop_table('keyword_posting')
@@ -0,0 +1,68 @@
+"""keyword bm25 statistics
+
+Revision ID: 7c4e2a91d5b3
+Revises: 3b1f6c2d9a7e
+Create Date: 2026-10-18 14:36:08.517930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '7c4e2a91d5b3'
+down_revision = '3b1f6c2d9a7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 1.倒排記錄新增詞頻與片段長度，關鍵字表新增知識庫級別的統計資訊
+    with op.batch_alter_table('keyword_posting', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('term_frequency', sa.Integer(), server_default=sa.text('1'), nullable=False))
+        batch_op.add_column(sa.Column('segment_length', sa.Integer(), server_default=sa.text('0'), nullable=False))
+
+    with op.batch_alter_table('keyword_table', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('segment_count', sa.Integer(), server_default=sa.text('0'), nullable=False))
+        batch_op.add_column(sa.Column('total_segment_length', sa.BigInteger(), server_default=sa.text('0'), nullable=False))
+
+    # 2.根據片段內容回填詞頻與片段長度
+    op.execute("""
+        UPDATE keyword_posting kp
+        SET term_frequency = GREATEST(
+                (length(lower(s.content)) - length(replace(lower(s.content), lower(kp.keyword), '')))
+                / GREATEST(length(kp.keyword), 1),
+                1
+            ),
+            segment_length = s.token_count
+        FROM segment s
+        WHERE s.id = kp.segment_id
+    """)
+
+    # 3.補齊缺失的關鍵字表記錄，並回填知識庫統計資訊
+    op.execute("""
+        INSERT INTO keyword_table (dataset_id)
+        SELECT DISTINCT kp.dataset_id
+        FROM keyword_posting kp
+        WHERE NOT EXISTS (SELECT 1 FROM keyword_table kt WHERE kt.dataset_id = kp.dataset_id)
+    """)
+    op.execute("""
+        UPDATE keyword_table kt
+        SET segment_count = st.segment_count,
+            total_segment_length = st.total_segment_length
+        FROM (
+            SELECT dataset_id, count(*) AS segment_count, sum(segment_length) AS total_segment_length
+            FROM (SELECT DISTINCT dataset_id, segment_id, segment_length FROM keyword_posting) indexed_segment
+            GROUP BY dataset_id
+        ) st
+        WHERE kt.dataset_id = st.dataset_id
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('keyword_table', schema=None) as batch_op:
+        batch_op.drop_column('total_segment_length')
+        batch_op.drop_column('segment_count')
+
+    with op.batch_alter_table('keyword_posting', schema=None) as batch_op:
+        batch_op.drop_column('segment_length')
+        batch_op.drop_column('term_frequency')
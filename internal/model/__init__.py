@@ -10,7 +10,7 @@ from .api_key import ApiKey
 from .api_tool import ApiToolProvider, ApiTool
 from .app import App, AppDatasetJoin, AppConfig, AppConfigVersion
 from .conversation import Conversation, Message, MessageAgentThought
-from .dataset import Dataset, DatasetQuery, Document, Segment, KeywordTable, ProcessRule
+from .dataset import Dataset, DatasetQuery, Document, Segment, KeywordTable, KeywordPosting, ProcessRule
 from .end_user import EndUser
 from .upload_file import UploadFile
 from .workflow import Workflow, WorkflowResult
@@ -28,6 +28,7 @@ __all__ = [
     "Document",
     "Segment",
     "KeywordTable",
+    "KeywordPosting",
     "ProcessRule",
     "Conversation",
     "Message",
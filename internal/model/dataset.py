@@ -15,7 +15,8 @@ from sqlalchemy import (
     DateTime,
     text,
     PrimaryKeyConstraint,
-    Integer, Boolean, func,
+    Index,
+    Integer, BigInteger, Boolean, func,
 )
 from sqlalchemy.dialects.postgresql import JSONB
 
@@ -206,7 +207,8 @@ class KeywordTable(db.Model):
 
     id = Column(UUID, nullable=False, server_default=text("uuid_generate_v4()"))
     dataset_id = Column(UUID, nullable=False)
-    keyword_table = Column(JSONB, nullable=False, server_default=text("'{}'::jsonb"))
+    segment_count = Column(Integer, nullable=False, server_default=text("0"))  # 已建立倒排索引的片段數，BM25中的N
+    total_segment_length = Column(BigInteger, nullable=False, server_default=text("0"))  # 已索引片段的token總數，用於計算平均長度
     updated_at = Column(
         DateTime,
         nullable=False,
@@ -216,6 +218,22 @@ class KeywordTable(db.Model):
     created_at = Column(DateTime, nullable=False, server_default=text('CURRENT_TIMESTAMP(0)'))
 
 
+class KeywordPosting(db.Model):
+    """關鍵詞倒排表，每條記錄表示知識庫下的某個關鍵詞命中了某個片段"""
+    __tablename__ = "keyword_posting"
+    __table_args__ = (
+        PrimaryKeyConstraint("dataset_id", "keyword", "segment_id", name="pk_keyword_posting_id"),
+        Index("keyword_posting_dataset_id_segment_id_idx", "dataset_id", "segment_id"),
+    )
+
+    dataset_id = Column(UUID, nullable=False)
+    keyword = Column(String(255), nullable=False)
+    segment_id = Column(UUID, nullable=False)
+    term_frequency = Column(Integer, nullable=False, server_default=text("1"))  # 關鍵詞在片段中出現的次數
+    segment_length = Column(Integer, nullable=False, server_default=text("0"))  # 寫入時片段的token數
+    created_at = Column(DateTime, nullable=False, server_default=text('CURRENT_TIMESTAMP(0)'))
+
+
 class DatasetQuery(db.Model):
     """知識庫查詢表"""
     __tablename__ = "dataset_query"
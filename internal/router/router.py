@@ -250,6 +250,11 @@ class Router:
             methods=["POST"],
             view_func=self.document_handler.update_document_enabled,
         )
+        bp.add_url_rule(
+            "/datasets/<uuid:dataset_id>/documents/<uuid:document_id>/reindex",
+            methods=["POST"],
+            view_func=self.document_handler.reindex_document,
+        )
         bp.add_url_rule(
             "/datasets/<uuid:dataset_id>/documents/<uuid:document_id>/delete",
             methods=["POST"],
@@ -10,7 +10,7 @@ import uuid
 from flask_wtf import FlaskForm
 from marshmallow import Schema, fields, pre_dump
 from wtforms.fields.simple import StringField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, ValidationError, Length, Optional
+from wtforms.validators import DataRequired, AnyOf, ValidationError, Length, Optional, UUID
 
 from internal.entity.dataset_entity import ProcessType, DEFAULT_PROCESS_RULE
 from internal.lib.helper import datetime_to_timestamp
@@ -236,3 +236,11 @@ class UpdateDocumentEnabledReq(FlaskForm):
         """校驗文件啟用狀態enabled"""
         if not isinstance(field.data, bool):
             raise ValidationError("enabled狀態不能為空且必須為布林值")
+
+
+class ReindexDocumentReq(FlaskForm):
+    """重新索引文件請求"""
+    upload_file_id = StringField("upload_file_id", validators=[
+        DataRequired("上傳文件id不能為空"),
+        UUID(message="上傳文件id格式必須為uuid"),
+    ])
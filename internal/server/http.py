@@ -15,7 +15,7 @@ from flask_migrate import Migrate
 
 from config import Config
 from internal.exception import CustomException
-from internal.extension import logging_extension, redis_extension, celery_extension
+from internal.extension import logging_extension, redis_extension, celery_extension, weaviate_extension
 from internal.middleware.middleware import Middleware
 from internal.router import Router
 from pkg.response import Response, json, HttpCode
@@ -49,6 +49,7 @@ class Http(Flask):
         db.init_app(self)
         migrate.init_app(self, db, directory='internal/migration')
         redis_extension.init_app(self)
+        weaviate_extension.init_app(self)
         celery_extension.init_app(self)
         logging_extension.init_app(self)
         login_manager.init_app(self)
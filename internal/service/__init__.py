@@ -14,6 +14,7 @@ from .assistant_agent_service import AssistantAgentService
 from .base_service import BaseService
 from .buildin_tool_service import BuildinToolService
 from .builtin_app_service import BuiltinAppService
+from .context_packer_service import ContextPackerService
 from .conversation_service import ConversationService
 from .dataset_service import DatasetService
 from .document_service import DocumentService
@@ -30,6 +31,10 @@ from .openapi_service import OpenAPIService
 from .process_rule_service import ProcessRuleService
 from .retrieval_service import RetrievalService
 from .segment_service import SegmentService
+from .token_count_service import TokenCountService
+from .vector_migration_service import VectorMigrationService
+from .retrieval_record_service import RetrievalRecordService
+from .retrieval_cache_service import RetrievalCacheService
 from .upload_file_service import UploadFileService
 from .vector_database_service import VectorDatabaseService
 from .workflow_service import WorkflowService
@@ -62,5 +67,10 @@ __all__ = [
     "BuiltinAppService",
     "WorkflowService",
     "AssistantAgentService",
-    "FaissService"
+    "FaissService",
+    "TokenCountService",
+    "VectorMigrationService",
+    "RetrievalRecordService",
+    "RetrievalCacheService",
+    "ContextPackerService",
 ]
@@ -467,6 +467,7 @@ class AppService(BaseService):
                 dataset_ids=[dataset["id"] for dataset in draft_app_config["datasets"]],
                 account_id=account.id,
                 retrival_source=RetrievalSource.APP,
+                context_window=llm.context_window,
                 **draft_app_config["retrieval_config"],
             )
             tools.append(dataset_retrieval)
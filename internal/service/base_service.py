@@ -7,6 +7,8 @@
 """
 from typing import Any, Optional
 
+from sqlalchemy import insert
+
 from internal.exception import FailException
 from pkg.sqlalchemy import SQLAlchemy
 
@@ -22,6 +24,13 @@ class BaseService:
             self.db.session.add(model_instance)
         return model_instance
 
+    def bulk_create(self, model: Any, values: list[dict[str, Any]]) -> None:
+        """根據傳遞的模型類+鍵值對列表批次創建數據庫紀錄，所有數據在同一個事務內以多行INSERT寫入"""
+        if len(values) == 0:
+            return
+        with self.db.auto_commit():
+            self.db.session.execute(insert(model), values)
+
     def delete(self, model_instance: Any) -> Any:
         """根據傳遞的模型實例刪除數據庫紀錄"""
         with self.db.auto_commit():
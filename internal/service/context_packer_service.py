@@ -0,0 +1,111 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 上午3:20
+@Author : zsting29@gmail.com
+@File   : context_packer_service.py
+"""
+from dataclasses import dataclass
+from uuid import UUID
+
+from injector import inject
+from langchain_core.documents import Document as LCDocument
+
+from internal.entity.dataset_entity import (
+    RETRIEVAL_CONTEXT_WINDOW_RATIO,
+    RETRIEVAL_CONTEXT_MAX_TOKENS,
+    RETRIEVAL_CONTEXT_DEFAULT_TOKENS,
+    RETRIEVAL_CONTEXT_MIN_OVERLAP,
+    RETRIEVAL_CONTEXT_MAX_OVERLAP,
+)
+from internal.model import Segment
+from pkg.sqlalchemy import SQLAlchemy
+from .base_service import BaseService
+from .token_count_service import TokenCountService
+
+
+@inject
+@dataclass
+class ContextPackerService(BaseService):
+    """
+    檢索上下文打包服務，按檢索排名將片段裝入token預算，同一文件中位置相鄰的片段合併成一段，
+    並去除分割時重疊的文本，避免檢索結果無限制地放大提示詞
+    """
+    db: SQLAlchemy
+    token_count_service: TokenCountService
+
+    @classmethod
+    def get_max_tokens(cls, context_window: int = 0) -> int:
+        """根據模型的上下文窗口計算檢索結果可以佔用的token預算"""
+        if context_window <= 0:
+            return RETRIEVAL_CONTEXT_DEFAULT_TOKENS
+        return min(int(context_window * RETRIEVAL_CONTEXT_WINDOW_RATIO), RETRIEVAL_CONTEXT_MAX_TOKENS)
+
+    def pack_documents(self, documents_list: list[list[LCDocument]], max_tokens: int) -> list[str]:
+        """批次打包多次檢索的文件列表，所有片段的位置只查詢一次資料庫，返回順序與傳遞的文件列表一致"""
+        # 1.一次性查詢所有片段在文件中的位置，用於判斷片段是否相鄰
+        segment_ids = list({
+            document.metadata["segment_id"] for documents in documents_list for document in documents
+        })
+        positions = {
+            str(id): position for id, position in self.db.session.query(Segment).with_entities(
+                Segment.id, Segment.position,
+            ).filter(Segment.id.in_([UUID(str(id)) for id in segment_ids])).all()
+        } if len(segment_ids) > 0 else {}
+
+        # 2.逐個打包
+        return [self._pack(documents, positions, max_tokens) for documents in documents_list]
+
+    def _pack(self, documents: list[LCDocument], positions: dict[str, int], max_tokens: int) -> str:
+        """按檢索排名將片段裝入token預算，再合併相鄰片段並拼接成字串"""
+        # 1.去除內容完全相同的片段，並使用快取的token數按排名依序裝入預算，裝不下的片段跳過
+        unique_documents, seen_contents = [], set()
+        for document in documents:
+            if document.page_content not in seen_contents:
+                seen_contents.add(document.page_content)
+                unique_documents.append(document)
+        documents = unique_documents
+        token_counts = self.token_count_service.calculate_token_counts(
+            [document.page_content for document in documents],
+        )
+        selected, used_tokens = [], 0
+        for rank, (document, token_count) in enumerate(zip(documents, token_counts)):
+            if used_tokens + token_count <= max_tokens:
+                selected.append((rank, document))
+                used_tokens += token_count
+        if len(selected) == 0 and len(documents) > 0:
+            # 排名第一的片段本身超出預算時，按token截斷後保留
+            encoding = self.token_count_service.get_encoding()
+            return encoding.decode(encoding.encode(documents[0].page_content, disallowed_special=())[:max_tokens])
+
+        # 2.按文件分組並按位置排序，位置連續的片段合併成一段(去除重疊文本)，每段以其中最高的排名排序
+        groups: dict[str, list[tuple[int, int, LCDocument]]] = {}
+        for rank, document in selected:
+            position = positions.get(str(document.metadata["segment_id"]))
+            key = str(document.metadata.get("document_id")) if position is not None else f"segment:{rank}"
+            groups.setdefault(key, []).append((position or 0, rank, document))
+        chunks: list[tuple[int, str]] = []
+        for items in groups.values():
+            items.sort(key=lambda item: item[0])
+            best_rank, text, last_position = items[0][1], items[0][2].page_content, items[0][0]
+            for position, rank, document in items[1:]:
+                if position == last_position + 1:
+                    text = self._merge_overlap(text, document.page_content)
+                    best_rank = min(best_rank, rank)
+                else:
+                    chunks.append((best_rank, text))
+                    best_rank, text = rank, document.page_content
+                last_position = position
+            chunks.append((best_rank, text))
+
+        # 3.按排名拼接所有段落
+        return "\n\n".join(text for _, text in sorted(chunks, key=lambda chunk: chunk[0]))
+
+    @classmethod
+    def _merge_overlap(cls, previous: str, current: str) -> str:
+        """合併位置相鄰的兩個片段，前一片段的結尾與當前片段的開頭重疊(分割時的chunk_overlap)時只保留一份"""
+        max_overlap = min(len(previous), len(current), RETRIEVAL_CONTEXT_MAX_OVERLAP)
+        for length in range(max_overlap, RETRIEVAL_CONTEXT_MIN_OVERLAP - 1, -1):
+            if previous.endswith(current[:length]):
+                return previous + current[length:]
+        return f"{previous}\n{current}"
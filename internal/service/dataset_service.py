@@ -37,6 +37,7 @@ from internal.task.dataset_task import delete_dataset
 from pkg.paginator import Paginator
 from pkg.sqlalchemy import SQLAlchemy
 from .base_service import BaseService
+from .retrieval_cache_service import RetrievalCacheService
 from .retrieval_service import RetrievalService
 
 
@@ -46,6 +47,7 @@ class DatasetService(BaseService):
     """知識庫服務"""
     db: SQLAlchemy
     retrieval_service: RetrievalService
+    retrieval_cache_service: RetrievalCacheService
 
     def create_dataset(self, req: CreateDatasetReq, account: Account) -> Dataset:
         """創建知識庫"""
@@ -220,8 +222,10 @@ class DatasetService(BaseService):
                     AppDatasetJoin.dataset_id == dataset_id,
                 ).delete()
 
-            # 3.調用非同步任務執行後續的操作
-            delete_dataset.delay(dataset_id)
+            # 3.清除知識庫擁有者快取並使檢索結果快取立即失效，然後調用非同步任務執行後續的操作
+            self.retrieval_service.invalidate_dataset_owner(dataset_id)
+            self.retrieval_cache_service.bump_versions([dataset_id])
+            delete_dataset.delay(dataset_id, account.id)
         except Exception as e:
             logging.exception(
                 "刪除知識庫失敗, dataset_id: %(dataset_id)s, 錯誤資訊: %(error)s",
@@ -23,7 +23,7 @@ from internal.exception import ForbiddenException, FailException, NotFoundExcept
 from internal.lib.helper import datetime_to_timestamp
 from internal.model import Document, Dataset, UploadFile, ProcessRule, Segment, Account
 from internal.schema.document_schema import GetDocumentsWithPageReq
-from internal.task.document_task import build_documents, update_document_enabled, delete_document
+from internal.task.document_task import build_documents, update_document_enabled, delete_document, reindex_document
 from pkg.paginator import Paginator
 from pkg.sqlalchemy import SQLAlchemy
 from .base_service import BaseService
@@ -253,6 +253,41 @@ class DocumentService(BaseService):
 
         return document
 
+    def reindex_document(self, dataset_id: UUID, document_id: UUID, upload_file_id: UUID, account: Account) -> Document:
+        """
+        根據傳遞的知識庫id+文件id+新的上傳文件id重新索引文件，
+        非同步任務只會為內容有變化的片段重新向量化，未變化的片段保持不變
+        """
+        # 1.獲取文件並校驗權限
+        document = self.get(Document, document_id)
+        if document is None:
+            raise NotFoundException("該文件不存在，請核實後重試")
+        if document.dataset_id != dataset_id or document.account_id != account.id:
+            raise ForbiddenException("當前用戶無權限修改該知識庫下的文件，請核實後重試")
+
+        # 2.判斷文件是否處於可重新索引的狀態，構建完成的文件需處於啟用狀態，避免新舊片段的啟用狀態不一致
+        if document.status not in [DocumentStatus.COMPLETED, DocumentStatus.ERROR]:
+            raise FailException("當前文件處於不可重新索引狀態，請稍後重試")
+        if document.status == DocumentStatus.COMPLETED and not document.enabled:
+            raise FailException("當前文件已禁用，請啟用後再重新索引")
+
+        # 3.校驗上傳文件的權限與擴展名
+        upload_file = self.get(UploadFile, upload_file_id)
+        if (
+                upload_file is None
+                or upload_file.account_id != account.id
+                or upload_file.extension.lower() not in ALLOWED_DOCUMENT_EXTENSION
+        ):
+            raise FailException("暫未解析到合法文件，請重新上傳")
+
+        # 4.更新文件關聯的上傳文件並重置狀態，避免構建期間被修改或刪除
+        self.update(document, upload_file_id=upload_file.id, status=DocumentStatus.WAITING)
+
+        # 5.調用非同步任務完成增量索引
+        reindex_document.delay(document.id)
+
+        return document
+
     def delete_document(self, dataset_id: UUID, document_id: UUID, account: Account) -> Document:
         """根據傳遞的知識庫id+文件id刪除文件資訊，涵蓋：文件片段刪除、關鍵字表更新、weaviate向量資料庫記錄刪除"""
         # 1.獲取文件並校驗權限
@@ -270,7 +305,7 @@ class DocumentService(BaseService):
         self.delete(document)
 
         # 4.調用非同步任務執行後續操作，涵蓋：關鍵字表更新、片段數據刪除、weaviate記錄刪除等
-        delete_document.delay(dataset_id, document_id)
+        delete_document.delay(dataset_id, document_id, account.id)
 
         return document
 
@@ -5,56 +5,130 @@
 @Author : zsting29@gmail.com
 @File   : embeddings_service.py
 """
+import os
 from dataclasses import dataclass
+from threading import Lock
 
-import tiktoken
-from injector import inject
+from injector import inject, singleton
 from langchain.embeddings import CacheBackedEmbeddings
-from langchain_community.storage import RedisStore
 from langchain_core.embeddings import Embeddings
 from langchain_openai import OpenAIEmbeddings
 from redis import Redis
 
+from internal.core.embeddings import MicroBatchEmbeddings, PackedEmbeddingStore, QueryCacheEmbeddings
+from internal.entity.embeddings_entity import (
+    DEFAULT_EMBEDDING_MODEL,
+    DEFAULT_EMBEDDING_DIMENSION,
+    LEGACY_EMBEDDING_CACHE_NAMESPACE,
+    QUERY_EMBEDDING_REDIS_CACHE_TTL,
+)
+
 
 @inject
+@singleton
 @dataclass
 class EmbeddingsService:
-    """文本崁入模型服務"""
-    _store: RedisStore
-    _embeddings: Embeddings
-    _cache_backed_embeddings: CacheBackedEmbeddings
+    """
+    文本崁入模型服務，部署時透過EMBEDDING_MODEL與EMBEDDING_DIMENSIONS環境變數配置模型與維度，
+    向量資料庫遷移期間需要同時使用新舊兩種模型，因此每種模型+維度組合各自擁有一套嵌入模型與快取
+    """
+    _redis: Redis
+    _model: str
+    _dimension: int
+    _models: dict[tuple[str, int], tuple[PackedEmbeddingStore, Embeddings, CacheBackedEmbeddings]]
 
     def __init__(self, redis: Redis):
-        """構造函數，初始化文本嵌入模型客戶端、儲存器、緩存客戶端"""
-        self._store = RedisStore(client=redis)
-        # self._embeddings = HuggingFaceEmbeddings(
-        #     model_name="Alibaba-NLP/gte-multilingual-base",
-        #     cache_folder=os.path.join(os.getcwd(), "internal", "core", "embeddings"),
-        #     model_kwargs={
-        #         "trust_remote_code": True,
-        #     }
-        # )
-        self._embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-        self._cache_backed_embeddings = CacheBackedEmbeddings.from_bytes_store(
-            self._embeddings,
-            self._store,
-            namespace="embeddings",
-        )
+        """構造函數，讀取部署配置的文本嵌入模型與維度，各模型的客戶端與快取在首次使用時初始化"""
+        self._redis = redis
+        self._model = os.getenv("EMBEDDING_MODEL") or DEFAULT_EMBEDDING_MODEL
+        self._dimension = int(os.getenv("EMBEDDING_DIMENSIONS") or DEFAULT_EMBEDDING_DIMENSION)
+        self._models = {}
+        self._lock = Lock()
+
+    @property
+    def model(self) -> str:
+        """部署配置的文本嵌入模型名字"""
+        return self._model
 
-    @classmethod
-    def calculate_token_count(cls, query: str) -> int:
-        """計算傳入文本的token數"""
-        encoding = tiktoken.encoding_for_model("gpt-3.5")
-        return len(encoding.encode(query))
+    @property
+    def dimension(self) -> int:
+        """部署配置的文本嵌入維度"""
+        return self._dimension
 
     @property
-    def store(self) -> RedisStore:
-        return self._store
+    def store(self) -> PackedEmbeddingStore:
+        return self._get_model(self._model, self._dimension)[0]
 
     @property
     def embeddings(self) -> Embeddings:
-        return self._embeddings
+        return self._get_model(self._model, self._dimension)[1]
 
     @property
     def cache_backed_embeddings(self) -> CacheBackedEmbeddings:
-        return self._cache_backed_embeddings
+        return self._get_model(self._model, self._dimension)[2]
+
+    def get_embeddings(self, model: str, dimension: int) -> Embeddings:
+        """根據模型名字+維度獲取帶查詢快取的文本嵌入模型"""
+        return self._get_model(model, dimension)[1]
+
+    def get_cache_backed_embeddings(self, model: str, dimension: int) -> CacheBackedEmbeddings:
+        """根據模型名字+維度獲取帶文件嵌入快取的文本嵌入模型"""
+        return self._get_model(model, dimension)[2]
+
+    def migrate_legacy_embeddings_cache(self) -> int:
+        """將舊版JSON格式的文件嵌入快取遷移成緊湊二進位格式，返回遷移的數量"""
+        return self._get_model(DEFAULT_EMBEDDING_MODEL, DEFAULT_EMBEDDING_DIMENSION)[0].migrate_legacy_keys()
+
+    def _get_model(
+            self,
+            model: str,
+            dimension: int,
+    ) -> tuple[PackedEmbeddingStore, Embeddings, CacheBackedEmbeddings]:
+        """獲取模型名字+維度對應的快取儲存、嵌入模型以及帶快取的嵌入模型，不存在時創建"""
+        key = (model, dimension)
+        if key not in self._models:
+            with self._lock:
+                if key not in self._models:
+                    self._models[key] = self._create_model(model, dimension)
+        return self._models[key]
+
+    def _create_model(
+            self,
+            model: str,
+            dimension: int,
+    ) -> tuple[PackedEmbeddingStore, Embeddings, CacheBackedEmbeddings]:
+        """創建模型名字+維度對應的快取儲存、嵌入模型以及帶快取的嵌入模型"""
+        # 1.文件嵌入快取以float32打包儲存，預設模型讀取未命中時會從舊版JSON格式快取遷移
+        store = PackedEmbeddingStore(
+            self._redis,
+            namespace="document",
+            model=model,
+            dimension=dimension,
+            legacy_namespace=(
+                LEGACY_EMBEDDING_CACHE_NAMESPACE
+                if (model, dimension) == (DEFAULT_EMBEDDING_MODEL, DEFAULT_EMBEDDING_DIMENSION) else None
+            ),
+        )
+        # embeddings = HuggingFaceEmbeddings(
+        #     model_name="Alibaba-NLP/gte-multilingual-base",
+        #     cache_folder=os.path.join(os.getcwd(), "internal", "core", "embeddings"),
+        #     model_kwargs={
+        #         "trust_remote_code": True,
+        #     }
+        # )
+        # 2.行程內共享同一個微批次處理器，合併索引構建、片段編輯與檢索查詢的嵌入請求，
+        # 並在其前方加上查詢嵌入快取，重複的檢索查詢無需再次請求模型
+        embeddings = QueryCacheEmbeddings(
+            MicroBatchEmbeddings(OpenAIEmbeddings(
+                model=model,
+                dimensions=dimension if model.startswith("text-embedding-3") else None,
+            )),
+            PackedEmbeddingStore(
+                self._redis,
+                namespace="query",
+                model=model,
+                dimension=dimension,
+                ttl=QUERY_EMBEDDING_REDIS_CACHE_TTL,
+            ),
+        )
+        return store, embeddings, CacheBackedEmbeddings(embeddings, store)
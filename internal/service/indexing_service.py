@@ -8,28 +8,49 @@
 import logging
 import re
 import uuid
+from contextlib import contextmanager
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import chain
+from queue import Queue
+from threading import Event, Thread
+from typing import Any, Callable, Iterator, Optional
 from uuid import UUID
 
+from flask import Flask, current_app
 from injector import inject
 from langchain_core.documents import Document as LCDocument
 from redis import Redis
-from sqlalchemy import func
-from weaviate.classes.query import Filter
+from sqlalchemy import func, update
 
 from internal.core.file_extractor import FileExtractor
-from internal.entity.cache_entity import LOCK_DOCUMENT_UPDATE_ENABLED
-from internal.entity.dataset_entity import DocumentStatus, SegmentStatus
+from internal.entity.cache_entity import (
+    LOCK_DOCUMENT_UPDATE_ENABLED,
+    DOCUMENT_BUILD_HEARTBEAT,
+    DOCUMENT_BUILD_HEARTBEAT_EXPIRE_TIME,
+    DOCUMENT_BUILD_HEARTBEAT_INTERVAL,
+)
+from internal.entity.dataset_entity import (
+    DocumentStatus,
+    SegmentStatus,
+    DOCUMENT_PARSING_CONCURRENCY,
+    DOCUMENT_SPLITTING_CONCURRENCY,
+    DOCUMENT_EMBEDDING_CONCURRENCY,
+    DOCUMENT_PIPELINE_QUEUE_SIZE,
+    DOCUMENT_BUILD_STALE_TIME,
+)
 from internal.exception import NotFoundException
 from internal.lib.helper import generate_text_hash
-from internal.model import Document, Segment, DatasetQuery, KeywordTable
+from internal.model import Document, Segment, DatasetQuery, KeywordTable, KeywordPosting
 from internal.service.base_service import BaseService
 from internal.service.embeddings_service import EmbeddingsService
 from internal.service.jieba_service import JiebaService
 from internal.service.keyword_table_service import KeywordTableService
 from internal.service.process_rule_service import ProcessRuleService
+from internal.service.retrieval_cache_service import RetrievalCacheService
+from internal.service.token_count_service import TokenCountService
 from internal.service.vector_database_service import VectorDatabaseService
+from internal.task.document_task import resume_documents
 from pkg.sqlalchemy import SQLAlchemy
 
 
@@ -45,40 +66,350 @@ class IndexingService(BaseService):
     vector_database_service: VectorDatabaseService
     process_rule_service: ProcessRuleService
     keyword_table_service: KeywordTableService
+    token_count_service: TokenCountService
+    retrieval_cache_service: RetrievalCacheService
 
     def build_documents(self, document_ids: list[UUID]) -> None:
-        """根據傳遞的文件id列表構建知識庫文件，涵蓋了載入、分割、索引構建、數據儲存等內容"""
-        # 1.根據傳遞的文件id獲取所有文件
-        documents = self.db.session.query(Document).filter(
-            Document.id.in_(document_ids)
-        ).all()
+        """
+        根據傳遞的文件id列表構建知識庫文件，涵蓋了載入、分割、索引構建、數據儲存等內容，
+        各步驟以流水線的方式執行，文件N在向量化時文件N+1可以同時進行解析與分割
+        """
+        # 1.根據傳遞的文件id獲取所有存在且等待構建的文件id，已被斷點恢復接手的文件不再重複構建
+        document_ids = [
+            id for id, in self.db.session.query(Document).with_entities(Document.id).filter(
+                Document.id.in_(document_ids),
+                Document.status == DocumentStatus.WAITING,
+            ).all()
+        ]
+
+        # 2.認領文件的構建權並在構建期間持續發送心跳
+        with self._claim_documents(document_ids) as document_ids:
+            self._run_pipeline(document_ids)
+
+    def _run_pipeline(self, document_ids: list[UUID]) -> None:
+        """以流水線的方式構建傳遞的文件列表，各階段之間使用有界佇列連接"""
+        # 1.構建流水線的各個階段，每個階段擁有獨立的並發數，階段之間使用有界佇列連接
+        flask_app = current_app._get_current_object()
+        stages = [
+            (self._parsing_stage, DOCUMENT_PARSING_CONCURRENCY),
+            (self._indexing_stage, DOCUMENT_SPLITTING_CONCURRENCY),
+            (self._completed_stage, DOCUMENT_EMBEDDING_CONCURRENCY),
+        ]
+        queues = [Queue()] + [Queue(maxsize=DOCUMENT_PIPELINE_QUEUE_SIZE) for _ in stages[1:]] + [None]
+        workers = [
+            [
+                Thread(
+                    target=self._run_stage,
+                    kwargs={
+                        "flask_app": flask_app,
+                        "stage": stage,
+                        "input_queue": queues[idx],
+                        "output_queue": queues[idx + 1],
+                    },
+                    daemon=True,
+                ) for _ in range(concurrency)
+            ] for idx, (stage, concurrency) in enumerate(stages)
+        ]
+        for thread in chain.from_iterable(workers):
+            thread.start()
+
+        # 2.將文件投遞到第一個階段，並依序在上游階段結束後通知下游階段結束
+        for document_id in document_ids:
+            queues[0].put((document_id, None))
+        for idx, stage_workers in enumerate(workers):
+            for _ in stage_workers:
+                queues[idx].put(None)
+            for thread in stage_workers:
+                thread.join()
+
+    def _run_stage(self, flask_app: Flask, stage: Callable, input_queue: Queue, output_queue: Optional[Queue]) -> None:
+        """流水線階段的工作執行緒，單個文件出錯時只將該文件標記為錯誤，不影響其他文件"""
+        while True:
+            # 1.從上游佇列中獲取文件，None表示上游已經全部處理完畢
+            item = input_queue.get()
+            if item is None:
+                return
+            document_id, payload = item
+
+            # 2.每個文件使用獨立的應用上下文，確保執行緒之間不共享資料庫會話
+            with flask_app.app_context():
+                try:
+                    document = self.get(Document, document_id)
+                    result = stage(document, payload)
+                except Exception as e:
+                    logging.exception("構建文件發生錯誤, 錯誤資訊: %(error)s", {"error": e})
+                    self._update_document_error(document_id, e)
+                    continue
+
+            # 3.將處理結果投遞到下游佇列，下游佇列已滿時阻塞等待
+            if output_queue is not None:
+                output_queue.put((document_id, result))
+
+    def _update_document_error(self, document_id: UUID, error: Exception) -> None:
+        """將構建出錯的文件標記為錯誤狀態，標記失敗時只記錄日誌，避免工作執行緒退出導致流水線阻塞"""
+        try:
+            self.db.session.rollback()
+            self.update(
+                self.get(Document, document_id),
+                status=DocumentStatus.ERROR,
+                error=str(error),
+                stopped_at=datetime.now(),
+            )
+        except Exception as e:
+            logging.exception(
+                "更新文件錯誤狀態失敗, document_id: %(document_id)s, 錯誤資訊: %(error)s",
+                {"document_id": document_id, "error": e},
+            )
 
-        # 2.執行循環遍歷所有文件完成對每個文件的構建
-        for document in documents:
-            try:
-                # 3.更新當前狀態為解析中，並記錄開始處理的時間
-                self.update(document, status=DocumentStatus.PARSING, processing_started_at=datetime.now())
+    def _parsing_stage(self, document: Document, _: Any) -> list[LCDocument]:
+        """流水線解析階段：更新當前狀態為解析中，並記錄開始處理的時間，然後執行文件載入步驟"""
+        self.update(document, status=DocumentStatus.PARSING, processing_started_at=datetime.now())
+        return self._parsing(document)
+
+    def _indexing_stage(self, document: Document, lc_documents: list[LCDocument]) -> list[LCDocument]:
+        """流水線分割階段：執行文件分割步驟，並構建關鍵字索引"""
+        lc_segments = self._splitting(document, lc_documents)
+        self._indexing(document, lc_segments)
+        return lc_segments
+
+    def _completed_stage(self, document: Document, lc_segments: list[LCDocument]) -> None:
+        """流水線儲存階段：向量化並儲存到向量資料庫，並更新文件狀態"""
+        self._completed(document, lc_segments)
+
+    def reindex_document(self, document_id: UUID) -> None:
+        """
+        根據傳遞的文件id增量重建文件索引，使用片段hash對比新舊片段，內容未變化的片段保留原有記錄、
+        向量與關鍵字，只為新增的片段構建索引並向量化，已經移除的片段則批次刪除
+        """
+        with self._claim_documents([document_id]) as document_ids:
+            if len(document_ids) == 0:
+                logging.warning("文件正在構建中, 跳過重新索引, 文件id: %(document_id)s", {"document_id": document_id})
+                return
+            self._reindex(document_id)
+
+    def resume_documents(self, document_ids: list[UUID]) -> None:
+        """
+        根據傳遞的文件id列表從斷點恢復構建，片段已經儲存(索引中)的文件直接從片段記錄恢復，
+        只處理尚未完成的片段，片段尚未儲存的文件則重新解析並按hash增量構建
+        """
+        with self._claim_documents(document_ids) as document_ids:
+            for document_id in document_ids:
+                # 1.獲取文件並跳過已經結束構建的文件
+                document = self.get(Document, document_id)
+                if document is None or document.status in [DocumentStatus.COMPLETED, DocumentStatus.ERROR]:
+                    continue
+
+                # 2.片段尚未儲存時重新解析文件，否則從片段記錄恢復
+                if document.status != DocumentStatus.INDEXING:
+                    self._reindex(document_id)
+                    continue
+                try:
+                    self._resume_segments(document)
+                except Exception as e:
+                    logging.exception(
+                        "恢復構建文件發生錯誤, document_id: %(document_id)s, 錯誤資訊: %(error)s",
+                        {"document_id": document_id, "error": e},
+                    )
+                    self._update_document_error(document_id, e)
+
+    def resume_stuck_documents(self) -> None:
+        """掃描長時間處於構建中且沒有構建心跳的文件(工作行程已退出)，並重新投遞斷點恢復任務"""
+        # 1.查詢超過指定時間未更新的構建中文件
+        stale_at = datetime.now() - timedelta(seconds=DOCUMENT_BUILD_STALE_TIME)
+        document_ids = [
+            id for id, in self.db.session.query(Document).with_entities(Document.id).filter(
+                Document.status.in_([
+                    DocumentStatus.WAITING,
+                    DocumentStatus.PARSING,
+                    DocumentStatus.SPLITTING,
+                    DocumentStatus.INDEXING,
+                ]),
+                Document.updated_at < stale_at,
+            ).all()
+        ]
+        if len(document_ids) == 0:
+            return
+
+        # 2.過濾掉仍有工作行程在構建(心跳未過期)的文件
+        pipeline = self.redis_client.pipeline()
+        for document_id in document_ids:
+            pipeline.exists(DOCUMENT_BUILD_HEARTBEAT.format(document_id=document_id))
+        stuck_document_ids = [
+            document_id for document_id, exists in zip(document_ids, pipeline.execute()) if not exists
+        ]
 
-                # 4.執行文件載入步驟，並更新文件的狀態與時間
-                lc_documents = self._parsing(document)
+        # 3.重新投遞斷點恢復任務
+        if len(stuck_document_ids) > 0:
+            logging.warning(
+                "發現構建中斷的文件, 重新投遞恢復任務, document_ids: %(document_ids)s",
+                {"document_ids": stuck_document_ids},
+            )
+            resume_documents.delay(stuck_document_ids)
+
+    @contextmanager
+    def _claim_documents(self, document_ids: list[UUID]) -> Iterator[list[UUID]]:
+        """
+        認領文件的構建權並返回認領成功的文件id列表，已被其他工作行程認領的文件會被跳過，
+        構建期間由背景執行緒持續為心跳續期，工作行程異常退出時心跳隨過期時間自動釋放
+        """
+        # 1.使用SET NX認領文件，並記錄認領成功的心跳鍵
+        claimed_document_ids = [
+            document_id for document_id in document_ids
+            if self.redis_client.set(
+                DOCUMENT_BUILD_HEARTBEAT.format(document_id=document_id),
+                1,
+                ex=DOCUMENT_BUILD_HEARTBEAT_EXPIRE_TIME,
+                nx=True,
+            )
+        ]
+        keys = [DOCUMENT_BUILD_HEARTBEAT.format(document_id=document_id) for document_id in claimed_document_ids]
 
-                # 5.執行文件分割步驟，並更新文件狀態與時間，涵蓋了片段的資訊
-                lc_segments = self._splitting(document, lc_documents)
+        # 2.啟動背景執行緒定期為心跳續期
+        stop_event = Event()
 
-                # 6.執行文件索引構建，涵蓋關鍵字提取、向量，並更新數據狀態
-                self._indexing(document, lc_segments)
+        def _beat() -> None:
+            while not stop_event.wait(DOCUMENT_BUILD_HEARTBEAT_INTERVAL):
+                try:
+                    pipeline = self.redis_client.pipeline()
+                    for key in keys:
+                        pipeline.expire(key, DOCUMENT_BUILD_HEARTBEAT_EXPIRE_TIME)
+                    pipeline.execute()
+                except Exception as e:
+                    logging.warning("文件構建心跳續期失敗, 錯誤資訊: %(error)s", {"error": e})
+
+        thread = Thread(target=_beat, daemon=True)
+        thread.start()
+
+        # 3.構建結束後停止心跳並釋放構建權
+        try:
+            yield claimed_document_ids
+        finally:
+            stop_event.set()
+            thread.join()
+            if len(keys) > 0:
+                self.redis_client.delete(*keys)
+
+    def _resume_segments(self, document: Document) -> None:
+        """從已經儲存的片段記錄恢復構建，跳過下載與分割，只為等待中的片段構建關鍵字，並向量化尚未完成的片段"""
+        # 1.按位置順序查詢所有尚未構建完成的片段，已完成的批次直接跳過
+        segments = self.db.session.query(Segment).with_entities(
+            Segment.id, Segment.node_id, Segment.content, Segment.status,
+        ).filter(
+            Segment.document_id == document.id,
+            Segment.status != SegmentStatus.COMPLETED,
+        ).order_by(Segment.position).all()
+
+        # 2.根據片段記錄還原LangChain片段
+        lc_segments = [
+            LCDocument(page_content=content, metadata=self._build_segment_metadata(document, id, node_id))
+            for id, node_id, content, _ in segments
+        ]
 
-                # 7.儲存操作，涵蓋文件狀態更新，以及向量資料庫的儲存
-                self._completed(document, lc_segments)
+        # 3.為尚未構建關鍵字的片段構建索引，已經提取關鍵字的片段可能在寫入倒排表前中斷，重新寫入倒排記錄(重複的記錄會被忽略)
+        self._indexing(document, [
+            lc_segment for lc_segment, (_, _, _, status) in zip(lc_segments, segments)
+            if status == SegmentStatus.WAITING
+        ])
+        self.keyword_table_service.add_keyword_table_from_ids(
+            document.dataset_id,
+            [id for id, _, _, status in segments if status != SegmentStatus.WAITING],
+        )
 
-            except Exception as e:
-                logging.exception("構建文件發生錯誤, 錯誤資訊: %(error)s", {"error": e})
-                self.update(
-                    document,
-                    status=DocumentStatus.ERROR,
-                    error=str(e),
-                    stopped_at=datetime.now(),
-                )
+        # 4.向量化所有未完成的片段
+        self._completed(document, lc_segments)
+
+    def _reindex(self, document_id: UUID) -> None:
+        """重新解析文件，並按片段hash增量構建文件索引"""
+        # 1.獲取文件記錄，文件不存在時直接結束
+        document = self.get(Document, document_id)
+        if document is None:
+            logging.warning("重新索引的文件不存在, 文件id: %(document_id)s", {"document_id": document_id})
+            return
+
+        try:
+            # 2.更新文件狀態，並重新解析與分割最新的文件內容
+            self.update(
+                document,
+                status=DocumentStatus.PARSING,
+                error="",
+                processing_started_at=datetime.now(),
+                stopped_at=None,
+            )
+            lc_documents = self._parsing(document)
+            lc_segments = self._split_documents(document, lc_documents)
+
+            # 3.查詢已經構建完成的片段並按hash分組，未構建完成的片段無法複用，直接視為移除
+            completed_segments: dict[str, list[tuple[UUID, UUID]]] = {}
+            removed_segments = []
+            segments = self.db.session.query(Segment).with_entities(
+                Segment.id, Segment.node_id, Segment.hash, Segment.status,
+            ).filter(Segment.document_id == document.id).order_by(Segment.position).all()
+            for id, node_id, hash, status in segments:
+                if status == SegmentStatus.COMPLETED:
+                    completed_segments.setdefault(hash, []).append((id, node_id))
+                else:
+                    removed_segments.append((id, node_id))
+
+            # 4.依序將新片段與舊片段按hash配對，相同內容重複出現時按出現順序逐一配對
+            kept_segment_values = []
+            new_lc_segments = []
+            new_positions = []
+            for position, lc_segment in enumerate(lc_segments, start=1):
+                matched_segments = completed_segments.get(generate_text_hash(lc_segment.page_content))
+                if matched_segments:
+                    segment_id, _ = matched_segments.pop(0)
+                    kept_segment_values.append({"id": segment_id, "position": position})
+                else:
+                    new_lc_segments.append(lc_segment)
+                    new_positions.append(position)
+            removed_segments.extend(chain.from_iterable(completed_segments.values()))
+
+            # 5.批次刪除已經移除的片段，並更新保留片段的位置
+            self._delete_segments(document.account_id, document.dataset_id, removed_segments)
+            if len(kept_segment_values) > 0:
+                with self.db.auto_commit():
+                    self.db.session.execute(update(Segment), kept_segment_values)
+
+            # 6.只為新增的片段創建記錄，並批次計算所有片段的token數更新文件(保留的片段在上次構建時已計算過，通常命中快取)
+            self._create_segments(document, new_lc_segments, new_positions)
+            self.update(
+                document,
+                token_count=sum(self.token_count_service.calculate_token_counts(
+                    [lc_segment.page_content for lc_segment in lc_segments]
+                )),
+                status=DocumentStatus.INDEXING,
+                splitting_completed_at=datetime.now(),
+            )
+
+            # 7.為新增的片段構建關鍵字索引並向量化儲存
+            self._indexing(document, new_lc_segments)
+            self._completed(document, new_lc_segments)
+        except Exception as e:
+            logging.exception(
+                "重新索引文件發生錯誤, document_id: %(document_id)s, 錯誤資訊: %(error)s",
+                {"document_id": document_id, "error": e},
+            )
+            self._update_document_error(document_id, e)
+
+    def _delete_segments(self, account_id: UUID, dataset_id: UUID, segments: list[tuple[UUID, UUID]]) -> None:
+        """根據傳遞的(片段id, 節點id)列表批次刪除向量資料庫記錄、關鍵字倒排記錄以及片段記錄"""
+        if len(segments) == 0:
+            return
+        segment_ids = [id for id, _ in segments]
+        node_ids = [str(node_id) for _, node_id in segments]
+
+        # 1.分批刪除向量資料庫中的記錄，先刪除向量，失敗時片段記錄仍在，可以再次重試
+        self.vector_database_service.delete_by_ids(account_id, dataset_id, node_ids)
+
+        # 2.刪除關鍵字倒排記錄與片段記錄
+        self.keyword_table_service.delete_keyword_table_from_ids(dataset_id, segment_ids)
+        with self.db.auto_commit():
+            self.db.session.query(Segment).filter(
+                Segment.id.in_(segment_ids),
+            ).delete(synchronize_session=False)
+
+        # 3.使知識庫的檢索結果快取失效
+        self.retrieval_cache_service.bump_versions([dataset_id])
 
     def update_document_enabled(self, document_id: UUID) -> None:
         """根據傳遞的文件id更新文件狀態，同時修改weaviate向量資料庫中的紀錄勾引構建服務"""
@@ -99,27 +430,27 @@ class IndexingService(BaseService):
         segment_ids = [id for id, _, _ in segments]
         node_ids = [node_id for _, node_id, _ in segments]
         try:
-            # 4.執行循環遍歷所有node_ids並更新向量數據
-            collection = self.vector_database_service.collection
-            for node_id in node_ids:
-                try:
-                    collection.data.update(
-                        uuid=node_id,
-                        properties={
-                            "document_enabled": document.enabled,
-                        }
-                    )
-                except Exception as e:
-                    with self.db.auto_commit():
-                        self.db.session.query(Segment).filter(
-                            Segment.node_id == node_id,
-                        ).update({
-                            "error": str(e),
-                            "status": SegmentStatus.ERROR,
-                            "enabled": False,
-                            "disabled_at": datetime.now(),
-                            "stopped_at": datetime.now(),
-                        })
+            # 4.批次更新所有節點的向量數據，更新失敗的片段按錯誤資訊分組標記為錯誤
+            errors = self.vector_database_service.update_properties_many(
+                document.account_id,
+                document.dataset_id,
+                [str(node_id) for node_id in node_ids],
+                {"document_enabled": document.enabled},
+            )
+            failed_node_ids: dict[str, list[str]] = {}
+            for node_id, error in errors.items():
+                failed_node_ids.setdefault(error, []).append(node_id)
+            for error, error_node_ids in failed_node_ids.items():
+                with self.db.auto_commit():
+                    self.db.session.query(Segment).filter(
+                        Segment.node_id.in_(error_node_ids),
+                    ).update({
+                        "error": error,
+                        "status": SegmentStatus.ERROR,
+                        "enabled": False,
+                        "disabled_at": datetime.now(),
+                        "stopped_at": datetime.now(),
+                    }, synchronize_session=False)
 
             # 5.更新關鍵字表對應的數據（enabled為false表示從關鍵字表中刪除數據，enabled為true表示在關鍵字表中新增數據）
             if document.enabled is True:
@@ -142,11 +473,12 @@ class IndexingService(BaseService):
                 disabled_at=None if origin_enabled else datetime.now(),
             )
         finally:
-            # 6.清空快取鍵表示非同步操作已經執行完成，無論失敗還是成功都全部清除
+            # 6.清空快取鍵表示非同步操作已經執行完成，無論失敗還是成功都全部清除，並使知識庫的檢索結果快取失效
             self.redis_client.delete(cache_key)
+            self.retrieval_cache_service.bump_versions([document.dataset_id])
 
-    def delete_document(self, dataset_id: UUID, document_id: UUID) -> None:
-        """根據傳遞的知識庫id+文件id刪除文件資訊"""
+    def delete_document(self, dataset_id: UUID, document_id: UUID, account_id: Optional[UUID] = None) -> None:
+        """根據傳遞的知識庫id+文件id刪除文件資訊，傳遞帳號id時向量資料庫只需要在該帳號的租戶中刪除"""
         # 1.尋找該文件下的所有片段id列表
         segment_ids = [
             str(id) for id, in self.db.session.query(Segment).with_entities(Segment.id).filter(
@@ -155,10 +487,7 @@ class IndexingService(BaseService):
         ]
 
         # 2.調用向量資料庫刪除其關聯記錄
-        collection = self.vector_database_service.collection
-        collection.data.delete_many(
-            where=Filter.by_property("document_id").equal(document_id),
-        )
+        self.vector_database_service.delete_by_document_id(account_id, dataset_id, document_id)
 
         # 3.刪除postgres關聯的segment記錄
         with self.db.auto_commit():
@@ -169,8 +498,11 @@ class IndexingService(BaseService):
         # 4.刪除片段id對應的關鍵字記錄
         self.keyword_table_service.delete_keyword_table_from_ids(dataset_id, segment_ids)
 
-    def delete_dataset(self, dataset_id: UUID) -> None:
-        """根據傳遞的知識庫id執行相應的刪除操作"""
+        # 5.使知識庫的檢索結果快取失效
+        self.retrieval_cache_service.bump_versions([dataset_id])
+
+    def delete_dataset(self, dataset_id: UUID, account_id: Optional[UUID] = None) -> None:
+        """根據傳遞的知識庫id執行相應的刪除操作，傳遞帳號id時向量資料庫只需要在該帳號的租戶中刪除"""
         try:
             with self.db.auto_commit():
                 # 1.刪除關聯的文件記錄
@@ -183,20 +515,25 @@ class IndexingService(BaseService):
                     Segment.dataset_id == dataset_id,
                 ).delete()
 
-                # 3.刪除關聯的關鍵字表記錄
+                # 3.刪除關聯的關鍵字表及倒排記錄
                 self.db.session.query(KeywordTable).filter(
                     KeywordTable.dataset_id == dataset_id,
                 ).delete()
+                self.db.session.query(KeywordPosting).filter(
+                    KeywordPosting.dataset_id == dataset_id,
+                ).delete()
 
                 # 4.刪除知識庫查詢記錄
                 self.db.session.query(DatasetQuery).filter(
                     DatasetQuery.dataset_id == dataset_id,
                 ).delete()
 
-            # 5.調用向量資料庫刪除知識庫的關聯記錄
-            self.vector_database_service.collection.data.delete_many(
-                where=Filter.by_property("dataset_id").equal(str(dataset_id))
-            )
+            # 5.使所有行程中該知識庫的關鍵字倒排索引快取失效
+            self.keyword_table_service.invalidate_keyword_index(dataset_id)
+
+            # 6.調用向量資料庫刪除知識庫的關聯記錄，並使知識庫的檢索結果快取失效
+            self.vector_database_service.delete_by_dataset_id(account_id, dataset_id)
+            self.retrieval_cache_service.bump_versions([dataset_id])
         except Exception as e:
             logging.exception(
                 "非同步刪除知識庫關聯內容出錯, dataset_id: %(dataset_id)s, 錯誤資訊: %(error)s",
@@ -225,105 +562,124 @@ class IndexingService(BaseService):
 
     def _splitting(self, document: Document, lc_documents: list[LCDocument]) -> list[LCDocument]:
         """根據傳遞的資訊進行文件分割，拆分成小塊片段"""
-        try:
-            # 1.根據process_rule獲取文本分割器
-            process_rule = document.process_rule
-            text_splitter = self.process_rule_service.get_text_splitter_by_process_rule(
+        # 1.按照process_rule分割文件列表為片段列表
+        lc_segments = self._split_documents(document, lc_documents)
+
+        # 2.獲取對應文件下得到最大片段位置
+        position = self.db.session.query(func.coalesce(func.max(Segment.position), 0)).filter(
+            Segment.document_id == document.id,
+        ).scalar()
+
+        # 3.批次將片段數據儲存到postgres資料庫中，並添加元數據
+        segment_values = self._create_segments(
+            document,
+            lc_segments,
+            list(range(position + 1, position + len(lc_segments) + 1)),
+        )
+
+        # 4.更新文件的數據，涵蓋狀態、token數等內容
+        self.update(
+            document,
+            token_count=sum([segment_value["token_count"] for segment_value in segment_values]),
+            status=DocumentStatus.INDEXING,
+            splitting_completed_at=datetime.now(),
+        )
+
+        return lc_segments
+
+    def _split_documents(self, document: Document, lc_documents: list[LCDocument]) -> list[LCDocument]:
+        """根據文件的處理規則清除多餘的字串，並將LangChain文件列表分割成片段列表"""
+        # 1.根據process_rule獲取文本分割器
+        process_rule = document.process_rule
+        text_splitter = self.process_rule_service.get_text_splitter_by_process_rule(
+            process_rule,
+            self.token_count_service.calculate_token_count,
+        )
+
+        # 2.按照process_rule規則清除多餘的字串
+        for lc_document in lc_documents:
+            lc_document.page_content = self.process_rule_service.clean_text_by_process_rule(
+                lc_document.page_content,
                 process_rule,
-                self.embeddings_service.calculate_token_count,
             )
 
-            # 2.按照process_rule規則清除多餘的字串
-            for lc_document in lc_documents:
-                lc_document.page_content = self.process_rule_service.clean_text_by_process_rule(
-                    lc_document.page_content,
-                    process_rule,
-                )
-
-            # 3.分割文件列表為片段列表
-            lc_segments = text_splitter.split_documents(lc_documents)
-
-            # 4.獲取對應文件下得到最大片段位置
-            position = self.db.session.query(func.coalesce(func.max(Segment.position), 0)).filter(
-                Segment.document_id == document.id,
-            ).scalar()
-
-            # 5.循環處理片段數據並添加元數據，同時儲存到postgres資料庫中
-            segments = []
-            for lc_segment in lc_segments:
-                position += 1
-                content = lc_segment.page_content
-                segment = self.create(
-                    Segment,
-                    account_id=document.account_id,
-                    dataset_id=document.dataset_id,
-                    document_id=document.id,
-                    node_id=uuid.uuid4(),
-                    position=position,
-                    content=content,
-                    character_count=len(content),
-                    token_count=self.embeddings_service.calculate_token_count(content),
-                    hash=generate_text_hash(content),
-                    status=SegmentStatus.WAITING,
-                )
-                lc_segment.metadata = {
-                    "account_id": str(document.account_id),
-                    "dataset_id": str(document.dataset_id),
-                    "document_id": str(document.id),
-                    "segment_id": str(segment.id),
-                    "node_id": str(segment.node_id),
-                    "document_enabled": False,
-                    "segment_enabled": False,
-                }
-                segments.append(segment)
-
-            # 6.更新文件的數據，涵蓋狀態、token數等內容
-            self.update(
+        # 3.分割文件列表為片段列表
+        return text_splitter.split_documents(lc_documents)
+
+    def _create_segments(self, document: Document, lc_segments: list[LCDocument], positions: list[int]) -> list[dict]:
+        """在客戶端生成片段id與節點id，以多行INSERT批次寫入片段記錄，並填充LangChain片段的元數據"""
+        # 1.批次計算片段的token數(分割器只計算過分割出的小段，合併後的片段大多需要重新編碼)
+        token_counts = self.token_count_service.calculate_token_counts(
+            [lc_segment.page_content for lc_segment in lc_segments]
+        )
+
+        # 2.循環組裝片段數據，id與node_id在本地生成，無需等待資料庫返回
+        segment_values = []
+        for lc_segment, token_count, position in zip(lc_segments, token_counts, positions):
+            content = lc_segment.page_content
+            segment_value = {
+                "id": uuid.uuid4(),
+                "account_id": document.account_id,
+                "dataset_id": document.dataset_id,
+                "document_id": document.id,
+                "node_id": uuid.uuid4(),
+                "position": position,
+                "content": content,
+                "character_count": len(content),
+                "token_count": token_count,
+                "hash": generate_text_hash(content),
+                "status": SegmentStatus.WAITING,
+            }
+            lc_segment.metadata = self._build_segment_metadata(
                 document,
-                token_count=sum([segment.token_count for segment in segments]),
-                status=DocumentStatus.INDEXING,
-                splitting_completed_at=datetime.now(),
+                segment_value["id"],
+                segment_value["node_id"],
             )
+            segment_values.append(segment_value)
 
-            return lc_segments
-        except Exception as e:
-            print("_splitting出現異常:", e)
+        # 3.使用一個事務批次寫入所有片段(SQLAlchemy會按頁拆分成多行INSERT語句)
+        self.bulk_create(Segment, segment_values)
+
+        return segment_values
+
+    @classmethod
+    def _build_segment_metadata(cls, document: Document, segment_id: UUID, node_id: UUID) -> dict[str, Any]:
+        """根據文件與片段資訊構建存入向量資料庫的元數據"""
+        return {
+            "account_id": str(document.account_id),
+            "dataset_id": str(document.dataset_id),
+            "document_id": str(document.id),
+            "segment_id": str(segment_id),
+            "node_id": str(node_id),
+            "document_enabled": False,
+            "segment_enabled": False,
+        }
 
     def _indexing(self, document: Document, lc_segments: list[LCDocument]) -> None:
         """根據傳遞的資訊構建索引，涵蓋關鍵字提取、詞表構建"""
-        for lc_segment in lc_segments:
-            # 1.提取每一個片段對應的關鍵字，關鍵字的數量最多不超過10個
-            keywords = self.jieba_service.extract_keywords(lc_segment.page_content, 10)
-
-            # 2.逐條更新文件片段的關鍵字
-            self.db.session.query(Segment).filter(
-                Segment.id == lc_segment.metadata["segment_id"]
-            ).update({
-                "keywords": keywords,
+        # 1.批次提取所有片段對應的關鍵字，每個片段的關鍵字數量最多不超過10個
+        indexing_completed_at = datetime.now()
+        segment_values = [
+            {
+                "id": lc_segment.metadata["segment_id"],
+                "keywords": self.jieba_service.extract_keywords(lc_segment.page_content, 10),
                 "status": SegmentStatus.INDEXING,
-                "indexing_completed_at": datetime.now(),
-            })
-
-            # 3.獲取當前知識庫的關鍵字表
-            keyword_table_record = self.keyword_table_service.get_keyword_table_from_dataset_id(document.dataset_id)
-
-            keyword_table = {
-                field: set(value) for field, value in keyword_table_record.keyword_table.items()
-            }
+                "indexing_completed_at": indexing_completed_at,
+            } for lc_segment in lc_segments
+        ]
 
-            # 4.循環將新關鍵字添加到關鍵字表中
-            for keyword in keywords:
-                if keyword not in keyword_table:
-                    keyword_table[keyword] = set()
-                keyword_table[keyword].add(lc_segment.metadata["segment_id"])
+        # 2.使用一條批次UPDATE語句(依主鍵executemany)更新所有片段的關鍵字與狀態
+        if len(segment_values) > 0:
+            with self.db.auto_commit():
+                self.db.session.execute(update(Segment), segment_values)
 
-            # 5.更新關鍵字表
-            self.update(
-                keyword_table_record,
-                keyword_table={field: list(value) for field, value in keyword_table.items()}
-            )
+        # 3.一次性將所有片段的關鍵字寫入知識庫關鍵字倒排表
+        self.keyword_table_service.add_keyword_table_from_ids(
+            document.dataset_id,
+            [segment_value["id"] for segment_value in segment_values],
+        )
 
-        # 6.更新文件狀態
+        # 4.更新文件狀態
         self.update(
             document,
             indexing_completed_at=datetime.now(),
@@ -336,42 +692,18 @@ class IndexingService(BaseService):
             lc_segment.metadata["document_enabled"] = True
             lc_segment.metadata["segment_enabled"] = True
 
-        # 2.調用向量資料庫，每次儲存10條數據，避免一次傳遞過多的數據
+        # 2.批次向量化並寫入向量資料庫，每寫入一批就更新對應片段的狀態(同時作為構建斷點)，寫入失敗時已寫入的批次同樣可被檢索
         try:
-            for i in range(0, len(lc_segments), 10):
-                # 3.提取需要存儲的數據與ID
-                chunks = lc_segments[i:i + 10]
-                ids = [chunk.metadata["node_id"] for chunk in chunks]
-
-                # 4.調用向量數據庫存儲對應的數據
-                self.vector_database_service.vector_store.add_documents(chunks, ids=ids)
-
-                # 5.更新關聯片段的狀況以及完成時間
-                with self.db.auto_commit():
-                    self.db.session.query(Segment).filter(
-                        Segment.node_id.in_(ids)
-                    ).update({
-                        "status": SegmentStatus.COMPLETED,
-                        "completed_at": datetime.now(),
-                        "enabled": True,
-                    })
-        except Exception as e:
-            logging.exception(
-                "構建文件片段索引發生異常, 錯誤資訊: %(error)s",
-                {"error": e},
+            self.vector_database_service.write_documents(
+                document.account_id,
+                lc_segments,
+                [lc_segment.metadata["node_id"] for lc_segment in lc_segments],
+                self._update_segments_completed,
             )
-            with self.db.auto_commit():
-                self.db.session.query(Segment).filter(
-                    Segment.node_id.in_(ids)
-                ).update({
-                    "status": SegmentStatus.ERROR,
-                    "completed_at": None,
-                    "stopped_at": datetime.now(),
-                    "enabled": False,
-                    "error": str(e),
-                })
+        finally:
+            self.retrieval_cache_service.bump_versions([document.dataset_id])
 
-        # 6.更新文件的狀態數據
+        # 3.更新文件的狀態數據
         self.update(
             document,
             status=DocumentStatus.COMPLETED,
@@ -379,6 +711,34 @@ class IndexingService(BaseService):
             enabled=True,
         )
 
+    def _update_segments_completed(self, node_ids: list[str], errors: dict[str, str]) -> None:
+        """根據向量資料庫的批次寫入結果更新片段狀態，只有寫入失敗的片段會被標記為錯誤"""
+        with self.db.auto_commit():
+            # 1.寫入成功的片段標記為構建完成並啟用
+            if len(node_ids) > 0:
+                self.db.session.query(Segment).filter(
+                    Segment.node_id.in_(node_ids),
+                ).update({
+                    "status": SegmentStatus.COMPLETED,
+                    "completed_at": datetime.now(),
+                    "enabled": True,
+                }, synchronize_session=False)
+
+            # 2.寫入失敗的片段按錯誤資訊分組標記為錯誤
+            failed_node_ids: dict[str, list[str]] = {}
+            for node_id, error in errors.items():
+                failed_node_ids.setdefault(error, []).append(node_id)
+            for error, error_node_ids in failed_node_ids.items():
+                self.db.session.query(Segment).filter(
+                    Segment.node_id.in_(error_node_ids),
+                ).update({
+                    "status": SegmentStatus.ERROR,
+                    "completed_at": None,
+                    "stopped_at": datetime.now(),
+                    "enabled": False,
+                    "error": error,
+                }, synchronize_session=False)
+
     @classmethod
     def _clean_extra_text(cls, text: str) -> str:
         """清除過濾傳遞的多餘空白字串"""
@@ -6,13 +6,17 @@
 @File   : keyword_table_service.py
 """
 from dataclasses import dataclass
+from typing import Any, Optional, Sequence
 from uuid import UUID
 
 from injector import inject
 from redis import Redis
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import Insert, insert
 
+from internal.core.keyword_index import KeywordIndex, KeywordIndexCache
 from internal.entity.cache_entity import LOCK_KEYWORD_TABLE_UPDATE_KEYWORD_TABLE, LOCK_EXPIRE_TIME
-from internal.model import KeywordTable, Segment
+from internal.model import Document, KeywordTable, KeywordPosting, Segment
 from pkg.sqlalchemy import SQLAlchemy
 from .base_service import BaseService
 
@@ -23,6 +27,7 @@ class KeywordTableService(BaseService):
     """知識庫關鍵字表服務"""
     db: SQLAlchemy
     redis_client: Redis
+    keyword_index_cache: KeywordIndexCache
 
     def get_keyword_table_from_dataset_id(self, dataset_id: UUID) -> KeywordTable:
         """根據傳遞的知識庫id獲取關鍵字表"""
@@ -30,62 +35,228 @@ class KeywordTableService(BaseService):
             KeywordTable.dataset_id == dataset_id,
         ).one_or_none()
         if keyword_table is None:
-            keyword_table = self.create(KeywordTable, dataset_id=dataset_id, keyword_table={})
+            keyword_table = self.create(KeywordTable, dataset_id=dataset_id)
 
         return keyword_table
 
-    def delete_keyword_table_from_ids(self, dataset_id: UUID, segment_ids: list[UUID]) -> None:
-        """根據傳遞的知識庫id+片段id列表刪除對應關鍵字表中多餘的數據"""
-        # 1.刪除知識庫關鍵字表裡多餘的數據，該操作需要上鎖，避免在並發的情況下拿到錯誤的數據
-        cache_key = LOCK_KEYWORD_TABLE_UPDATE_KEYWORD_TABLE.format(dataset_id=dataset_id)
-        with self.redis_client.lock(cache_key, timeout=LOCK_EXPIRE_TIME):
-            # 2.獲取當前知識庫的關鍵字表
-            keyword_table_record = self.get_keyword_table_from_dataset_id(dataset_id)
-            keyword_table = keyword_table_record.keyword_table.copy()  # 創建新的引用
+    def get_keyword_index(self, dataset_id: UUID, keywords: Optional[list[str]] = None) -> KeywordIndex:
+        """
+        根據傳遞的知識庫id獲取關鍵字倒排索引，優先使用行程內快取，未命中時從資料庫載入整個知識庫的索引並快取，
+        快取不可用(失效訂閱未就緒)且傳遞了關鍵字列表時，只載入這些關鍵字的倒排記錄，不載入也不快取完整索引
+        """
+        # 1.優先從行程內快取中獲取
+        keyword_index = self.keyword_index_cache.get(dataset_id)
+        if keyword_index is not None:
+            return keyword_index
+
+        # 2.快取無法保存完整索引時，只查詢需要的關鍵字
+        cacheable = self.keyword_index_cache.is_available()
+        if not cacheable and keywords is not None:
+            return self._load_keyword_index(dataset_id, keywords)
+
+        # 3.先讀取版本號再載入數據，確保載入期間發生的寫入一定會讓該快取失效
+        keyword_index = self._load_keyword_index(dataset_id, version=self.keyword_index_cache.get_version(dataset_id))
+
+        # 4.寫入快取並返回
+        if cacheable:
+            self.keyword_index_cache.put(dataset_id, keyword_index)
+
+        return keyword_index
 
-            # 3.將片段id列錶轉換成集合，並創建關鍵字集合用於清除空關鍵字
-            segment_ids_to_delete = set([str(segment_id) for segment_id in segment_ids])
-            keywords_to_delete = set()
+    def _load_keyword_index(
+            self,
+            dataset_id: UUID,
+            keywords: Optional[list[str]] = None,
+            version: int = 0,
+    ) -> KeywordIndex:
+        """從資料庫載入知識庫的倒排記錄以及BM25統計資訊，傳遞關鍵字列表時只載入這些關鍵字的倒排記錄"""
+        # 1.載入倒排記錄，關鍵字列表為空時無需查詢
+        keyword_index = KeywordIndex(version=version)
+        if keywords is None or len(keywords) > 0:
+            query = self.db.session.query(KeywordPosting).with_entities(
+                KeywordPosting.keyword,
+                KeywordPosting.segment_id,
+                KeywordPosting.term_frequency,
+                KeywordPosting.segment_length,
+            ).filter(KeywordPosting.dataset_id == dataset_id)
+            if keywords is not None:
+                query = query.filter(KeywordPosting.keyword.in_(keywords))
+            for keyword, segment_id, term_frequency, segment_length in query.all():
+                keyword_index.postings.setdefault(keyword, []).append(
+                    (str(segment_id), term_frequency, segment_length),
+                )
 
-            # 4.循環遍歷所有關鍵字執行判斷與更新
-            for keyword, ids in keyword_table.items():
-                ids_set = set(ids)
-                if segment_ids_to_delete.intersection(ids_set):
-                    keyword_table[keyword] = list(ids_set.difference(segment_ids_to_delete))
-                    if not keyword_table[keyword]:
-                        keywords_to_delete.add(keyword)
+        # 2.載入知識庫的BM25統計資訊
+        statistics = self.db.session.query(KeywordTable).with_entities(
+            KeywordTable.segment_count,
+            KeywordTable.total_segment_length,
+        ).filter(KeywordTable.dataset_id == dataset_id).first()
+        if statistics is not None:
+            keyword_index.segment_count, keyword_index.total_segment_length = statistics
 
-            # 5.檢測空關鍵字數據並刪除（關鍵字並沒有映射任何欄位id的數據）
-            for keyword in keywords_to_delete:
-                del keyword_table[keyword]
+        return keyword_index
 
-            # 6.將數據更新到關鍵字表中
-            self.update(keyword_table_record, keyword_table=keyword_table)  # 確保每此都會更新
+    def invalidate_keyword_index(self, dataset_id: UUID) -> None:
+        """使所有行程中該知識庫的關鍵字倒排索引快取失效"""
+        self.keyword_index_cache.invalidate(dataset_id)
+
+    def delete_keyword_table_from_ids(self, dataset_id: UUID, segment_ids: list[UUID]) -> None:
+        """根據傳遞的知識庫id+片段id列表刪除關鍵字倒排表中對應的記錄"""
+        # 1.片段id列表為空時無需執行任何操作
+        if len(segment_ids) == 0:
+            return
+
+        # 2.使用一條DELETE語句刪除片段對應的所有倒排記錄，只會命中(dataset_id, segment_id)索引範圍內的數據
+        with self.db.auto_commit():
+            deleted_postings = self.db.session.execute(
+                delete(KeywordPosting).where(
+                    KeywordPosting.dataset_id == dataset_id,
+                    KeywordPosting.segment_id.in_(segment_ids),
+                ).returning(KeywordPosting.segment_id, KeywordPosting.segment_length)
+            ).all()
+
+        # 3.從知識庫統計資訊中扣除被移出索引的片段，並使倒排索引快取失效
+        segment_count, segment_length = self._count_segments(deleted_postings)
+        self._update_statistics(dataset_id, -segment_count, -segment_length)
+        if len(deleted_postings) > 0:
+            self.invalidate_keyword_index(dataset_id)
 
     def add_keyword_table_from_ids(self, dataset_id: UUID, segment_ids: list[UUID]) -> None:
-        """根據傳遞的知識庫id+片段id列表，在關鍵字表中添加關鍵字"""
-        # 1.新增知識庫關鍵字表裡多餘的數據，該操作需要上鎖，避免在並發的情況下拿到錯誤的數據
+        """根據傳遞的知識庫id+片段id列表，在關鍵字倒排表中添加關鍵字"""
+        # 1.片段id列表為空時無需執行任何操作
+        if len(segment_ids) == 0:
+            return
+
+        # 2.將片段的keywords展開成倒排記錄並批次寫入倒排表，重複的記錄直接忽略，並返回真正寫入的記錄
+        stmt = self._build_insert_postings(dataset_id, segment_ids).on_conflict_do_nothing().returning(
+            KeywordPosting.segment_id,
+            KeywordPosting.segment_length,
+        )
+        with self.db.auto_commit():
+            inserted_postings = self.db.session.execute(stmt).all()
+
+        # 3.將新加入索引的片段累加到知識庫統計資訊中，並使倒排索引快取失效
+        segment_count, segment_length = self._count_segments(inserted_postings)
+        self._update_statistics(dataset_id, segment_count, segment_length)
+        if len(inserted_postings) > 0:
+            self.invalidate_keyword_index(dataset_id)
+
+    def update_keyword_table_from_segment(self, dataset_id: UUID, segment_id: UUID, old_keywords: list[str]) -> None:
+        """
+        根據片段更新前的關鍵字與Segment.keywords中的新關鍵字計算差異，只更新該片段受影響的倒排記錄，
+        片段或所屬文件處於禁用狀態時不做任何處理，待啟用時再添加
+        """
+        # 1.片段或所屬文件禁用時片段不在索引中
+        enabled = self.db.session.query(Segment).with_entities(
+            Segment.enabled,
+            Document.enabled,
+        ).join(Document, Document.id == Segment.document_id).filter(Segment.id == segment_id).one_or_none()
+        if enabled is None or not all(enabled):
+            return
+
+        # 2.獲取片段當前在倒排表中的長度，沒有倒排記錄(如原有關鍵字為空)時按新加入索引的片段添加
+        old_segment_length = self.db.session.query(KeywordPosting).with_entities(
+            KeywordPosting.segment_length,
+        ).filter(
+            KeywordPosting.dataset_id == dataset_id,
+            KeywordPosting.segment_id == segment_id,
+        ).limit(1).scalar()
+        if old_segment_length is None:
+            self.add_keyword_table_from_ids(dataset_id, [segment_id])
+            return
+
+        # 3.獲取片段最新的關鍵字，並刪除已經不再屬於該片段的關鍵字(按主鍵精確刪除)
+        new_keywords, new_segment_length = self.db.session.query(Segment).with_entities(
+            Segment.keywords,
+            Segment.token_count,
+        ).filter(Segment.id == segment_id).one()
+        removed_keywords = set(old_keywords or []).difference(new_keywords)
+        with self.db.auto_commit():
+            if len(removed_keywords) > 0:
+                self.db.session.execute(
+                    delete(KeywordPosting).where(
+                        KeywordPosting.dataset_id == dataset_id,
+                        KeywordPosting.segment_id == segment_id,
+                        KeywordPosting.keyword.in_(removed_keywords),
+                    )
+                )
+
+            # 4.寫入新關鍵字，已存在的關鍵字則更新詞頻與片段長度
+            if len(new_keywords) > 0:
+                stmt = self._build_insert_postings(dataset_id, [segment_id])
+                self.db.session.execute(stmt.on_conflict_do_update(
+                    index_elements=["dataset_id", "keyword", "segment_id"],
+                    set_={
+                        "term_frequency": stmt.excluded.term_frequency,
+                        "segment_length": stmt.excluded.segment_length,
+                    },
+                ))
+
+        # 5.按長度差更新統計資訊，片段不再有任何倒排記錄(關鍵字被清空)時移出索引
+        indexed = self.db.session.query(KeywordPosting.segment_id).filter(
+            KeywordPosting.dataset_id == dataset_id,
+            KeywordPosting.segment_id == segment_id,
+        ).first() is not None
+        if indexed:
+            self._update_statistics(dataset_id, 0, new_segment_length - old_segment_length)
+        else:
+            self._update_statistics(dataset_id, -1, -old_segment_length)
+        self.invalidate_keyword_index(dataset_id)
+
+    @classmethod
+    def _build_insert_postings(cls, dataset_id: UUID, segment_ids: list[UUID]) -> Insert:
+        """
+        構建將片段keywords展開成倒排記錄的INSERT ... SELECT語句，同時計算關鍵字在片段中的詞頻以及片段長度，
+        超過倒排表關鍵字欄位長度的關鍵字不建立倒排記錄(與回填遷移保持一致)
+        """
+        keyword = func.jsonb_array_elements_text(Segment.keywords).table_valued(
+            "value", joins_implicitly=True,
+        ).alias("keyword")
+        content = func.lower(Segment.content)
+        term_frequency = func.greatest(
+            func.div(
+                func.length(content) - func.length(func.replace(content, func.lower(keyword.c.value), "")),
+                func.greatest(func.length(keyword.c.value), 1),
+            ),
+            1,
+        )
+
+        return insert(KeywordPosting).from_select(
+            ["dataset_id", "keyword", "segment_id", "term_frequency", "segment_length"],
+            select(
+                Segment.dataset_id,
+                keyword.c.value,
+                Segment.id,
+                term_frequency,
+                Segment.token_count,
+            ).where(
+                Segment.dataset_id == dataset_id,
+                Segment.id.in_(segment_ids),
+                func.length(keyword.c.value) <= KeywordPosting.keyword.type.length,
+            ),
+        )
+
+    def _update_statistics(self, dataset_id: UUID, segment_count: int, segment_length: int) -> None:
+        """根據傳遞的增量更新知識庫的BM25統計資訊(片段數、片段總長度)"""
+        if segment_count == 0 and segment_length == 0:
+            return
+
+        # 1.關鍵字表記錄可能需要新建，上鎖避免並發時重複創建
         cache_key = LOCK_KEYWORD_TABLE_UPDATE_KEYWORD_TABLE.format(dataset_id=dataset_id)
         with self.redis_client.lock(cache_key, timeout=LOCK_EXPIRE_TIME):
-            # 2.獲取指定知識庫的關鍵字詞表
-            keyword_table_record = self.get_keyword_table_from_dataset_id(dataset_id)
-            keyword_table = {
-                field: set(value) for field, value in keyword_table_record.keyword_table.items()
-            }
-
-            # 3.根據segment_ids尋找片段的關鍵字資訊
-            segments = self.db.session.query(Segment).with_entities(Segment.id, Segment.keywords).filter(
-                Segment.id.in_(segment_ids),
-            ).all()
-            # 4.循環將新關鍵字添加到關鍵字表中
-            for id, keywords in segments:
-                for keyword in keywords:
-                    if keyword not in keyword_table:
-                        keyword_table[keyword] = set()
-                    keyword_table[keyword].add(str(id))
-
-            # 5.更新關鍵字表
-            self.update(
-                keyword_table_record,
-                keyword_table={field: list(value) for field, value in keyword_table.items()}
-            )
+            self.get_keyword_table_from_dataset_id(dataset_id)
+
+            # 2.使用增量UPDATE累加統計資訊，無需讀取舊值
+            with self.db.auto_commit():
+                self.db.session.query(KeywordTable).filter(
+                    KeywordTable.dataset_id == dataset_id,
+                ).update({
+                    "segment_count": func.greatest(KeywordTable.segment_count + segment_count, 0),
+                    "total_segment_length": func.greatest(KeywordTable.total_segment_length + segment_length, 0),
+                }, synchronize_session=False)
+
+    @classmethod
+    def _count_segments(cls, postings: Sequence[Any]) -> tuple[int, int]:
+        """根據倒排記錄(segment_id, segment_length)列表計算涉及的片段數以及片段總長度"""
+        segment_lengths = {segment_id: segment_length for segment_id, segment_length in postings}
+        return len(segment_lengths), sum(segment_lengths.values())
@@ -42,6 +42,7 @@ class LanguageModelService(BaseService):
                 **model_entity.attributes,
                 **parameters,
                 features=model_entity.features,
+                context_window=model_entity.context_window,
                 metadata=model_entity.metadata,
             )
         except Exception as error:
@@ -64,5 +65,6 @@ class LanguageModelService(BaseService):
             temperature=1,
             max_tokens=8192,
             features=model_entity.features,
+            context_window=model_entity.context_window,
             metadata=model_entity.metadata,
         )
@@ -122,6 +122,7 @@ class OpenAPIService(BaseService):
                 dataset_ids=[dataset["id"] for dataset in app_config["datasets"]],
                 account_id=account.id,
                 retrival_source=RetrievalSource.APP,
+                context_window=llm.context_window,
                 **app_config["retrieval_config"],
             )
             tools.append(dataset_retrieval)
@@ -0,0 +1,116 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 上午2:10
+@Author : zsting29@gmail.com
+@File   : retrieval_cache_service.py
+"""
+import hashlib
+import json
+import logging
+from dataclasses import dataclass
+from typing import Any, Optional
+from uuid import UUID
+
+from injector import inject
+from langchain_core.documents import Document as LCDocument
+from redis import Redis
+
+from internal.core.embeddings import QueryCacheEmbeddings
+from internal.entity.cache_entity import DATASET_CONTENT_VERSION, RETRIEVAL_RESULT_CACHE
+from internal.entity.dataset_entity import RETRIEVAL_RESULT_CACHE_TTL
+from .base_service import BaseService
+
+
+@inject
+@dataclass
+class RetrievalCacheService(BaseService):
+    """
+    檢索結果快取服務，快取值記錄寫入時各知識庫的內容版本號，讀取時與當前版本號比對，
+    任一知識庫的內容發生變化(版本號遞增)後，包含該知識庫的檢索結果即不再命中
+    """
+    redis_client: Redis
+
+    @classmethod
+    def get_cache_key(
+            cls,
+            account_id: UUID,
+            dataset_ids: list[UUID],
+            query: str,
+            retrieval_strategy: str,
+            k: int,
+            score: float,
+    ) -> str:
+        """根據帳號、知識庫列表、查詢以及檢索配置構建檢索結果快取鍵"""
+        key = json.dumps([
+            str(account_id),
+            sorted(str(dataset_id) for dataset_id in dataset_ids),
+            QueryCacheEmbeddings.normalize_query(query),
+            str(retrieval_strategy),
+            k,
+            float(score),
+        ])
+        return RETRIEVAL_RESULT_CACHE.format(key_hash=hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, cache_key: str, dataset_ids: list[UUID]) -> tuple[Optional[list[LCDocument]], list[int]]:
+        """
+        一次往返讀取快取的檢索結果以及各知識庫當前的版本號，版本號一致時返回快取的文件列表，否則返回None，
+        同時返回讀取到的版本號，未命中時應使用該版本號寫入新的結果，避免檢索期間發生的變更被快取
+        """
+        # 1.按傳遞的順序讀取快取值與版本號，快取不可用時視為未命中
+        try:
+            value, *versions = self.redis_client.mget(
+                [cache_key] + [DATASET_CONTENT_VERSION.format(dataset_id=dataset_id) for dataset_id in dataset_ids]
+            )
+        except Exception as e:
+            logging.warning("讀取檢索結果快取失敗, 錯誤資訊: %(error)s", {"error": e})
+            return None, []
+        versions = [int(version) if version is not None else 0 for version in versions]
+
+        # 2.快取不存在或版本號不一致時未命中
+        if value is None:
+            return None, versions
+        cached = json.loads(value)
+        if cached["versions"] != versions:
+            return None, versions
+
+        # 3.還原LangChain文件列表
+        return [
+            LCDocument(page_content=document["page_content"], metadata=document["metadata"])
+            for document in cached["documents"]
+        ], versions
+
+    def set(self, cache_key: str, versions: list[int], lc_documents: list[LCDocument]) -> None:
+        """將檢索結果連同檢索前讀取的版本號寫入快取，寫入失敗只記錄日誌"""
+        try:
+            self.redis_client.set(cache_key, json.dumps({
+                "versions": versions,
+                "documents": [
+                    {"page_content": lc_document.page_content, "metadata": lc_document.metadata}
+                    for lc_document in lc_documents
+                ],
+            }, default=self._json_default), ex=RETRIEVAL_RESULT_CACHE_TTL)
+        except Exception as e:
+            logging.warning("寫入檢索結果快取失敗, 錯誤資訊: %(error)s", {"error": e})
+
+    def bump_versions(self, dataset_ids: list[UUID]) -> None:
+        """遞增傳遞知識庫的內容版本號，使包含這些知識庫的檢索結果快取全部失效"""
+        if len(dataset_ids) == 0:
+            return
+        try:
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for dataset_id in set(str(dataset_id) for dataset_id in dataset_ids):
+                pipeline.incr(DATASET_CONTENT_VERSION.format(dataset_id=dataset_id))
+            pipeline.execute()
+        except Exception as e:
+            logging.exception(
+                "遞增知識庫內容版本號失敗, dataset_ids: %(dataset_ids)s, 錯誤資訊: %(error)s",
+                {"dataset_ids": dataset_ids, "error": e},
+            )
+
+    @classmethod
+    def _json_default(cls, value: Any) -> Any:
+        """序列化元數據中的非JSON類型(如UUID、numpy數值)"""
+        if hasattr(value, "item"):
+            return value.item()
+        return str(value)
@@ -0,0 +1,153 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 上午12:40
+@Author : zsting29@gmail.com
+@File   : retrieval_record_service.py
+"""
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from injector import inject
+from redis import Redis
+from redis.exceptions import LockError, ResponseError
+from sqlalchemy import Integer, Uuid, cast, column, insert, update, values
+
+from internal.entity.cache_entity import (
+    LOCK_EXPIRE_TIME,
+    LOCK_RETRIEVAL_RECORD_FLUSH,
+    DATASET_QUERY_BUFFER,
+    DATASET_QUERY_BUFFER_FLUSHING,
+    SEGMENT_HIT_COUNT_BUFFER,
+    SEGMENT_HIT_COUNT_BUFFER_FLUSHING,
+)
+from internal.model import Dataset, DatasetQuery, Segment
+from pkg.sqlalchemy import SQLAlchemy
+from .base_service import BaseService
+
+
+@inject
+@dataclass
+class RetrievalRecordService(BaseService):
+    """
+    檢索記錄服務，知識庫查詢記錄與片段命中次數先累積在Redis寫後緩衝區中，不佔用檢索請求的資料庫連接與行鎖，
+    由定時任務批次刷新到資料庫(一條多行INSERT + 一條聚合UPDATE)，刷新語義為至少一次
+    """
+    db: SQLAlchemy
+    redis_client: Redis
+
+    def record(
+            self,
+            dataset_ids: list[str],
+            segment_ids: list[str],
+            query: str,
+            source: str,
+            source_app_id: Optional[UUID],
+            created_by: Optional[UUID],
+    ) -> None:
+        """將一次檢索的知識庫查詢記錄與片段命中次數寫入緩衝區"""
+        pipeline = self.redis_client.pipeline(transaction=False)
+
+        # 1.每個知識庫一條查詢記錄，記錄檢索發生的時間而非刷新的時間
+        created_at = datetime.now().isoformat()
+        for dataset_id in dataset_ids:
+            pipeline.rpush(DATASET_QUERY_BUFFER, json.dumps({
+                "dataset_id": str(dataset_id),
+                "query": query,
+                "source": source,
+                "source_app_id": str(source_app_id) if source_app_id else None,
+                "created_by": str(created_by) if created_by else None,
+                "created_at": created_at,
+            }))
+
+        # 2.片段命中次數以雜湊表累加，同一片段在刷新間隔內的多次命中合併成一個增量
+        for segment_id in segment_ids:
+            pipeline.hincrby(SEGMENT_HIT_COUNT_BUFFER, str(segment_id), 1)
+
+        pipeline.execute()
+
+    def flush(self) -> None:
+        """將緩衝區中的知識庫查詢記錄與片段命中次數批次寫入資料庫"""
+        lock = self.redis_client.lock(LOCK_RETRIEVAL_RECORD_FLUSH, timeout=LOCK_EXPIRE_TIME)
+        if not lock.acquire(blocking=False):
+            return
+
+        try:
+            self._flush_dataset_queries()
+            self._flush_hit_counts()
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                pass
+
+    def _take_buffer(self, buffer_key: str, flushing_key: str) -> bool:
+        """
+        獲取待刷新的緩衝區，上次刷新失敗遺留的待刷新鍵優先處理，否則將緩衝區原子改名為待刷新鍵，
+        此後的新記錄會寫入新的緩衝區，返回是否存在待刷新的數據
+        """
+        if self.redis_client.exists(flushing_key):
+            return True
+        try:
+            self.redis_client.rename(buffer_key, flushing_key)
+        except ResponseError:
+            # 緩衝區不存在(沒有新記錄)
+            return False
+        return True
+
+    def _flush_dataset_queries(self) -> None:
+        """以一條多行INSERT寫入所有緩衝的知識庫查詢記錄，已經刪除的知識庫的記錄會被丟棄"""
+        # 1.獲取待刷新的查詢記錄
+        if not self._take_buffer(DATASET_QUERY_BUFFER, DATASET_QUERY_BUFFER_FLUSHING):
+            return
+        records = [json.loads(record) for record in self.redis_client.lrange(DATASET_QUERY_BUFFER_FLUSHING, 0, -1)]
+
+        # 2.過濾已經刪除的知識庫並批次寫入
+        dataset_ids = {record["dataset_id"] for record in records}
+        existing_dataset_ids = {
+            str(id) for id, in self.db.session.query(Dataset.id).filter(Dataset.id.in_(dataset_ids)).all()
+        } if len(dataset_ids) > 0 else set()
+        rows = [
+            {**record, "created_at": datetime.fromisoformat(record["created_at"])}
+            for record in records if record["dataset_id"] in existing_dataset_ids
+        ]
+        if len(rows) > 0:
+            with self.db.auto_commit():
+                self.db.session.execute(insert(DatasetQuery), rows)
+
+        # 3.寫入成功後刪除待刷新鍵
+        self.redis_client.delete(DATASET_QUERY_BUFFER_FLUSHING)
+        logging.info("刷新知識庫查詢記錄完成, 數量: %(count)s", {"count": len(rows)})
+
+    def _flush_hit_counts(self) -> None:
+        """以一條聚合UPDATE(UPDATE ... FROM VALUES)寫入所有緩衝的片段命中次數增量"""
+        # 1.獲取待刷新的命中次數增量
+        if not self._take_buffer(SEGMENT_HIT_COUNT_BUFFER, SEGMENT_HIT_COUNT_BUFFER_FLUSHING):
+            return
+        deltas = {
+            (segment_id.decode() if isinstance(segment_id, bytes) else segment_id): int(delta)
+            for segment_id, delta in self.redis_client.hgetall(SEGMENT_HIT_COUNT_BUFFER_FLUSHING).items()
+        }
+
+        # 2.構建(片段id, 增量)臨時表並一次性更新所有片段
+        if len(deltas) > 0:
+            hit_counts = values(
+                column("id", Uuid),
+                column("delta", Integer),
+                name="hit_counts",
+            ).data([(UUID(segment_id), delta) for segment_id, delta in deltas.items()])
+            with self.db.auto_commit():
+                self.db.session.execute(
+                    update(Segment)
+                    .where(Segment.id == cast(hit_counts.c.id, Uuid))
+                    .values(hit_count=Segment.hit_count + hit_counts.c.delta)
+                    .execution_options(synchronize_session=False)
+                )
+
+        # 3.寫入成功後刪除待刷新鍵
+        self.redis_client.delete(SEGMENT_HIT_COUNT_BUFFER_FLUSHING)
+        logging.info("刷新片段命中次數完成, 片段數量: %(count)s", {"count": len(deltas)})
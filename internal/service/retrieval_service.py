@@ -5,27 +5,49 @@
 @Author : zsting29@gmail.com
 @File   : retrieval_service.py
 """
-
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from typing import Any, Optional, Type
 from uuid import UUID
 
-from flask import Flask
+from flask import Flask, current_app
 from injector import inject
-from langchain.retrievers import EnsembleRetriever
+from langchain_core.callbacks import CallbackManager
 from langchain_core.documents import Document as LCDocument
 from langchain_core.pydantic_v1 import BaseModel, Field
-from langchain_core.tools import BaseTool, tool
-from sqlalchemy import update
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import get_config_list
+from langchain_core.tools import BaseTool
+from langchain_core.vectorstores import VectorStore
+from redis import Redis
 
-from internal.entity.dataset_entity import RetrievalStrategy, RetrievalSource
+from internal.core.embeddings import QueryCacheEmbeddings
+from internal.entity.cache_entity import DATASET_OWNER
+from internal.entity.dataset_entity import (
+    RetrievalStrategy,
+    RetrievalSource,
+    DATASET_OWNER_CACHE_TTL,
+    DEFAULT_HYBRID_SEARCH_ALPHA,
+    SEMANTIC_RETRIEVAL_TIMEOUT,
+    FULL_TEXT_RETRIEVAL_TIMEOUT,
+    RECIPROCAL_RANK_FUSION_K,
+    BATCH_RETRIEVAL_CONCURRENCY,
+)
 from internal.exception import NotFoundException
-from internal.model import Segment, Dataset, DatasetQuery
+from internal.model import Dataset
 from pkg.sqlalchemy import SQLAlchemy
 from .base_service import BaseService
+from .context_packer_service import ContextPackerService
 from .jieba_service import JiebaService
+from .keyword_table_service import KeywordTableService
+from .retrieval_cache_service import RetrievalCacheService
+from .retrieval_record_service import RetrievalRecordService
 from .vector_database_service import VectorDatabaseService
 from ..core.agent.entities.agent_entity import DATASET_RETRIEVAL_TOOL_NAME
-from ..lib.helper import combine_documents
 
 
 @inject
@@ -33,8 +55,13 @@ from ..lib.helper import combine_documents
 class RetrievalService(BaseService):
     """檢索服務"""
     db: SQLAlchemy
+    redis_client: Redis
     jieba_service: JiebaService
+    keyword_table_service: KeywordTableService
     vector_database_service: VectorDatabaseService
+    retrieval_record_service: RetrievalRecordService
+    retrieval_cache_service: RetrievalCacheService
+    context_packer_service: ContextPackerService
 
     def search_in_datasets(
             self,
@@ -46,69 +73,359 @@ class RetrievalService(BaseService):
             score: float = 0,
             retrival_source: str = RetrievalSource.HIT_TESTING,
     ) -> list[LCDocument]:
-        """根據傳遞的query+知識庫列表執行檢索，並返回檢索的文件+得分數據（如果檢索策略為全文檢索，則得分為0）"""
-        # 1.提取知識庫列表並校驗權限同時更新知識庫id
-        datasets = self.db.session.query(Dataset).filter(
-            Dataset.id.in_(dataset_ids),
-            Dataset.account_id == account_id
-        ).all()
-        if datasets is None or len(datasets) == 0:
+        """根據傳遞的query+知識庫列表執行檢索，並返回檢索的文件+得分數據（全文檢索的得分為歸一化後的BM25得分）"""
+        return self._search_in_authorized_datasets(
+            dataset_ids=self.get_authorized_dataset_ids(dataset_ids, account_id),
+            query=query,
+            account_id=account_id,
+            retrieval_strategy=retrieval_strategy,
+            k=k,
+            score=score,
+            retrival_source=retrival_source,
+        )
+
+    def get_authorized_dataset_ids(self, dataset_ids: list[UUID], account_id: UUID) -> list[UUID]:
+        """校驗權限並返回帳號擁有的知識庫id列表，知識庫擁有者優先從共享快取中獲取，未命中的部分再查詢資料庫"""
+        # 1.去重並一次性讀取所有知識庫的擁有者快取
+        dataset_ids = list(dict.fromkeys(UUID(str(dataset_id)) for dataset_id in dataset_ids))
+        if len(dataset_ids) == 0:
+            return []
+        owners = {
+            dataset_id: owner.decode() if isinstance(owner, bytes) else owner
+            for dataset_id, owner in zip(
+                dataset_ids,
+                self.redis_client.mget([DATASET_OWNER.format(dataset_id=dataset_id) for dataset_id in dataset_ids]),
+            ) if owner is not None
+        }
+
+        # 2.未命中的知識庫查詢資料庫並回填快取，不存在的知識庫不快取
+        missing_dataset_ids = [dataset_id for dataset_id in dataset_ids if dataset_id not in owners]
+        if len(missing_dataset_ids) > 0:
+            datasets = self.db.session.query(Dataset).with_entities(Dataset.id, Dataset.account_id).filter(
+                Dataset.id.in_(missing_dataset_ids),
+            ).all()
+            pipeline = self.redis_client.pipeline(transaction=False)
+            for dataset_id, dataset_account_id in datasets:
+                owners[dataset_id] = str(dataset_account_id)
+                pipeline.set(
+                    DATASET_OWNER.format(dataset_id=dataset_id),
+                    str(dataset_account_id),
+                    ex=DATASET_OWNER_CACHE_TTL,
+                )
+            pipeline.execute()
+
+        # 3.按傳遞的順序返回屬於該帳號的知識庫
+        return [dataset_id for dataset_id in dataset_ids if owners.get(dataset_id) == str(account_id)]
+
+    def invalidate_dataset_owner(self, dataset_id: UUID) -> None:
+        """清除知識庫擁有者快取，刪除知識庫後調用"""
+        self.redis_client.delete(DATASET_OWNER.format(dataset_id=dataset_id))
+
+    def _search_in_authorized_datasets(
+            self,
+            dataset_ids: list[UUID],
+            query: str,
+            account_id: UUID,
+            retrieval_strategy: str = RetrievalStrategy.SEMANTIC,
+            k: int = 4,
+            score: float = 0,
+            retrival_source: str = RetrievalSource.HIT_TESTING,
+    ) -> list[LCDocument]:
+        """在已經通過權限校驗的知識庫列表中執行檢索"""
+        # 1.校驗是否有知識庫可執行檢索
+        if len(dataset_ids) == 0:
             raise NotFoundException("當前無知識庫可執行檢索")
-        dataset_ids = [dataset.id for dataset in datasets]
 
-        # 2.構建不同種類的檢索器
-        from internal.core.retrievers import SemanticRetriever, FullTextRetriever
-        semantic_retriever = SemanticRetriever(
+        # 2.優先從檢索結果快取中獲取，命中表示知識庫內容未發生變化
+        cache_key = self.retrieval_cache_service.get_cache_key(
+            account_id, dataset_ids, query, retrieval_strategy, k, score,
+        )
+        lc_documents, versions = self.retrieval_cache_service.get(cache_key, dataset_ids)
+        if lc_documents is not None:
+            self._record(lc_documents, query, retrival_source, account_id)
+            return lc_documents
+
+        # 3.根據不同的檢索策略只構建需要的檢索器並執行檢索，向量資料庫啟用多租戶時只在帳號對應的租戶中檢索，
+        # 租戶不存在(帳號尚未寫入過向量)時不執行向量檢索
+        semantic_search_kwargs = {
+            "k": k,
+            "score_threshold": score,
+        }
+        tenant = None
+        if retrieval_strategy != RetrievalStrategy.FULL_TEXT:
+            tenant = self.vector_database_service.get_tenant(account_id)
+        if tenant is not None:
+            semantic_search_kwargs["tenant"] = tenant
+        has_vectors = tenant is None or self.vector_database_service.has_tenant(tenant)
+        if retrieval_strategy == RetrievalStrategy.SEMANTIC:
+            lc_documents = self._build_semantic_retriever(
+                dataset_ids, semantic_search_kwargs,
+            ).invoke(query)[:k] if has_vectors else []
+        elif retrieval_strategy == RetrievalStrategy.FULL_TEXT or not has_vectors:
+            lc_documents = self._build_full_text_retriever(dataset_ids, k).invoke(query)[:k]
+        else:
+            # 混合檢索優先使用Weaviate原生的混合查詢(向量+BM25，一次往返)，本地向量索引或原生查詢失敗時退回兩個檢索器的融合
+            lc_documents = None
+            if not self.vector_database_service.is_local:
+                try:
+                    lc_documents = self._build_semantic_retriever(dataset_ids, {
+                        **semantic_search_kwargs,
+                        "alpha": float(os.getenv("HYBRID_SEARCH_ALPHA") or DEFAULT_HYBRID_SEARCH_ALPHA),
+                    }).invoke(query)[:k]
+                except Exception as e:
+                    logging.warning("原生混合檢索失敗, 退回融合檢索, 錯誤資訊: %(error)s", {"error": e})
+            if lc_documents is None:
+                from internal.core.retrievers import ParallelHybridRetriever
+                lc_documents = ParallelHybridRetriever(
+                    flask_app=current_app._get_current_object(),
+                    retrievers=[
+                        self._build_semantic_retriever(dataset_ids, semantic_search_kwargs),
+                        self._build_full_text_retriever(dataset_ids, k),
+                    ],
+                    weights=[0.5, 0.5],
+                    timeouts=[SEMANTIC_RETRIEVAL_TIMEOUT, FULL_TEXT_RETRIEVAL_TIMEOUT],
+                    c=RECIPROCAL_RANK_FUSION_K,
+                ).invoke(query)[:k]
+
+        # 4.使用檢索前讀取的版本號寫入快取，檢索期間知識庫內容發生變化時該結果不會被命中
+        self.retrieval_cache_service.set(cache_key, versions, lc_documents)
+
+        # 5.記錄知識庫查詢記錄與片段命中次數
+        self._record(lc_documents, query, retrival_source, account_id)
+
+        return lc_documents
+
+    def _build_semantic_retriever(self, dataset_ids: list[UUID], search_kwargs: dict[str, Any]) -> BaseRetriever:
+        """構建在傳遞知識庫列表中執行向量檢索(傳遞alpha時為原生混合查詢)的檢索器"""
+        from internal.core.retrievers import SemanticRetriever
+        return SemanticRetriever(
             dataset_ids=dataset_ids,
             vector_store=self.vector_database_service.vector_store,
-            search_kwargs={
-                "k": k,
-                "score_threshold": score,
-            },
+            search_kwargs={**search_kwargs},
         )
-        full_text_retriever = FullTextRetriever(
+
+    def _build_full_text_retriever(self, dataset_ids: list[UUID], k: int) -> BaseRetriever:
+        """構建在傳遞知識庫列表中執行全文檢索的檢索器"""
+        from internal.core.retrievers import FullTextRetriever
+        return FullTextRetriever(
             db=self.db,
             dataset_ids=dataset_ids,
             jieba_service=self.jieba_service,
+            keyword_table_service=self.keyword_table_service,
             search_kwargs={
                 "k": k
             },
         )
-        hybrid_retriever = EnsembleRetriever(
-            retrievers=[semantic_retriever, full_text_retriever],
-            weights=[0.5, 0.5],
+
+    def batch_search_in_datasets(
+            self,
+            dataset_ids: list[UUID],
+            queries: list[str],
+            account_id: UUID,
+            retrieval_strategy: str = RetrievalStrategy.SEMANTIC,
+            k: int = 4,
+            score: float = 0,
+            retrival_source: str = RetrievalSource.HIT_TESTING,
+    ) -> list[list[LCDocument]]:
+        """根據傳遞的多個query+知識庫列表批次執行檢索，返回的文件列表順序與傳遞的query一致"""
+        return self._batch_search_in_authorized_datasets(
+            dataset_ids=self.get_authorized_dataset_ids(dataset_ids, account_id),
+            queries=queries,
+            account_id=account_id,
+            retrieval_strategy=retrieval_strategy,
+            k=k,
+            score=score,
+            retrival_source=retrival_source,
         )
 
-        # 3.根據不同的檢索策略執行檢索
-        if retrieval_strategy == RetrievalStrategy.SEMANTIC:
-            lc_documents = semantic_retriever.invoke(query)[:k]
-        elif retrieval_strategy == RetrievalStrategy.FULL_TEXT:
-            lc_documents = full_text_retriever.invoke(query)[:k]
-        else:
-            lc_documents = hybrid_retriever.invoke(query)[:k]
-
-        # 4.添加知識庫查詢記錄（只儲存唯一記錄，也就是一個知識庫如果檢索了多篇文件，也只儲存一條）
-        unique_dataset_ids = list(set(str(lc_document.metadata["dataset_id"]) for lc_document in lc_documents))
-        for dataset_id in unique_dataset_ids:
-            self.create(
-                DatasetQuery,
-                dataset_id=dataset_id,
-                query=query,
-                source=retrival_source,
-                source_app_id=None,
-                created_by=account_id,
-            )
+    def _batch_search_in_authorized_datasets(
+            self,
+            dataset_ids: list[UUID],
+            queries: list[str],
+            account_id: UUID,
+            retrieval_strategy: str = RetrievalStrategy.SEMANTIC,
+            k: int = 4,
+            score: float = 0,
+            retrival_source: str = RetrievalSource.HIT_TESTING,
+    ) -> list[list[LCDocument]]:
+        """在已經通過權限校驗的知識庫列表中批次執行檢索"""
+        # 1.校驗是否有知識庫可執行檢索
+        if len(dataset_ids) == 0:
+            raise NotFoundException("當前無知識庫可執行檢索")
 
-        # 5.批次更新片段的命中次數，召回次數，涵蓋了構建+執行語句
-        with self.db.auto_commit():
-            stmt = (
-                update(Segment)
-                .where(Segment.id.in_([lc_document.metadata["segment_id"] for lc_document in lc_documents]))
-                .values(hit_count=Segment.hit_count + 1)
+        # 2.逐個查詢讀取檢索結果快取，只為未命中的查詢執行檢索
+        cache_keys = [
+            self.retrieval_cache_service.get_cache_key(account_id, dataset_ids, query, retrieval_strategy, k, score)
+            for query in queries
+        ]
+        results: list[Optional[list[LCDocument]]] = []
+        versions_list = []
+        for cache_key in cache_keys:
+            lc_documents, versions = self.retrieval_cache_service.get(cache_key, dataset_ids)
+            results.append(lc_documents)
+            versions_list.append(versions)
+        missing_indexes = [idx for idx, lc_documents in enumerate(results) if lc_documents is None]
+
+        # 3.批次檢索所有未命中的查詢，並使用檢索前讀取的版本號寫入快取
+        if len(missing_indexes) > 0:
+            missing_results = self._batch_retrieve(
+                dataset_ids,
+                [queries[idx] for idx in missing_indexes],
+                account_id,
+                retrieval_strategy,
+                k,
+                score,
             )
-            self.db.session.execute(stmt)
+            for idx, lc_documents in zip(missing_indexes, missing_results):
+                results[idx] = lc_documents
+                self.retrieval_cache_service.set(cache_keys[idx], versions_list[idx], lc_documents)
 
-        return lc_documents
+        # 4.記錄每個查詢的知識庫查詢記錄與片段命中次數
+        for query, lc_documents in zip(queries, results):
+            self._record(lc_documents, query, retrival_source, account_id)
+
+        return results
+
+    def _batch_retrieve(
+            self,
+            dataset_ids: list[UUID],
+            queries: list[str],
+            account_id: UUID,
+            retrieval_strategy: str,
+            k: int,
+            score: float,
+    ) -> list[list[LCDocument]]:
+        """
+        批次執行檢索(不經過快取)：全文檢索的倒排記錄與片段只提取一次，所有查詢的嵌入合併成一次模型請求，
+        向量檢索(或原生混合查詢)使用預先計算的向量並行執行
+        """
+        from internal.core.retrievers import reciprocal_rank_fusion
+
+        def _batch_full_text_search(batch_queries: list[str]) -> list[list[LCDocument]]:
+            return [
+                lc_documents[:k] for lc_documents in
+                self._build_full_text_retriever(dataset_ids, k).batch_get_relevant_documents(batch_queries)
+            ]
+
+        # 1.全文檢索一次完成所有查詢
+        if retrieval_strategy == RetrievalStrategy.FULL_TEXT:
+            return _batch_full_text_search(queries)
+
+        # 2.構建向量檢索參數，向量資料庫啟用多租戶時只在帳號對應的租戶中檢索，租戶不存在時不執行向量檢索
+        search_kwargs = {
+            "k": k,
+            "score_threshold": score,
+        }
+        tenant = self.vector_database_service.get_tenant(account_id)
+        if tenant is not None:
+            search_kwargs["tenant"] = tenant
+            if not self.vector_database_service.has_tenant(tenant):
+                if retrieval_strategy == RetrievalStrategy.SEMANTIC:
+                    return [[] for _ in queries]
+                return _batch_full_text_search(queries)
+
+        # 3.所有查詢合併成一次嵌入請求(已快取的查詢直接命中)
+        vector_store = self.vector_database_service.vector_store
+        embeddings = vector_store.embeddings
+        if isinstance(embeddings, QueryCacheEmbeddings):
+            vectors = embeddings.embed_queries(queries)
+        else:
+            vectors = [embeddings.embed_query(query) for query in queries]
+
+        # 4.相似性檢索並行執行所有查詢，任一查詢出錯時拋出異常
+        if retrieval_strategy == RetrievalStrategy.SEMANTIC:
+            results = self._batch_semantic_search(dataset_ids, vector_store, queries, vectors, search_kwargs)
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+            return results
+
+        # 5.混合檢索優先使用Weaviate原生的混合查詢，本地向量索引或原生查詢失敗的查詢退回向量檢索與全文檢索的融合
+        results: list[Any] = [None] * len(queries)
+        if not self.vector_database_service.is_local:
+            results = self._batch_semantic_search(dataset_ids, vector_store, queries, vectors, {
+                **search_kwargs,
+                "alpha": float(os.getenv("HYBRID_SEARCH_ALPHA") or DEFAULT_HYBRID_SEARCH_ALPHA),
+            })
+            for result in results:
+                if isinstance(result, Exception):
+                    logging.warning("原生混合檢索失敗, 退回融合檢索, 錯誤資訊: %(error)s", {"error": result})
+        fallback_indexes = [idx for idx, result in enumerate(results) if result is None or isinstance(result, Exception)]
+        if len(fallback_indexes) == 0:
+            return results
+
+        # 6.退回的查詢批次執行向量檢索(帶超時)與全文檢索，並以倒數排名融合合併結果
+        semantic_results = self._batch_semantic_search(
+            dataset_ids,
+            vector_store,
+            [queries[idx] for idx in fallback_indexes],
+            [vectors[idx] for idx in fallback_indexes],
+            search_kwargs,
+            timeout=SEMANTIC_RETRIEVAL_TIMEOUT,
+        )
+        full_text_results = _batch_full_text_search([queries[idx] for idx in fallback_indexes])
+        for idx, semantic_result, full_text_result in zip(fallback_indexes, semantic_results, full_text_results):
+            if isinstance(semantic_result, Exception):
+                logging.warning("向量檢索失敗, 只使用全文檢索結果, 錯誤資訊: %(error)s", {"error": semantic_result})
+                semantic_result = []
+            results[idx] = reciprocal_rank_fusion(
+                [semantic_result, full_text_result],
+                weights=[0.5, 0.5],
+                c=RECIPROCAL_RANK_FUSION_K,
+            )[:k]
+
+        return results
+
+    @classmethod
+    def _batch_semantic_search(
+            cls,
+            dataset_ids: list[UUID],
+            vector_store: VectorStore,
+            queries: list[str],
+            vectors: list[list[float]],
+            search_kwargs: dict[str, Any],
+            timeout: Optional[float] = None,
+    ) -> list[list[LCDocument] | Exception]:
+        """使用預先計算的查詢向量並行執行向量檢索，出錯或超時的查詢返回異常，傳遞timeout時所有查詢從同一時間點起算"""
+        from internal.core.retrievers import SemanticRetriever
+
+        def _search(query: str, vector: list[float]) -> list[LCDocument]:
+            return SemanticRetriever(
+                dataset_ids=dataset_ids,
+                vector_store=vector_store,
+                search_kwargs={**search_kwargs, "vector": vector},
+            ).invoke(query)[:search_kwargs["k"]]
+
+        # 1.在執行緒池中並行執行所有查詢，執行緒池不等待超時的任務
+        executor = ThreadPoolExecutor(max_workers=min(len(queries), BATCH_RETRIEVAL_CONCURRENCY))
+        try:
+            started_at = time.monotonic()
+            futures = [executor.submit(_search, query, vector) for query, vector in zip(queries, vectors)]
+
+            # 2.按順序收集結果，出錯或超時的查詢記錄為異常
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result(
+                        timeout=None if timeout is None else max(0.0, timeout - (time.monotonic() - started_at)),
+                    ))
+                except Exception as e:
+                    results.append(e)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return results
+
+    def _record(self, lc_documents: list[LCDocument], query: str, retrival_source: str, account_id: UUID) -> None:
+        """將知識庫查詢記錄（一個知識庫如果檢索了多篇文件，也只儲存一條）與片段命中次數寫入緩衝區，由定時任務批次刷新到資料庫"""
+        self.retrieval_record_service.record(
+            dataset_ids=list(set(str(lc_document.metadata["dataset_id"]) for lc_document in lc_documents)),
+            segment_ids=[lc_document.metadata["segment_id"] for lc_document in lc_documents],
+            query=query,
+            source=retrival_source,
+            source_app_id=None,
+            created_by=account_id,
+        )
 
     def create_langchain_tool_from_search(
             self,
@@ -119,32 +436,100 @@ class RetrievalService(BaseService):
             k: int = 4,
             score: float = 0,
             retrival_source: str = RetrievalSource.HIT_TESTING,
+            context_window: int = 0,
     ) -> BaseTool:
-        """根據傳遞的參數構建一個LangChain知識庫搜索工具"""
+        """
+        根據傳遞的參數構建一個LangChain知識庫搜索工具，權限在構建時校驗一次並固定，每次調用只執行檢索，
+        檢索結果按模型上下文窗口(context_window，0表示未知)計算的token預算打包後返回
+        """
+        # 1.構建工具時校驗權限並固定可檢索的知識庫列表，同時計算檢索結果的token預算
+        with flask_app.app_context():
+            authorized_dataset_ids = self.get_authorized_dataset_ids(dataset_ids, account_id)
+        max_tokens = self.context_packer_service.get_max_tokens(context_window)
+
+        retrieval_service = self
 
         class DatasetRetrievalInput(BaseModel):
             """知識庫檢索工具輸入結構"""
             query: str = Field(description="知識庫搜索query語句，類型為字串")
 
-        @tool(DATASET_RETRIEVAL_TOOL_NAME, args_schema=DatasetRetrievalInput)
-        def dataset_retrieval(query: str) -> str:
-            """如果需要搜索擴展的知識庫內容，當你覺得用戶的提問超過你的知識範圍時，可以嘗試調用該工具，輸入為搜索query語句，返回數據為檢索內容字串"""
-            # 1.調用search_in_datasets檢索得到LangChain文件列表
-            with flask_app.app_context():
-                documents = self.search_in_datasets(
-                    dataset_ids=dataset_ids,
-                    query=query,
-                    account_id=account_id,
-                    retrieval_strategy=retrieval_strategy,
-                    k=k,
-                    score=score,
-                    retrival_source=retrival_source,
-                )
+        class DatasetRetrievalTool(BaseTool):
+            """知識庫檢索工具，同一輪的多次調用可以透過batch合併成一次批次檢索"""
+            name: str = DATASET_RETRIEVAL_TOOL_NAME
+            description: str = "如果需要搜索擴展的知識庫內容，當你覺得用戶的提問超過你的知識範圍時，可以嘗試調用該工具，輸入為搜索query語句，返回數據為檢索內容字串"
+            args_schema: Type[BaseModel] = DatasetRetrievalInput
+
+            def _run(self, query: str) -> str:
+                """在構建時已校驗權限的知識庫中檢索，並將LangChain文件列錶轉換成字串後返回"""
+                return self._batch_run([query])[0]
+
+            def batch(
+                    self,
+                    inputs: list[Any],
+                    config: Optional[RunnableConfig | list[RunnableConfig]] = None,
+                    *,
+                    return_exceptions: bool = False,
+                    **kwargs: Any,
+            ) -> list[Any]:
+                """
+                批次檢索多個query，所有query共用一次嵌入請求、並行的向量檢索以及一次全文檢索，
+                每個query與invoke一樣各自觸發工具的開始/結束/出錯回調(涵蓋追蹤)
+                """
+                # 1.提取所有調用的query，並按各自的配置觸發工具開始回調
+                queries = [input["query"] if isinstance(input, dict) else str(input) for input in inputs]
+                run_managers = []
+                for input, query, input_config in zip(inputs, queries, get_config_list(config, len(inputs))):
+                    callback_manager = CallbackManager.configure(
+                        input_config.get("callbacks"),
+                        self.callbacks,
+                        self.verbose,
+                        input_config.get("tags"),
+                        self.tags,
+                        input_config.get("metadata"),
+                        self.metadata,
+                    )
+                    run_managers.append(callback_manager.on_tool_start(
+                        {"name": self.name, "description": self.description},
+                        input if isinstance(input, str) else str(input),
+                        run_id=input_config.get("run_id"),
+                        name=input_config.get("run_name") or self.name,
+                        inputs={"query": query},
+                    ))
+
+                # 2.批次檢索，出錯時所有調用都觸發出錯回調
+                try:
+                    outputs = self._batch_run(queries)
+                except Exception as e:
+                    for run_manager in run_managers:
+                        run_manager.on_tool_error(e)
+                    if not return_exceptions:
+                        raise
+                    return [e] * len(queries)
+
+                # 3.觸發工具結束回調並返回
+                for run_manager, output in zip(run_managers, outputs):
+                    run_manager.on_tool_end(output, name=self.name)
+                return outputs
 
-            # 2.將LangChain文件列錶轉換成字串後返回
-            if len(documents) == 0:
-                return "知識庫內沒有檢索到對應內容"
+            def _batch_run(self, queries: list[str]) -> list[str]:
+                """在構建時已校驗權限的知識庫中批次檢索得到LangChain文件列表，並在token預算內打包成字串"""
+                # 1.批次檢索並打包
+                with flask_app.app_context():
+                    documents_list = retrieval_service._batch_search_in_authorized_datasets(
+                        dataset_ids=authorized_dataset_ids,
+                        queries=queries,
+                        account_id=account_id,
+                        retrieval_strategy=retrieval_strategy,
+                        k=k,
+                        score=score,
+                        retrival_source=retrival_source,
+                    )
+                    contexts = retrieval_service.context_packer_service.pack_documents(documents_list, max_tokens)
 
-            return combine_documents(documents)
+                # 2.沒有檢索到內容時返回提示資訊
+                return [
+                    context if len(documents) > 0 else "知識庫內沒有檢索到對應內容"
+                    for documents, context in zip(documents_list, contexts)
+                ]
 
-        return dataset_retrieval
+        return DatasetRetrievalTool()
@@ -31,9 +31,10 @@ from internal.schema.segment_schema import (
 from pkg.paginator import Paginator
 from pkg.sqlalchemy import SQLAlchemy
 from .base_service import BaseService
-from .embeddings_service import EmbeddingsService
 from .jieba_service import JiebaService
 from .keyword_table_service import KeywordTableService
+from .retrieval_cache_service import RetrievalCacheService
+from .token_count_service import TokenCountService
 from .vector_database_service import VectorDatabaseService
 
 
@@ -44,9 +45,10 @@ class SegmentService(BaseService):
     db: SQLAlchemy
     redis_client: Redis
     jieba_service: JiebaService
-    embeddings_service: EmbeddingsService
     keyword_table_service: KeywordTableService
+    token_count_service: TokenCountService
     vector_database_service: VectorDatabaseService
+    retrieval_cache_service: RetrievalCacheService
 
     def create_segment(
             self,
@@ -57,7 +59,7 @@ class SegmentService(BaseService):
     ) -> Segment:
         """根據傳遞的資訊新增文件片段資訊"""
         # 1.校驗上傳內容的token長度總數，不能超過1000
-        token_count = self.embeddings_service.calculate_token_count(req.content.data)
+        token_count = self.token_count_service.calculate_token_count(req.content.data)
         if token_count > 1000:
             raise ValidateErrorException("片段內容的長度不能超過1000 token")
 
@@ -108,7 +110,8 @@ class SegmentService(BaseService):
             )
 
             # 8.往向量資料庫中新增數據
-            self.vector_database_service.vector_store.add_documents(
+            self.vector_database_service.add_documents(
+                document.account_id,
                 [LCDocument(
                     page_content=req.content.data,
                     metadata={
@@ -156,6 +159,9 @@ class SegmentService(BaseService):
                     stopped_at=datetime.now(),
                 )
             raise FailException("新增文件片段失敗，請稍後嘗試")
+        finally:
+            # 12.無論成功與否向量或關鍵字數據都可能已經變化，使知識庫的檢索結果快取失效
+            self.retrieval_cache_service.bump_versions([dataset_id])
 
     def get_segments_with_page(
             self,
@@ -258,10 +264,14 @@ class SegmentService(BaseService):
                     self.keyword_table_service.delete_keyword_table_from_ids(dataset_id, [segment_id])
 
                 # 8.同步處理weaviate向量資料庫裡的數據
-                self.vector_database_service.collection.data.update(
-                    uuid=segment.node_id,
-                    properties={"segment_enabled": enabled}
+                errors = self.vector_database_service.update_properties_many(
+                    segment.account_id,
+                    segment.dataset_id,
+                    [str(segment.node_id)],
+                    {"segment_enabled": enabled},
                 )
+                if len(errors) > 0:
+                    raise RuntimeError(next(iter(errors.values())))
             except Exception as e:
                 logging.exception(
                     "更改文件片段啟用狀態出現異常, segment_id: %(segment_id)s, 錯誤資訊: %(error)s",
@@ -276,6 +286,9 @@ class SegmentService(BaseService):
                     stopped_at=datetime.now(),
                 )
                 raise FailException("更新文件片段啟用狀態失敗，請稍後重試")
+            finally:
+                # 9.使知識庫的檢索結果快取失效
+                self.retrieval_cache_service.bump_versions([dataset_id])
 
     def delete_segment(
             self,
@@ -308,14 +321,17 @@ class SegmentService(BaseService):
 
         # 5.同步刪除向量資料庫儲存的紀錄
         try:
-            self.vector_database_service.collection.data.delete_by_id(str(segment.node_id))
+            self.vector_database_service.delete_by_ids(segment.account_id, segment.dataset_id, [str(segment.node_id)])
         except Exception as e:
             logging.exception(
                 "刪除文件片段記錄失敗, segment_id: %(segment_id)s, 錯誤資訊: %(error)s",
                 {"segment_id": segment_id, "error": e},
             )
 
-        # 6.更新文件資訊，涵蓋字元總數、token總次數
+        # 6.使知識庫的檢索結果快取失效
+        self.retrieval_cache_service.bump_versions([dataset_id])
+
+        # 7.更新文件資訊，涵蓋字元總數、token總次數
         document_character_count, document_token_count = self.db.session.query(
             func.coalesce(func.sum(Segment.character_count), 0),
             func.coalesce(func.sum(Segment.token_count), 0)
@@ -360,19 +376,19 @@ class SegmentService(BaseService):
         required_update = segment.hash != new_hash
 
         try:
-            # 5.更新segment表記錄
+            # 5.記錄片段原有的關鍵字後更新segment表記錄
+            old_keywords = list(segment.keywords)
             self.update(
                 segment,
                 keywords=req.keywords.data,
                 content=req.content.data,
                 hash=new_hash,
                 character_count=len(req.content.data),
-                token_count=self.embeddings_service.calculate_token_count(req.content.data),
+                token_count=self.token_count_service.calculate_token_count(req.content.data),
             )
 
-            # 7.更新片段歸屬關鍵字資訊
-            self.keyword_table_service.delete_keyword_table_from_ids(dataset_id, [segment_id])
-            self.keyword_table_service.add_keyword_table_from_ids(dataset_id, [segment_id])
+            # 7.根據新舊關鍵字的差異更新片段歸屬關鍵字資訊
+            self.keyword_table_service.update_keyword_table_from_segment(dataset_id, segment_id, old_keywords)
 
             # 8.檢測是否需要更新文件資訊以及向量資料庫
             if required_update:
@@ -389,12 +405,11 @@ class SegmentService(BaseService):
                 )
 
                 # 9.更新向量資料庫對應記錄
-                self.vector_database_service.collection.data.update(
-                    uuid=str(segment.node_id),
-                    properties={
-                        "text": req.content.data,
-                    },
-                    vector=self.embeddings_service.embeddings.embed_query(req.content.data)
+                self.vector_database_service.update_text(
+                    segment.account_id,
+                    segment.dataset_id,
+                    str(segment.node_id),
+                    req.content.data,
                 )
         except Exception as e:
             logging.exception(
@@ -402,5 +417,8 @@ class SegmentService(BaseService):
                 {"segment_id": segment_id, "error": e},
             )
             raise FailException("更新文件片段記錄失敗，請稍後嘗試")
+        finally:
+            # 10.使知識庫的檢索結果快取失效
+            self.retrieval_cache_service.bump_versions([dataset_id])
 
         return segment
@@ -0,0 +1,73 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午5:05
+@Author : zsting29@gmail.com
+@File   : token_count_service.py
+"""
+from hashlib import blake2b
+from threading import Lock
+
+import tiktoken
+from injector import inject, singleton
+
+from pkg.cache import LRUCache
+
+# 預設用於計算token數的模型
+DEFAULT_TOKEN_COUNT_MODEL = "gpt-3.5"
+
+# 行程內最多快取的文本token數記錄條數
+TOKEN_COUNT_CACHE_SIZE = 200000
+
+# 未命中快取的文本數達到該值時才使用encode_batch(每次調用都會創建執行緒池)，否則逐條encode
+TOKEN_COUNT_BATCH_THRESHOLD = 64
+
+
+@inject
+@singleton
+class TokenCountService:
+    """文本token計數服務，每種編碼只載入一次，並以文本雜湊為鍵快取計數結果"""
+
+    def __init__(self):
+        self._encodings: dict[str, tiktoken.Encoding] = {}
+        self._lock = Lock()
+        self._cache = LRUCache(maxsize=TOKEN_COUNT_CACHE_SIZE)
+
+    def get_encoding(self, model: str = DEFAULT_TOKEN_COUNT_MODEL) -> tiktoken.Encoding:
+        """根據傳遞的模型名字獲取對應的編碼器，同一個模型在行程內只會載入一次"""
+        encoding = self._encodings.get(model)
+        if encoding is None:
+            with self._lock:
+                encoding = self._encodings.get(model)
+                if encoding is None:
+                    encoding = tiktoken.encoding_for_model(model)
+                    self._encodings[model] = encoding
+        return encoding
+
+    def calculate_token_count(self, text: str, model: str = DEFAULT_TOKEN_COUNT_MODEL) -> int:
+        """計算傳入文本的token數，可直接作為文本分割器的length_function使用"""
+        return self.calculate_token_counts([text], model)[0]
+
+    def calculate_token_counts(self, texts: list[str], model: str = DEFAULT_TOKEN_COUNT_MODEL) -> list[int]:
+        """批次計算文本列表的token數，已經計算過的文本直接從快取中獲取，其餘文本較多時使用encode_batch並行編碼"""
+        # 1.計算每條文本的快取鍵並提取已經快取的結果
+        encoding = self.get_encoding(model)
+        keys = [(encoding.name, blake2b(text.encode("utf-8"), digest_size=16).digest()) for text in texts]
+        token_counts = [self._cache.get(key) for key in keys]
+
+        # 2.對未命中快取的文本去重後編碼，分割器逐條計算長度時只有單條文本，直接encode避免每次都創建執行緒池
+        missing = {key: text for key, text, token_count in zip(keys, texts, token_counts) if token_count is None}
+        if len(missing) > 0:
+            if len(missing) >= TOKEN_COUNT_BATCH_THRESHOLD:
+                encoded = encoding.encode_batch(list(missing.values()), disallowed_special=())
+            else:
+                encoded = [encoding.encode(text, disallowed_special=()) for text in missing.values()]
+            missing_counts = {key: len(tokens) for key, tokens in zip(missing.keys(), encoded)}
+            for key, token_count in missing_counts.items():
+                self._cache.set(key, token_count)
+            token_counts = [
+                token_count if token_count is not None else missing_counts[key]
+                for key, token_count in zip(keys, token_counts)
+            ]
+
+        return token_counts
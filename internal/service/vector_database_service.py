@@ -5,64 +5,492 @@
 @Author : zsting29@gmail.com
 @File   : vector_database_service.py
 """
+import json
+import logging
 import os
+from dataclasses import dataclass
+from typing import Any, Optional
+from uuid import UUID
 
-import weaviate
-from injector import inject
-from langchain_core.vectorstores import VectorStoreRetriever
+from injector import inject, singleton
+from langchain_core.documents import Document as LCDocument
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore, VectorStoreRetriever
 from langchain_weaviate import WeaviateVectorStore
+from redis import Redis
+from weaviate.classes.data import DataObject
+from weaviate.classes.query import Filter
+from weaviate.classes.tenants import Tenant
 from weaviate.client import WeaviateClient
 from weaviate.collections import Collection
 
+from internal.entity.cache_entity import (
+    VECTOR_DATABASE_ACTIVE_COLLECTION,
+    VECTOR_DATABASE_MIGRATING_COLLECTION,
+    VECTOR_DATABASE_MIGRATING_DELETIONS,
+)
+from internal.core.vector_store import AdaptiveBatchWriter, LocalVectorStore
+from internal.core.vector_store.adaptive_batch_writer import BatchCallback
+from internal.entity.dataset_entity import (
+    SEGMENT_DELETE_BATCH_SIZE,
+    VECTOR_BATCH_SIZE,
+    VECTOR_BATCH_MIN_SIZE,
+    VECTOR_BATCH_MAX_SIZE,
+    VECTOR_BATCH_TARGET_LATENCY,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_CONCURRENCY,
+    VectorStoreType,
+    DEFAULT_LOCAL_VECTOR_STORE_PATH,
+)
+from internal.entity.embeddings_entity import DEFAULT_EMBEDDING_MODEL, DEFAULT_EMBEDDING_DIMENSION
+from pkg.weaviate import FlaskWeaviate
 from .embeddings_service import EmbeddingsService
 
-# 向量資料庫的集合名字
+# 向量資料庫的集合名字，未進行過遷移時使用該集合
 COLLECTION_NAME = "Dataset"
 
+# 向量資料庫中儲存文本的屬性名字
+TEXT_KEY = "text"
+
+
+@dataclass
+class CollectionConfig:
+    """向量資料庫集合配置，記錄集合名字、寫入該集合時使用的文本嵌入模型與維度，以及是否按帳號劃分租戶"""
+    name: str
+    model: str
+    dimension: int
+    multi_tenancy: bool = False  # 啟用後每個帳號的數據儲存在獨立的租戶(分片)中，租戶名字為帳號id
+    cursor: Optional[list[str]] = None  # 遷移游標(最後遷移片段的創建時間與id)，僅遷移中的集合使用
+    started_at: Optional[str] = None  # 遷移開始時間，僅遷移中的集合使用
+
+    def to_json(self) -> str:
+        return json.dumps(self.__dict__)
+
+    @classmethod
+    def from_json(cls, value: Optional[bytes]) -> Optional["CollectionConfig"]:
+        return cls(**json.loads(value)) if value is not None else None
+
+
+@dataclass
+class CollectionTarget:
+    """向量資料庫寫入目標，涵蓋集合配置、集合(多租戶時已綁定租戶)以及對應的文本嵌入模型"""
+    config: CollectionConfig
+    collection: Collection
+    embeddings: Embeddings
+
 
 @inject
+@singleton
 class VectorDatabaseService:
-    """向量數據庫服務"""
-    # weaviate: FlaskWeaviate
-    client: WeaviateClient
-    vector_store: WeaviateVectorStore
+    """
+    向量數據庫服務，透過VECTOR_STORE_TYPE環境變數選擇後端：
+    weaviate(預設)：當前啟用的集合及其嵌入模型記錄在Redis中，檢索只使用啟用中的集合，
+    遷移期間所有寫入(新增、更新、刪除)會同時寫入啟用中與遷移中的集合，集合啟用多租戶時讀寫會路由到帳號對應的租戶，
+    local：每個知識庫一個本地記憶體映射向量索引，無需外部服務，
+    整個行程共享同一個服務實例與Weaviate客戶端，客戶端在首次使用時才建立連接
+    """
+    weaviate: FlaskWeaviate
+    redis_client: Redis
     embeddings_service: EmbeddingsService
+    vector_store_type: str
 
-    def __init__(self, embeddings_service: EmbeddingsService):
-        # 賦值embeddings_service
+    def __init__(self, weaviate: FlaskWeaviate, embeddings_service: EmbeddingsService, redis_client: Redis):
+        # 賦值weaviate、embeddings_service與redis_client，並讀取部署配置的向量資料庫後端
+        self.weaviate = weaviate
         self.embeddings_service = embeddings_service
+        self.redis_client = redis_client
+        self.vector_store_type = VectorStoreType(os.getenv("VECTOR_STORE_TYPE") or VectorStoreType.WEAVIATE)
+        self._vector_stores: dict[tuple[str, int], WeaviateVectorStore] = {}
+        self._tenants: set[tuple[str, str]] = set()
+        self._local_vector_store: Optional[LocalVectorStore] = None
 
-        # create and connect Weaviate Vector DB
-        # cluster_url = os.getenv("WEAVIATE_URL")
-        # api_key = os.getenv("WEAVIATE_API_KEY")
-        # print(f"Connecting to Weaviate at {cluster_url} with API key {api_key[:10]}...")  # 仅打印前 10 个字符的 API 密钥
-
-        # local
-        self.client = weaviate.connect_to_local(
-            host=os.getenv("WEAVIATE_HOST"),
-            port=int(os.getenv("WEAVIATE_PORT"))
-        )
-
-        # # 雲的
-        # self.client = weaviate.connect_to_weaviate_cloud(
-        #     cluster_url=os.getenv("WEAVIATE_URL"),
-        #     auth_credentials=Auth.api_key(os.getenv("WEAVIATE_API_KEY"))
-        # )
-
-        # create LangChain Vector DB
-        self.vector_store = WeaviateVectorStore(
-            client=self.client,
-            index_name=COLLECTION_NAME,
-            text_key="text",
-            embedding=self.embeddings_service.embeddings
-            # 使用本地 -> 非本地 OpenAIEmbeddings(model="text-embedding-3-small")
-        )
+    @property
+    def client(self) -> WeaviateClient:
+        """獲取行程內共享的Weaviate客戶端"""
+        return self.weaviate.client
+
+    @property
+    def multi_tenancy(self) -> bool:
+        """部署配置是否啟用多租戶集合"""
+        return self.weaviate.multi_tenancy
+
+    @property
+    def is_local(self) -> bool:
+        """是否使用本地向量索引後端"""
+        return self.vector_store_type == VectorStoreType.LOCAL
+
+    @property
+    def local_vector_store(self) -> LocalVectorStore:
+        """獲取本地向量索引，查詢向量使用部署配置的嵌入模型生成"""
+        if self._local_vector_store is None:
+            self._local_vector_store = LocalVectorStore(
+                root_path=os.getenv("LOCAL_VECTOR_STORE_PATH") or DEFAULT_LOCAL_VECTOR_STORE_PATH,
+                embedding=self.embeddings_service.embeddings,
+                text_key=TEXT_KEY,
+            )
+        return self._local_vector_store
+
+    def get_active_config(self) -> CollectionConfig:
+        """獲取當前啟用中的集合配置，未遷移過時為預設集合+預設嵌入模型"""
+        config = CollectionConfig.from_json(self.redis_client.get(VECTOR_DATABASE_ACTIVE_COLLECTION))
+        if config is None:
+            config = CollectionConfig(
+                name=COLLECTION_NAME,
+                model=DEFAULT_EMBEDDING_MODEL,
+                dimension=DEFAULT_EMBEDDING_DIMENSION,
+            )
+        return config
+
+    def get_migrating_config(self) -> Optional[CollectionConfig]:
+        """獲取遷移中的集合配置，不存在遷移時返回None"""
+        return CollectionConfig.from_json(self.redis_client.get(VECTOR_DATABASE_MIGRATING_COLLECTION))
+
+    @property
+    def vector_store(self) -> VectorStore:
+        """
+        獲取LangChain向量資料庫，本地後端返回本地向量索引(檢索時傳遞dataset_ids)，
+        Weaviate後端返回啟用中集合對應的向量資料庫，集合啟用多租戶時檢索需要傳遞get_tenant()返回的租戶名字
+        """
+        if self.is_local:
+            return self.local_vector_store
+
+        config = self.get_active_config()
+        client = self.client
+        key = (config.name, id(client))
+        vector_store = self._vector_stores.get(key)
+        if vector_store is None:
+            # create LangChain Vector DB
+            vector_store = WeaviateVectorStore(
+                client=client,
+                index_name=config.name,
+                text_key=TEXT_KEY,
+                embedding=self.embeddings_service.get_embeddings(config.model, config.dimension),
+                use_multi_tenancy=config.multi_tenancy,
+                # 使用本地 -> 非本地 OpenAIEmbeddings(model="text-embedding-3-small")
+            )
+            self._vector_stores[key] = vector_store
+        return vector_store
+
+    def get_tenant(self, account_id: UUID) -> Optional[str]:
+        """獲取帳號在啟用中集合的租戶名字，本地後端或集合未啟用多租戶時返回None，只讀取不創建租戶"""
+        if self.is_local:
+            return None
+        config = self.get_active_config()
+        if not config.multi_tenancy:
+            return None
+        return str(account_id)
+
+    def has_tenant(self, tenant: str) -> bool:
+        """判斷啟用中的集合是否存在指定租戶，不存在表示帳號尚未寫入過任何向量，檢索時應直接返回空結果"""
+        return self._has_tenant(self.client.collections.get(self.get_active_config().name), tenant)
 
     def get_retriever(self) -> VectorStoreRetriever:
         """獲取檢索器"""
         return self.vector_store.as_retriever()
 
-    @property
-    def collection(self) -> Collection:
-        # return self.weaviate.client.collections.get(COLLECTION_NAME)
-        return self.client.collections.get(COLLECTION_NAME)
+    def get_collection(self, config: CollectionConfig, account_id: Optional[UUID] = None) -> Collection:
+        """獲取集合配置對應的寫入集合，集合啟用多租戶時返回綁定帳號租戶的集合，租戶不存在時自動創建"""
+        collection = self.client.collections.get(config.name)
+        if not config.multi_tenancy:
+            return collection
+        tenant = str(account_id)
+        self._ensure_tenant(collection, tenant)
+        return collection.with_tenant(tenant)
+
+    def find_collection(self, config: CollectionConfig, account_id: Optional[UUID] = None) -> Optional[Collection]:
+        """獲取集合配置對應的集合用於讀取、更新或刪除已有記錄，多租戶集合只查詢不創建租戶，租戶不存在時返回None"""
+        collection = self.client.collections.get(config.name)
+        if not config.multi_tenancy:
+            return collection
+        tenant = str(account_id)
+        return collection.with_tenant(tenant) if self._has_tenant(collection, tenant) else None
+
+    def get_collections(self, account_id: UUID) -> list[Collection]:
+        """獲取帳號所有存在記錄的集合，遷移期間涵蓋啟用中與遷移中的集合，不存在帳號租戶的集合會被跳過"""
+        return list(filter(None, [
+            self.find_collection(config, account_id)
+            for config in filter(None, [self.get_active_config(), self.get_migrating_config()])
+        ]))
+
+    def get_write_targets(self, account_id: UUID, cache_backed: bool = True) -> list[CollectionTarget]:
+        """獲取帳號所有需要寫入的目標，啟用中的集合排在第一位，cache_backed為True時使用帶快取的文件嵌入模型"""
+        configs = [self.get_active_config()]
+        migrating_config = self.get_migrating_config()
+        if migrating_config is not None:
+            configs.append(migrating_config)
+
+        targets = []
+        for config in configs:
+            embeddings = (
+                self.embeddings_service.get_cache_backed_embeddings(config.model, config.dimension)
+                if cache_backed else self.embeddings_service.get_embeddings(config.model, config.dimension)
+            )
+            targets.append(CollectionTarget(
+                config=config,
+                collection=self.get_collection(config, account_id),
+                embeddings=embeddings,
+            ))
+        return targets
+
+    def write_documents(
+            self,
+            account_id: UUID,
+            lc_documents: list[LCDocument],
+            ids: list[str],
+            on_batch: BatchCallback,
+    ) -> None:
+        """
+        批次向量化並寫入大量文件片段，每寫入一批就調用on_batch回報結果(同時作為構建斷點)，
+        Weaviate遷移期間還需要寫入遷移中的集合，該集合的寫入失敗只記錄日誌，不影響片段狀態，由遷移的補寫階段重新寫入
+        """
+        # 1.本地後端按向量化批次大小寫入，向量化或寫入失敗時整個批次都回報為失敗
+        if self.is_local:
+            embeddings = self.embeddings_service.cache_backed_embeddings
+            for i in range(0, len(lc_documents), EMBEDDING_BATCH_SIZE):
+                batch_documents, batch_ids = lc_documents[i:i + EMBEDDING_BATCH_SIZE], ids[i:i + EMBEDDING_BATCH_SIZE]
+                try:
+                    texts = [lc_document.page_content for lc_document in batch_documents]
+                    self.local_vector_store.add_embeddings(
+                        batch_ids,
+                        embeddings.embed_documents(texts),
+                        texts,
+                        [lc_document.metadata for lc_document in batch_documents],
+                    )
+                except Exception as e:
+                    on_batch([], {id: str(e) for id in batch_ids})
+                    continue
+                on_batch(batch_ids, {})
+            return
+
+        # 2.構建文件耗時較長，寫入前重新確認帳號的租戶存在(集合可能已被遷移任務刪除並重建)
+        for config in filter(None, [self.get_active_config(), self.get_migrating_config()]):
+            if config.multi_tenancy:
+                self.forget_tenants(config.name, str(account_id))
+
+        # 3.Weaviate後端使用自適應批次寫入器，向量化與寫入重疊執行，租戶不存在導致的寫入失敗會清除租戶快取
+        for idx, target in enumerate(self.get_write_targets(account_id)):
+            writer = AdaptiveBatchWriter(
+                collection=target.collection,
+                embeddings=target.embeddings,
+                text_key=TEXT_KEY,
+                batch_size=VECTOR_BATCH_SIZE,
+                min_batch_size=VECTOR_BATCH_MIN_SIZE,
+                max_batch_size=VECTOR_BATCH_MAX_SIZE,
+                target_latency=VECTOR_BATCH_TARGET_LATENCY,
+                embedding_batch_size=EMBEDDING_BATCH_SIZE,
+                embedding_concurrency=EMBEDDING_BATCH_CONCURRENCY,
+            )
+            callback = on_batch if idx == 0 else self._log_migrating_errors
+
+            def _on_batch(node_ids: list[str], errors: dict[str, str], config=target.config, callback=callback) -> None:
+                if config.multi_tenancy and any(self._is_tenant_missing(error) for error in errors.values()):
+                    self.forget_tenants(config.name, str(account_id))
+                callback(node_ids, errors)
+
+            writer.write(lc_documents, ids, _on_batch)
+
+    @classmethod
+    def _log_migrating_errors(cls, node_ids: list[str], errors: dict[str, str]) -> None:
+        """記錄遷移中集合的寫入失敗，這些片段在遷移完成前由補寫階段(更新時間晚於遷移開始時間)重新寫入"""
+        if len(errors) > 0:
+            logging.warning(
+                "寫入遷移中的向量集合失敗, 失敗片段數: %(count)s, 錯誤資訊: %(error)s",
+                {"count": len(errors), "error": next(iter(errors.values()))},
+            )
+
+    def add_documents(self, account_id: UUID, lc_documents: list[LCDocument], ids: list[str]) -> None:
+        """將帳號的LangChain文件列表向量化後寫入所有目標集合，每個集合使用各自的嵌入模型"""
+        if self.is_local:
+            texts = [lc_document.page_content for lc_document in lc_documents]
+            self.local_vector_store.add_embeddings(
+                ids,
+                self.embeddings_service.cache_backed_embeddings.embed_documents(texts),
+                texts,
+                [lc_document.metadata for lc_document in lc_documents],
+            )
+            return
+
+        for target in self.get_write_targets(account_id):
+            vectors = target.embeddings.embed_documents([lc_document.page_content for lc_document in lc_documents])
+            result = self.insert_many(target.config, account_id, [
+                DataObject(
+                    uuid=id,
+                    properties={TEXT_KEY: lc_document.page_content, **lc_document.metadata},
+                    vector=vector,
+                ) for id, lc_document, vector in zip(ids, lc_documents, vectors)
+            ])
+            if len(result.errors) > 0:
+                raise RuntimeError(next(iter(result.errors.values())).message)
+
+    def insert_many(self, config: CollectionConfig, account_id: Optional[UUID], objects: list[DataObject]) -> Any:
+        """
+        將物件寫入集合配置對應的集合(多租戶時寫入帳號租戶)並返回寫入結果，
+        因租戶不存在而寫入失敗時(集合被刪除並重建)清除租戶快取、重新創建租戶後重試一次
+        """
+        result = self.get_collection(config, account_id).data.insert_many(objects)
+        if config.multi_tenancy and any(self._is_tenant_missing(error.message) for error in result.errors.values()):
+            self.forget_tenants(config.name, str(account_id))
+            result = self.get_collection(config, account_id).data.insert_many(objects)
+        return result
+
+    def update_properties_many(
+            self,
+            account_id: UUID,
+            dataset_id: UUID,
+            node_ids: list[str],
+            properties: dict[str, Any],
+    ) -> dict[str, str]:
+        """
+        批次將所有目標集合中帳號指定記錄的屬性更新為相同的值，返回更新失敗的節點id->錯誤資訊，
+        本地向量索引一次提交所有記錄(只追加一條操作日誌)
+        """
+        errors: dict[str, str] = {}
+        if len(node_ids) == 0:
+            return errors
+        if self.is_local:
+            try:
+                self.local_vector_store.update_metadata(dataset_id, node_ids, properties)
+            except Exception as e:
+                errors = {node_id: str(e) for node_id in node_ids}
+            return errors
+
+        for collection in self.get_collections(account_id):
+            for node_id in node_ids:
+                if node_id in errors:
+                    continue
+                try:
+                    collection.data.update(uuid=node_id, properties=properties)
+                except Exception as e:
+                    errors[node_id] = str(e)
+        return errors
+
+    def update_text(self, account_id: UUID, dataset_id: UUID, node_id: str, text: str) -> None:
+        """更新所有目標集合中帳號指定記錄的文本，並使用各集合對應的嵌入模型重新生成向量"""
+        if self.is_local:
+            vector = self.embeddings_service.cache_backed_embeddings.embed_documents([text])[0]
+            self.local_vector_store.update_text(dataset_id, node_id, text, vector)
+            return
+
+        for target in self.get_write_targets(account_id):
+            target.collection.data.update(
+                uuid=node_id,
+                properties={TEXT_KEY: text},
+                vector=target.embeddings.embed_documents([text])[0],
+            )
+
+    def delete_by_ids(self, account_id: UUID, dataset_id: UUID, node_ids: list[str]) -> None:
+        """分批刪除所有目標集合中帳號的指定記錄"""
+        if self.is_local:
+            self.local_vector_store.delete(node_ids, dataset_id=dataset_id)
+            return
+
+        self._record_migrating_deletions(account_id, "id", node_ids)
+        for collection in self.get_collections(account_id):
+            self._delete_by_ids(collection, node_ids)
+
+    def delete_by_document_id(self, account_id: Optional[UUID], dataset_id: UUID, document_id: UUID) -> None:
+        """刪除文件的所有向量記錄"""
+        if self.is_local:
+            self.local_vector_store.delete_by_document_id(dataset_id, document_id)
+            return
+        self._record_migrating_deletions(account_id, "document_id", [str(document_id)])
+        self._delete_many(account_id, Filter.by_property("document_id").equal(str(document_id)))
+
+    def delete_by_dataset_id(self, account_id: Optional[UUID], dataset_id: UUID) -> None:
+        """刪除知識庫的所有向量記錄"""
+        if self.is_local:
+            self.local_vector_store.delete_dataset(dataset_id)
+            return
+        self._record_migrating_deletions(account_id, "dataset_id", [str(dataset_id)])
+        self._delete_many(account_id, Filter.by_property("dataset_id").equal(str(dataset_id)))
+
+    def replay_migrating_deletions(self, config: CollectionConfig) -> None:
+        """
+        在遷移中的集合重放遷移期間記錄的刪除操作，遷移任務複製完所有片段後、切換集合前調用，
+        避免刪除發生在遷移任務讀取片段與寫入目標集合之間時，已刪除的記錄被寫回目標集合
+        """
+        # 1.讀取並按(刪除條件, 帳號)分組
+        records = self.redis_client.smembers(VECTOR_DATABASE_MIGRATING_DELETIONS)
+        if len(records) == 0:
+            return
+        deletions: dict[tuple[str, Optional[str]], list[str]] = {}
+        for record in records:
+            key, value, account_id = json.loads(record)
+            deletions.setdefault((key, account_id), []).append(value)
+
+        # 2.在目標集合中刪除，帳號在目標集合中沒有租戶時無需處理
+        for (key, account_id), values in deletions.items():
+            for collection in self._find_collections(config, UUID(account_id) if account_id else None):
+                if key == "id":
+                    self._delete_by_ids(collection, values)
+                    continue
+                for value in values:
+                    collection.data.delete_many(where=Filter.by_property(key).equal(value))
+
+        # 3.只移除已經重放的記錄，重放期間新增的記錄留待下次處理
+        self.redis_client.srem(VECTOR_DATABASE_MIGRATING_DELETIONS, *records)
+
+    def _record_migrating_deletions(self, account_id: Optional[UUID], key: str, values: list[str]) -> None:
+        """遷移期間在刪除向量之前記錄刪除操作(刪除條件、值與帳號)，由遷移任務在切換集合前重放"""
+        if len(values) == 0 or self.get_migrating_config() is None:
+            return
+        self.redis_client.sadd(VECTOR_DATABASE_MIGRATING_DELETIONS, *[
+            json.dumps([key, value, str(account_id) if account_id else None]) for value in values
+        ])
+
+    @classmethod
+    def _delete_by_ids(cls, collection: Collection, node_ids: list[str]) -> None:
+        """分批刪除集合中的指定記錄"""
+        for i in range(0, len(node_ids), SEGMENT_DELETE_BATCH_SIZE):
+            collection.data.delete_many(
+                where=Filter.by_id().contains_any(node_ids[i:i + SEGMENT_DELETE_BATCH_SIZE]),
+            )
+
+    def _find_collections(self, config: CollectionConfig, account_id: Optional[UUID]) -> list[Collection]:
+        """獲取集合配置中需要刪除記錄的集合，多租戶集合未傳遞帳號id時返回所有租戶"""
+        collection = self.client.collections.get(config.name)
+        if not config.multi_tenancy:
+            return [collection]
+        if account_id is not None:
+            return list(filter(None, [self.find_collection(config, account_id)]))
+        return [collection.with_tenant(tenant) for tenant in collection.tenants.get().keys()]
+
+    def _delete_many(self, account_id: Optional[UUID], where: Any) -> None:
+        """根據過濾條件刪除所有目標集合中的記錄，多租戶集合未傳遞帳號id時會在所有租戶中刪除"""
+        for config in filter(None, [self.get_active_config(), self.get_migrating_config()]):
+            for collection in self._find_collections(config, account_id):
+                collection.data.delete_many(where=where)
+
+    def forget_tenants(self, collection_name: str, tenant: Optional[str] = None) -> None:
+        """清除行程內記錄的集合租戶(未傳遞租戶時清除該集合的所有租戶)，集合被刪除或重建後調用"""
+        self._tenants = {
+            key for key in self._tenants
+            if key[0] != collection_name or (tenant is not None and key[1] != tenant)
+        }
+
+    @classmethod
+    def _is_tenant_missing(cls, message: str) -> bool:
+        """判斷寫入錯誤是否由租戶不存在導致"""
+        message = message.lower()
+        return "tenant" in message and ("not found" in message or "not exist" in message)
+
+    def _has_tenant(self, collection: Collection, tenant: str) -> bool:
+        """判斷集合中是否存在指定租戶，已確認存在的租戶會記錄在行程內，無需重複檢查"""
+        key = (collection.name, tenant)
+        if key in self._tenants:
+            return True
+        if not collection.tenants.exists(tenant):
+            return False
+        self._tenants.add(key)
+        return True
+
+    def _ensure_tenant(self, collection: Collection, tenant: str) -> None:
+        """確保集合中存在指定租戶，已確認過的租戶會記錄在行程內，無需重複檢查"""
+        if not self._has_tenant(collection, tenant):
+            try:
+                collection.tenants.create([Tenant(name=tenant)])
+            except Exception:
+                # 其他行程可能已經同時創建了該租戶
+                if not collection.tenants.exists(tenant):
+                    raise
+        self._tenants.add((collection.name, tenant))
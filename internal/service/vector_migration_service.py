@@ -0,0 +1,286 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午9:30
+@Author : zsting29@gmail.com
+@File   : vector_migration_service.py
+"""
+import logging
+import re
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Optional
+from uuid import UUID
+
+from injector import inject
+from redis import Redis
+from redis.exceptions import LockError
+from sqlalchemy import or_, tuple_
+from weaviate.classes.config import Configure, Property
+from weaviate.classes.data import DataObject
+from weaviate.classes.query import Filter
+
+from internal.entity.cache_entity import (
+    LOCK_EXPIRE_TIME,
+    LOCK_VECTOR_DATABASE_MIGRATE,
+    VECTOR_DATABASE_ACTIVE_COLLECTION,
+    VECTOR_DATABASE_MIGRATING_COLLECTION,
+    VECTOR_DATABASE_MIGRATING_DELETIONS,
+)
+from internal.entity.dataset_entity import DocumentStatus, SegmentStatus
+from internal.entity.embeddings_entity import VECTOR_MIGRATION_BATCH_SIZE, VECTOR_MIGRATION_BATCH_INTERVAL
+from internal.model import Document, Segment
+from pkg.sqlalchemy import SQLAlchemy
+from .base_service import BaseService
+from .embeddings_service import EmbeddingsService
+from .vector_database_service import VectorDatabaseService, CollectionConfig, COLLECTION_NAME, TEXT_KEY
+
+
+@inject
+@dataclass
+class VectorMigrationService(BaseService):
+    """
+    向量資料庫遷移服務，部署配置的嵌入模型、維度或多租戶選項與啟用中的集合不一致時，將所有片段節流地遷移到新集合，
+    遷移期間的寫入由VectorDatabaseService同時寫入新舊集合，遷移完成後原子切換啟用中的集合
+    """
+    db: SQLAlchemy
+    redis_client: Redis
+    embeddings_service: EmbeddingsService
+    vector_database_service: VectorDatabaseService
+
+    def migrate(self) -> None:
+        """執行(或繼續)向量資料庫遷移，游標保存在Redis中，任務中斷後再次執行會從上次的位置繼續"""
+        # 1.本地向量索引不涉及集合切換，同一時間只允許一個遷移任務執行
+        if self.vector_database_service.is_local:
+            return
+        lock = self.redis_client.lock(LOCK_VECTOR_DATABASE_MIGRATE, timeout=LOCK_EXPIRE_TIME)
+        if not lock.acquire(blocking=False):
+            return
+
+        try:
+            # 2.檢測是否需要遷移，需要時獲取遷移中的集合配置
+            config = self._prepare_migration()
+            if config is None:
+                return
+
+            # 3.按(創建時間, id)游標分批複製所有片段，每批之間休眠以限制對線上服務的影響
+            while True:
+                segments = self._get_segments(config.cursor)
+                if len(segments) == 0:
+                    break
+                self._write_segments(config, segments)
+                config.cursor = [segments[-1]["created_at"].isoformat(), str(segments[-1]["id"])]
+                self.redis_client.set(VECTOR_DATABASE_MIGRATING_COLLECTION, config.to_json())
+                lock.reacquire()
+                time.sleep(VECTOR_MIGRATION_BATCH_INTERVAL)
+
+            # 4.仍有文件在構建時暫不切換，等待下次任務再檢測
+            if self._has_building_documents():
+                logging.info("向量資料庫遷移已完成複製, 等待文件構建完成後切換集合")
+                return
+
+            # 5.重新寫入遷移開始後發生變化的片段並重放遷移期間的刪除，確保兩個集合數據一致，然後原子切換啟用中的集合
+            self._reconcile(config, lock)
+            self.vector_database_service.replay_migrating_deletions(config)
+            self._switch(config)
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                pass
+
+    def _prepare_migration(self) -> Optional[CollectionConfig]:
+        """對比部署配置與啟用中的集合，返回遷移中的集合配置，無需遷移時返回None"""
+        # 1.獲取部署配置的模型、維度與是否啟用多租戶，以及啟用中/遷移中的集合配置
+        spec = (
+            self.embeddings_service.model,
+            self.embeddings_service.dimension,
+            self.vector_database_service.multi_tenancy,
+        )
+        active_config = self.vector_database_service.get_active_config()
+        migrating_config = self.vector_database_service.get_migrating_config()
+
+        # 2.已經存在相同配置的遷移時直接繼續
+        if migrating_config is not None and self._get_spec(migrating_config) == spec:
+            return migrating_config
+
+        # 3.部署配置與啟用中的集合一致時無需遷移，並取消已經過時的遷移
+        if self._get_spec(active_config) == spec:
+            if migrating_config is not None:
+                logging.warning("部署配置已恢復, 取消向量資料庫遷移: %(name)s", {"name": migrating_config.name})
+                self.redis_client.delete(VECTOR_DATABASE_MIGRATING_COLLECTION, VECTOR_DATABASE_MIGRATING_DELETIONS)
+            return None
+
+        # 4.按啟用中集合的屬性結構重新創建目標集合
+        model, dimension, multi_tenancy = spec
+        config = CollectionConfig(
+            name=f"{COLLECTION_NAME}_{re.sub(r'[^0-9A-Za-z]+', '_', model)}_{dimension}{'_mt' if multi_tenancy else ''}",
+            model=model,
+            dimension=dimension,
+            multi_tenancy=multi_tenancy,
+            started_at=datetime.now().isoformat(),
+        )
+        client = self.vector_database_service.client
+        source_exists = client.collections.exists(active_config.name)
+        if client.collections.exists(config.name):
+            client.collections.delete(config.name)
+        self.vector_database_service.forget_tenants(config.name)
+        source_properties = client.collections.get(active_config.name).config.get().properties if source_exists else []
+        client.collections.create(
+            config.name,
+            vectorizer_config=Configure.Vectorizer.none(),
+            multi_tenancy_config=Configure.multi_tenancy(enabled=multi_tenancy),
+            properties=[
+                Property(name=property.name, data_type=property.data_type, tokenization=property.tokenization)
+                for property in source_properties
+            ],
+        )
+
+        # 5.啟用中的集合不存在(尚無任何數據)時直接切換，無需遷移
+        if not source_exists:
+            self._switch(config)
+            return None
+
+        # 6.記錄遷移中的集合配置，此後的寫入會同時寫入兩個集合，並清除過時遷移遺留的刪除記錄
+        pipeline = self.redis_client.pipeline(transaction=True)
+        pipeline.delete(VECTOR_DATABASE_MIGRATING_DELETIONS)
+        pipeline.set(VECTOR_DATABASE_MIGRATING_COLLECTION, config.to_json())
+        pipeline.execute()
+        logging.info(
+            "開始向量資料庫遷移, 目標集合: %(name)s, 模型: %(model)s, 維度: %(dimension)s, 多租戶: %(multi_tenancy)s",
+            {"name": config.name, "model": model, "dimension": dimension, "multi_tenancy": multi_tenancy},
+        )
+
+        return config
+
+    @classmethod
+    def _get_spec(cls, config: CollectionConfig) -> tuple[str, int, bool]:
+        """獲取集合配置中決定是否需要遷移的部分：模型、維度與是否啟用多租戶"""
+        return config.model, config.dimension, config.multi_tenancy
+
+    def _get_segments(self, cursor: Optional[list[str]], *filters: Any) -> list[dict[str, Any]]:
+        """按(創建時間, id)順序獲取游標之後的一批已完成構建的片段，以及寫入向量資料庫所需的屬性"""
+        query = self.db.session.query(Segment).with_entities(
+            Segment.id,
+            Segment.account_id,
+            Segment.dataset_id,
+            Segment.document_id,
+            Segment.node_id,
+            Segment.content,
+            Segment.enabled,
+            Segment.created_at,
+            Document.enabled.label("document_enabled"),
+        ).join(Document, Document.id == Segment.document_id).filter(
+            Segment.status == SegmentStatus.COMPLETED,
+            *filters,
+        )
+        if cursor is not None:
+            query = query.filter(
+                tuple_(Segment.created_at, Segment.id) > (datetime.fromisoformat(cursor[0]), cursor[1]),
+            )
+        return [
+            segment._asdict()
+            for segment in query.order_by(Segment.created_at, Segment.id).limit(VECTOR_MIGRATION_BATCH_SIZE).all()
+        ]
+
+    def _write_segments(self, config: CollectionConfig, segments: list[dict[str, Any]]) -> None:
+        """
+        將片段寫入目標集合(多租戶時按帳號寫入對應租戶)，嵌入模型與維度未變更時直接複製啟用中集合的向量，
+        否則使用目標集合的嵌入模型重新向量化，存在寫入失敗時拋出異常，游標不會前進
+        """
+        # 1.按帳號分組，多租戶集合的每個帳號對應一個租戶
+        segments_by_account = defaultdict(list)
+        for segment in segments:
+            segments_by_account[segment["account_id"]].append(segment)
+
+        active_config = self.vector_database_service.get_active_config()
+        copy_vectors = (active_config.model, active_config.dimension) == (config.model, config.dimension)
+        for account_id, account_segments in segments_by_account.items():
+            # 2.獲取可以直接複製的向量，啟用中集合不存在的記錄(如構建中的片段)仍需重新向量化
+            node_ids = [str(segment["node_id"]) for segment in account_segments]
+            vectors = self._get_vectors(active_config, account_id, node_ids) if copy_vectors else {}
+            missing_segments = [segment for segment in account_segments if str(segment["node_id"]) not in vectors]
+            if len(missing_segments) > 0:
+                embeddings = self.embeddings_service.get_cache_backed_embeddings(config.model, config.dimension)
+                vectors.update(zip(
+                    [str(segment["node_id"]) for segment in missing_segments],
+                    embeddings.embed_documents([segment["content"] for segment in missing_segments]),
+                ))
+
+            # 3.寫入目標集合，屬性與構建文件時寫入的元數據保持一致
+            result = self.vector_database_service.insert_many(config, account_id, [
+                DataObject(
+                    uuid=str(segment["node_id"]),
+                    properties={
+                        TEXT_KEY: segment["content"],
+                        "account_id": str(segment["account_id"]),
+                        "dataset_id": str(segment["dataset_id"]),
+                        "document_id": str(segment["document_id"]),
+                        "segment_id": str(segment["id"]),
+                        "node_id": str(segment["node_id"]),
+                        "document_enabled": segment["document_enabled"],
+                        "segment_enabled": segment["enabled"],
+                    },
+                    vector=vectors[str(segment["node_id"])],
+                ) for segment in account_segments
+            ])
+            if len(result.errors) > 0:
+                raise RuntimeError(
+                    f"向量資料庫遷移寫入失敗, 失敗片段數: {len(result.errors)}, "
+                    f"錯誤資訊: {next(iter(result.errors.values())).message}"
+                )
+
+    def _get_vectors(self, config: CollectionConfig, account_id: UUID, node_ids: list[str]) -> dict[str, list[float]]:
+        """從集合中讀取帳號指定記錄的向量，返回節點id->向量，帳號在該集合中沒有租戶時返回空字典"""
+        collection = self.vector_database_service.find_collection(config, account_id)
+        if collection is None:
+            return {}
+        result = collection.query.fetch_objects(
+            filters=Filter.by_id().contains_any(node_ids),
+            include_vector=True,
+            limit=len(node_ids),
+        )
+        return {str(obj.uuid): obj.vector["default"] for obj in result.objects if "default" in obj.vector}
+
+    def _has_building_documents(self) -> bool:
+        """檢測是否仍有文件處於構建中的狀態"""
+        return self.db.session.query(Document.id).filter(
+            Document.status.in_([
+                DocumentStatus.WAITING,
+                DocumentStatus.PARSING,
+                DocumentStatus.SPLITTING,
+                DocumentStatus.INDEXING,
+            ]),
+        ).first() is not None
+
+    def _reconcile(self, config: CollectionConfig, lock: Any) -> None:
+        """重新寫入遷移開始後片段或所屬文件發生過更新的片段"""
+        started_at = datetime.fromisoformat(config.started_at)
+        changed_document_ids = self.db.session.query(Document.id).filter(Document.updated_at >= started_at)
+        cursor = None
+        while True:
+            segments = self._get_segments(
+                cursor,
+                or_(Segment.updated_at >= started_at, Segment.document_id.in_(changed_document_ids)),
+            )
+            if len(segments) == 0:
+                return
+            self._write_segments(config, segments)
+            cursor = [segments[-1]["created_at"].isoformat(), str(segments[-1]["id"])]
+            lock.reacquire()
+
+    def _switch(self, config: CollectionConfig) -> None:
+        """在同一個Redis事務內切換啟用中的集合並移除遷移中的集合，所有行程的下一次讀寫即使用新集合"""
+        active_config = CollectionConfig(
+            name=config.name,
+            model=config.model,
+            dimension=config.dimension,
+            multi_tenancy=config.multi_tenancy,
+        )
+        pipeline = self.redis_client.pipeline(transaction=True)
+        pipeline.set(VECTOR_DATABASE_ACTIVE_COLLECTION, active_config.to_json())
+        pipeline.delete(VECTOR_DATABASE_MIGRATING_COLLECTION, VECTOR_DATABASE_MIGRATING_DELETIONS)
+        pipeline.execute()
+        logging.info("向量資料庫已切換至集合: %(name)s, 原集合保留以便回滾", {"name": config.name})
@@ -5,16 +5,27 @@
 @Author : zsting29@gmail.com
 @File   : dataset_task.py
 """
+from typing import Optional
 from uuid import UUID
 
 from celery import shared_task
 
 
 @shared_task
-def delete_dataset(dataset_id: UUID) -> None:
+def delete_dataset(dataset_id: UUID, account_id: Optional[UUID] = None) -> None:
     """根據傳遞的知識庫id刪除特定的知識庫資訊"""
     from app.http.module import injector
     from internal.service import IndexingService
 
     indexing_service = injector.get(IndexingService)
-    indexing_service.delete_dataset(dataset_id)
+    indexing_service.delete_dataset(dataset_id, account_id)
+
+
+@shared_task
+def flush_retrieval_records() -> None:
+    """將緩衝區中的知識庫查詢記錄與片段命中次數批次刷新到資料庫"""
+    from app.http.module import injector
+    from internal.service.retrieval_record_service import RetrievalRecordService
+
+    retrieval_record_service = injector.get(RetrievalRecordService)
+    retrieval_record_service.flush()
@@ -5,6 +5,7 @@
 @Author : zsting29@gmail.com
 @File   : document_task.py
 """
+from typing import Optional
 from uuid import UUID
 
 from celery import shared_task
@@ -20,6 +21,36 @@ def build_documents(document_ids: list[UUID]) -> None:
     indexing_service.build_documents(document_ids)
 
 
+@shared_task
+def reindex_document(document_id: UUID) -> None:
+    """根據傳遞的文件id，增量重建文件索引"""
+    from app.http.module import injector
+    from internal.service.indexing_service import IndexingService
+
+    indexing_service = injector.get(IndexingService)
+    indexing_service.reindex_document(document_id)
+
+
+@shared_task
+def resume_documents(document_ids: list[UUID]) -> None:
+    """根據傳遞的文件id列表，從斷點恢復構建文件"""
+    from app.http.module import injector
+    from internal.service.indexing_service import IndexingService
+
+    indexing_service = injector.get(IndexingService)
+    indexing_service.resume_documents(document_ids)
+
+
+@shared_task
+def resume_stuck_documents() -> None:
+    """定時掃描構建中斷的文件並重新投遞恢復任務"""
+    from app.http.module import injector
+    from internal.service.indexing_service import IndexingService
+
+    indexing_service = injector.get(IndexingService)
+    indexing_service.resume_stuck_documents()
+
+
 @shared_task
 def update_document_enabled(document_id: UUID) -> None:
     """根據傳遞的文件id修改文件的狀態"""
@@ -31,10 +62,10 @@ def update_document_enabled(document_id: UUID) -> None:
 
 
 @shared_task
-def delete_document(dataset_id: UUID, document_id: UUID) -> None:
+def delete_document(dataset_id: UUID, document_id: UUID, account_id: Optional[UUID] = None) -> None:
     """根據傳遞的文件id+知識庫id清除文件記錄"""
     from app.http.module import injector
     from internal.service.indexing_service import IndexingService
 
     indexing_service = injector.get(IndexingService)
-    indexing_service.delete_document(dataset_id, document_id)
+    indexing_service.delete_document(dataset_id, document_id, account_id)
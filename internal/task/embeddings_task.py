@@ -0,0 +1,31 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午8:40
+@Author : zsting29@gmail.com
+@File   : embeddings_task.py
+"""
+import logging
+
+from celery import shared_task
+
+
+@shared_task
+def migrate_legacy_embeddings_cache() -> None:
+    """將舊版JSON格式的文件嵌入快取遷移成緊湊二進位格式"""
+    from app.http.module import injector
+    from internal.service.embeddings_service import EmbeddingsService
+
+    embeddings_service = injector.get(EmbeddingsService)
+    migrated_count = embeddings_service.migrate_legacy_embeddings_cache()
+    logging.info("遷移文件嵌入快取完成, 數量: %(count)s", {"count": migrated_count})
+
+
+@shared_task
+def migrate_vector_collection() -> None:
+    """部署配置的嵌入模型或維度變更時，將向量資料庫遷移到新集合，遷移完成後自動切換"""
+    from app.http.module import injector
+    from internal.service.vector_migration_service import VectorMigrationService
+
+    vector_migration_service = injector.get(VectorMigrationService)
+    vector_migration_service.migrate()
@@ -0,0 +1,61 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午3:20
+@Author : zsting29@gmail.com
+@File   : lru_cache.py
+"""
+import time
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """執行緒安全的LRU快取，支持最大容量以及可選的過期時間(秒)"""
+    maxsize: int
+    ttl: Optional[float]
+
+    def __init__(self, maxsize: int = 128, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """根據傳遞的鍵獲取快取值，不存在或已過期則返回default，命中時會將該鍵移到最近使用的位置"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expire_at, value = item
+            if expire_at and expire_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """設置快取值，超過最大容量時淘汰最久未使用的鍵"""
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl if ttl else 0, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """刪除指定的快取鍵"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """清空所有快取"""
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._data)
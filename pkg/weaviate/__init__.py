@@ -0,0 +1,10 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午10:05
+@Author : zsting29@gmail.com
+@File   : __init__.py.py
+"""
+from .flask_weaviate import FlaskWeaviate
+
+__all__ = ["FlaskWeaviate"]
@@ -0,0 +1,137 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/18 下午10:05
+@Author : zsting29@gmail.com
+@File   : flask_weaviate.py
+"""
+import logging
+import os
+import time
+from threading import Lock
+from typing import Optional
+
+import weaviate
+from flask import Flask
+from weaviate.classes.init import AdditionalConfig, Timeout
+from weaviate.client import WeaviateClient
+from weaviate.config import ConnectionConfig
+
+
+class FlaskWeaviate:
+    """
+    Flask Weaviate擴展，整個行程共享同一個客戶端(HTTP連接池+gRPC通道)，
+    首次使用時才建立連接，並定期做健康檢查，連接失效時以指數退避的方式重新連接
+    """
+    _client: Optional[WeaviateClient]
+    _pid: Optional[int]
+    _checked_at: float
+
+    def __init__(self, app: Optional[Flask] = None):
+        self._client = None
+        self._pid = None
+        self._checked_at = 0
+        self._lock = Lock()
+        self._config = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """讀取應用配置，此時不會建立連接"""
+        self._config = {
+            "host": app.config.get("WEAVIATE_HOST", "localhost"),
+            "port": int(app.config.get("WEAVIATE_PORT", 8080)),
+            "grpc_port": int(app.config.get("WEAVIATE_GRPC_PORT", 50051)),
+            "pool_connections": int(app.config.get("WEAVIATE_POOL_CONNECTIONS", 10)),
+            "pool_maxsize": int(app.config.get("WEAVIATE_POOL_MAXSIZE", 50)),
+            "health_check_interval": float(app.config.get("WEAVIATE_HEALTH_CHECK_INTERVAL", 30)),
+            "max_retries": int(app.config.get("WEAVIATE_CONNECT_MAX_RETRIES", 5)),
+            "multi_tenancy": bool(app.config.get("WEAVIATE_MULTI_TENANCY", False)),
+        }
+        app.extensions["weaviate"] = self
+
+    @property
+    def multi_tenancy(self) -> bool:
+        """部署配置是否啟用多租戶集合"""
+        return self._config.get("multi_tenancy", False)
+
+    @property
+    def client(self) -> WeaviateClient:
+        """獲取行程內共享的客戶端，首次調用時建立連接，超過健康檢查間隔時檢測連接並在失效時重連"""
+        # 1.客戶端存在、屬於當前行程且未到健康檢查時間時直接返回
+        client = self._client
+        if (
+                client is not None
+                and self._pid == os.getpid()
+                and time.monotonic() - self._checked_at < self._config.get("health_check_interval", 30)
+        ):
+            return client
+
+        with self._lock:
+            # 2.fork出的子行程(如Celery worker)不能沿用父行程的連接，直接丟棄後重新創建
+            if self._pid != os.getpid():
+                self._client = None
+                self._pid = os.getpid()
+
+            # 3.客戶端不存在則創建，存在則做健康檢查，失效時重新連接
+            if self._client is None:
+                self._client = self._connect()
+            elif time.monotonic() - self._checked_at >= self._config.get("health_check_interval", 30):
+                if not self._is_healthy(self._client):
+                    logging.warning("Weaviate連接已失效, 正在重新連接")
+                    self._client = self._connect(self._client)
+            self._checked_at = time.monotonic()
+
+            return self._client
+
+    def close(self) -> None:
+        """關閉當前行程的客戶端並釋放連接，只有創建客戶端的行程才會關閉"""
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                try:
+                    self._client.close()
+                except Exception as e:
+                    logging.warning("關閉Weaviate連接失敗, 錯誤資訊: %(error)s", {"error": e})
+            self._client = None
+
+    @classmethod
+    def _is_healthy(cls, client: WeaviateClient) -> bool:
+        """檢測客戶端是否仍處於連接狀態且服務可用"""
+        try:
+            return client.is_connected() and client.is_ready()
+        except Exception:
+            return False
+
+    def _connect(self, client: Optional[WeaviateClient] = None) -> WeaviateClient:
+        """建立連接，傳遞客戶端時在原客戶端上重新連接(引用該客戶端的物件無需更新)，失敗時以指數退避重試"""
+        max_retries = self._config.get("max_retries", 5)
+        for attempt in range(max_retries):
+            try:
+                # 1.重新連接時先關閉舊連接，再在同一個客戶端上連接
+                if client is not None:
+                    client.close()
+                    client.connect()
+                    return client
+
+                # 2.首次連接時創建帶連接池配置的客戶端
+                return weaviate.connect_to_local(
+                    host=self._config.get("host", "localhost"),
+                    port=self._config.get("port", 8080),
+                    grpc_port=self._config.get("grpc_port", 50051),
+                    additional_config=AdditionalConfig(
+                        connection=ConnectionConfig(
+                            session_pool_connections=self._config.get("pool_connections", 10),
+                            session_pool_maxsize=self._config.get("pool_maxsize", 50),
+                        ),
+                        timeout=Timeout(init=5, query=30, insert=90),
+                    ),
+                )
+            except Exception as e:
+                if attempt == max_retries - 1:
+                    raise
+                delay = min(0.5 * 2 ** attempt, 8)
+                logging.warning(
+                    "連接Weaviate失敗, %(delay)s秒後重試, 錯誤資訊: %(error)s",
+                    {"delay": delay, "error": e},
+                )
+                time.sleep(delay)
@@ -0,0 +1,7 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 上午4:30
+@Author : zsting29@gmail.com
+@File   : __init__.py.py
+"""
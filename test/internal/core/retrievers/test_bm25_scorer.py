@@ -0,0 +1,63 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 上午4:30
+@Author : zsting29@gmail.com
+@File   : test_bm25_scorer.py
+"""
+import pytest
+
+from internal.core.retrievers.bm25_scorer import BM25Scorer
+
+# 倒排記錄格式為(segment_id, keyword, term_frequency, segment_length)
+POSTINGS = [
+    ("s1", "llm", 3, 10),
+    ("s1", "agent", 1, 10),
+    ("s2", "llm", 1, 10),
+    ("s3", "agent", 2, 20),
+    ("s4", "weaviate", 5, 8),
+]
+
+
+class TestBM25Scorer:
+    """BM25打分器的測試類"""
+
+    @pytest.mark.parametrize("postings, keywords, k", [
+        ([], ["llm"], 4),
+        (POSTINGS, [], 4),
+        (POSTINGS, ["llm"], 0),
+        (POSTINGS, ["missing"], 4),
+    ])
+    def test_top_k_empty(self, postings, keywords, k):
+        """沒有倒排記錄、沒有關鍵字、k不為正數或關鍵字全部沒有命中時返回空列表"""
+        assert BM25Scorer().top_k(postings, keywords, 4, 48, k) == []
+
+    def test_top_k_ranking(self):
+        """詞頻更高、命中關鍵字更多的片段排在前面，並只返回前k個片段"""
+        result = BM25Scorer().top_k(POSTINGS, ["llm", "agent"], 4, 48, k=2)
+
+        assert [segment_id for segment_id, _ in result] == ["s1", "s3"]
+        assert result[0][1] > result[1][1]
+        assert all(0 < score < 1 for _, score in result)
+
+    def test_top_k_ignores_other_keywords(self):
+        """只計算命中查詢關鍵字的倒排記錄"""
+        result = BM25Scorer().top_k(POSTINGS, ["weaviate"], 4, 48)
+
+        assert [segment_id for segment_id, _ in result] == ["s4"]
+
+    def test_top_k_zero_document_frequency(self):
+        """文件頻率為0的關鍵字不影響得分，也不參與歸一化"""
+        scorer = BM25Scorer()
+        result = scorer.top_k(POSTINGS, ["llm", "unknown"], 4, 48)
+        expected = scorer.top_k(POSTINGS, ["llm"], 4, 48)
+
+        assert [segment_id for segment_id, _ in result] == [segment_id for segment_id, _ in expected]
+        assert [score for _, score in result] == pytest.approx([score for _, score in expected])
+
+    def test_top_k_empty_corpus_statistics(self):
+        """知識庫統計資訊為空(尚未同步)時以倒排記錄兜底，得分仍為有限正數"""
+        result = BM25Scorer().top_k(POSTINGS, ["llm", "agent"], 0, 0)
+
+        assert len(result) == 3
+        assert all(0 < score < 1 for _, score in result)
@@ -0,0 +1,51 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 上午4:30
+@Author : zsting29@gmail.com
+@File   : test_parallel_hybrid_retriever.py
+"""
+from langchain_core.documents import Document as LCDocument
+
+from internal.core.retrievers import reciprocal_rank_fusion
+
+
+def _document(segment_id: str) -> LCDocument:
+    """構建帶有片段id的LangChain文件"""
+    return LCDocument(page_content=f"content of {segment_id}", metadata={"segment_id": segment_id})
+
+
+class TestReciprocalRankFusion:
+    """倒數排名融合的測試類"""
+
+    def test_fuse_empty(self):
+        """沒有任何檢索結果時返回空列表"""
+        assert reciprocal_rank_fusion([], [0.5, 0.5]) == []
+        assert reciprocal_rank_fusion([[], []], [0.5, 0.5]) == []
+
+    def test_fuse_ranking(self):
+        """同時被多個檢索器命中的片段排在前面，同一片段只保留一份"""
+        semantic = [_document("a"), _document("b"), _document("c")]
+        full_text = [_document("c"), _document("d")]
+
+        result = reciprocal_rank_fusion([semantic, full_text], [0.5, 0.5], c=60)
+
+        assert [document.metadata["segment_id"] for document in result] == ["c", "a", "b", "d"]
+
+    def test_fuse_weights(self):
+        """權重更高的檢索器的結果排在前面"""
+        semantic = [_document("a")]
+        full_text = [_document("b")]
+
+        result = reciprocal_rank_fusion([semantic, full_text], [0.2, 0.8])
+
+        assert [document.metadata["segment_id"] for document in result] == ["b", "a"]
+
+    def test_fuse_without_id(self):
+        """元數據中沒有片段id時以文本內容去重"""
+        semantic = [LCDocument(page_content="same"), LCDocument(page_content="other")]
+        full_text = [LCDocument(page_content="same")]
+
+        result = reciprocal_rank_fusion([semantic, full_text], [0.5, 0.5])
+
+        assert [document.page_content for document in result] == ["same", "other"]
@@ -0,0 +1,40 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 上午4:30
+@Author : zsting29@gmail.com
+@File   : test_context_packer_service.py
+"""
+import pytest
+
+from internal.service.context_packer_service import ContextPackerService
+
+
+class TestContextPackerService:
+    """檢索上下文打包服務的測試類"""
+
+    @pytest.mark.parametrize("previous, current", [
+        ("LLMOps platform builds agents", "LLMOps platform builds agents"),
+        ("LLMOps platform builds agents", "platform builds agents"),
+    ])
+    def test_merge_overlap_full(self, previous, current):
+        """當前片段完全包含在前一片段的結尾時只保留前一片段"""
+        assert ContextPackerService._merge_overlap(previous, current) == previous
+
+    def test_merge_overlap_partial(self):
+        """前一片段的結尾與當前片段的開頭重疊時只保留一份重疊文本"""
+        previous = "LLMOps platform builds agents"
+        current = "builds agents with knowledge bases"
+
+        result = ContextPackerService._merge_overlap(previous, current)
+
+        assert result == "LLMOps platform builds agents with knowledge bases"
+
+    @pytest.mark.parametrize("previous, current", [
+        ("LLMOps platform builds agents", "knowledge bases and workflows"),
+        ("LLMOps platform builds agents", "agents and workflows"),
+    ])
+    def test_merge_overlap_none(self, previous, current):
+        """沒有重疊或重疊文本短於最小長度時以換行拼接"""
+        assert ContextPackerService._merge_overlap(previous, current) == f"{previous}\n{current}"
+
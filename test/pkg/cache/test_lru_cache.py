@@ -0,0 +1,85 @@
+#!/user/bin/env python
+# -*- coding: utf-8 -*-
+"""
+@Time   : 2026/10/19 上午4:30
+@Author : zsting29@gmail.com
+@File   : test_lru_cache.py
+"""
+import pytest
+
+from pkg.cache import LRUCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """將快取使用的單調時鐘替換成可以手動推進的時鐘"""
+    now = [100.0]
+    monkeypatch.setattr("pkg.cache.lru_cache.time.monotonic", lambda: now[0])
+    return now
+
+
+class TestLRUCache:
+    """LRU快取的測試類"""
+
+    def test_get_and_set(self):
+        """命中時返回快取值，未命中時返回default"""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert cache.get("b", 0) == 0
+        assert "a" in cache and "b" not in cache
+
+    def test_evict_least_recently_used(self):
+        """超過最大容量時淘汰最久未使用的鍵，讀取會刷新鍵的使用順序"""
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert len(cache) == 2
+
+    def test_ttl_expiry(self, clock):
+        """超過過期時間的鍵視為不存在並被移除"""
+        cache = LRUCache(maxsize=2, ttl=10)
+        cache.set("a", 1)
+
+        clock[0] += 5
+        assert cache.get("a") == 1
+
+        clock[0] += 6
+        assert cache.get("a") is None
+        assert len(cache) == 0
+
+    def test_ttl_per_key(self, clock):
+        """設置時傳遞的過期時間優先於預設值，未設置過期時間的鍵不會過期"""
+        cache = LRUCache(maxsize=4, ttl=10)
+        cache.set("short", 1, ttl=1)
+        cache.set("default", 2)
+        no_ttl_cache = LRUCache(maxsize=4)
+        no_ttl_cache.set("forever", 3)
+
+        clock[0] += 2
+        assert cache.get("short") is None
+        assert cache.get("default") == 2
+
+        clock[0] += 1000
+        assert no_ttl_cache.get("forever") == 3
+
+    def test_delete_and_clear(self):
+        """刪除指定鍵以及清空所有快取"""
+        cache = LRUCache(maxsize=4)
+        cache.set("a", 1)
+        cache.set("b", 2)
+
+        cache.delete("a")
+        cache.delete("missing")
+        assert cache.get("a") is None and cache.get("b") == 2
+
+        cache.clear()
+        assert len(cache) == 0